@@ -1,14 +1,15 @@
 import streamlit as st
 import os
+from contextlib import nullcontext
+from datetime import datetime
 from config.settings import settings
-from src.drive_handler import DriveHandler
-from src.invoice_processor import InvoiceProcessor
-from src.llm_handler import LLMHandler
-from src.data_extractor import DataExtractor
-from src.utils import cleanup_temp_files
-from components.sidebar import render_sidebar
+from components.sidebar import render_diagnostics, render_sidebar
 from components.chat_interface import render_chat_interface
-from components.data_viewer import render_data_viewer
+from src import tracing
+
+# Heavy modules (langchain, chromadb, openai, pandas, plotly, pdf2image,
+# pytesseract) are imported where they are first needed, so a cold start and
+# each new session's first paint don't wait for them.
 
 # Page configuration
 st.set_page_config(
@@ -22,10 +23,26 @@ if 'processed_data' not in st.session_state:
     st.session_state.processed_data = []
 if 'structured_data' not in st.session_state:
     st.session_state.structured_data = []
-if 'llm_handler' not in st.session_state:
-    st.session_state.llm_handler = LLMHandler()
+if 'invoice_table' not in st.session_state:
+    st.session_state.invoice_table = None
 if 'files_to_process' not in st.session_state:
     st.session_state.files_to_process = []
+if 'drive_folder' not in st.session_state:
+    st.session_state.drive_folder = None
+if 'trace' not in st.session_state:
+    st.session_state.trace = None
+if 'profile_report' not in st.session_state:
+    st.session_state.profile_report = None
+
+@st.cache_resource(show_spinner="Loading language model...")
+def get_llm_handler():
+    """One LLMHandler (LLM and embeddings clients, vector store) shared by every session in the process"""
+    from src.llm_handler import LLMHandler
+    return LLMHandler()
+
+def knowledge_base_exists() -> bool:
+    """Cheap check for a persisted vector store, without loading the LLM stack"""
+    return os.path.isdir(settings.VECTOR_STORE_DIR) and bool(os.listdir(settings.VECTOR_STORE_DIR))
 
 def main():
     # Title and description
@@ -44,7 +61,7 @@ def main():
     with col1:
         st.markdown("### 📤 Process Invoices")
         
-        if st.button("🚀 Process Files", type="primary", disabled=not st.session_state.files_to_process):
+        if st.button("🚀 Process Files", type="primary", disabled=not (st.session_state.files_to_process or st.session_state.drive_folder)):
             process_invoices(sidebar_options)
         
         if st.session_state.processed_data:
@@ -56,61 +73,115 @@ def main():
                     if "error" in doc:
                         st.error(f"❌ {doc['file_name']}: {doc['error']}")
                     else:
-                        st.success(f"✅ {doc['file_name']}")
+                        pages = doc.get("pages", [])
+                        ocr_pages = sum(1 for page in pages if page["method"] == "ocr")
+                        detail = f" ({len(pages)} page(s), {ocr_pages} OCR'd" if pages else ""
+                        confidences = [page["confidence"]["mean"] for page in pages if "confidence" in page]
+                        if confidences:
+                            detail += f", lowest OCR confidence {min(confidences):.0f}%"
+                        detail += ")" if pages else ""
+                        st.success(f"✅ {doc['file_name']}{detail}")
     
     with col2:
-        if st.session_state.processed_data:
-            # Chat interface
-            render_chat_interface(st.session_state.llm_handler)
+        if st.session_state.processed_data or knowledge_base_exists():
+            # Chat interface; the LLM handler is only loaded once a question is asked
+            render_chat_interface(get_llm_handler)
     
     # Data viewer section
     if st.session_state.structured_data:
         st.markdown("---")
-        aggregated_data = DataExtractor().aggregate_data(st.session_state.structured_data)
+        from components.data_viewer import render_data_viewer
+        aggregated_data = st.session_state.invoice_table.summary()
         render_data_viewer(st.session_state.structured_data, aggregated_data)
+    
+    # Rendered last so it reflects a run that just finished
+    render_diagnostics()
+
+def profile_if_requested():
+    """cProfile the run when profiling is ticked in the diagnostics panel"""
+    if not st.session_state.get('profile_runs'):
+        return nullcontext({})
+    path = os.path.join(settings.TRACE_DIR, f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.prof")
+    return tracing.profile(path)
 
 def process_invoices(options):
     """Process uploaded invoices"""
-    with st.spinner("Processing invoices..."):
+    from src.drive_handler import DriveHandler
+    from src.invoice_processor import InvoiceProcessor
+    from src.invoice_table import InvoiceTable
+    from src.utils import cleanup_temp_files
+    
+    with st.spinner("Processing invoices..."), tracing.record("process_invoices") as trace, \
+            profile_if_requested() as profile:
         try:
+            if options['extract_data'] or options['create_kb']:
+                llm_handler = get_llm_handler()
+            
             # Initialize processors
             processor = InvoiceProcessor()
             
-            # Process files
-            processed_docs = processor.process_multiple_files(st.session_state.files_to_process)
+            # Process files; a Drive folder is downloaded concurrently and each
+            # file starts processing as soon as it lands
+            drive_folder = st.session_state.drive_folder
+            if drive_folder:
+                drive_handler = DriveHandler()
+                downloads = drive_handler.iter_folder_downloads(drive_folder["id"], drive_folder["files"])
+                processed_docs = processor.process_multiple_files(downloads)
+                processed_docs.extend(drive_handler.download_errors)
+            else:
+                processed_docs = processor.process_multiple_files(st.session_state.files_to_process)
             st.session_state.processed_data = processed_docs
             
+            cache_stats = processor.cache_stats()
+            if cache_stats.get("hits"):
+                st.info(f"♻️ Reused cached text for {cache_stats['hits']} previously seen file(s)")
+            
             # Extract structured data if enabled
             if options['extract_data']:
-                structured_data = []
                 progress_bar = st.progress(0)
                 
-                for i, doc in enumerate(processed_docs):
-                    if "error" not in doc and "raw_text" in doc:
-                        # Extract structured data using LLM
-                        extracted = st.session_state.llm_handler.extract_structured_data(
-                            doc["raw_text"],
-                            doc["file_name"]
-                        )
-                        structured_data.append(extracted)
-                    
-                    progress_bar.progress((i + 1) / len(processed_docs))
+                # Extract structured data using LLM, several requests in flight at once;
+                # the handler is shared by all sessions, so this run's stats are kept here
+                prompt_stats = {}
+                structured_data = llm_handler.extract_batch(
+                    processed_docs,
+                    on_progress=lambda done, total: progress_bar.progress(done / total),
+                    prompt_stats=prompt_stats
+                )
                 
                 st.session_state.structured_data = structured_data
+                st.session_state.invoice_table = InvoiceTable(structured_data)
                 progress_bar.empty()
+                
+                tokens_saved = llm_handler.tokens_saved(prompt_stats)
+                if tokens_saved > 0:
+                    st.caption(f"✂️ Prompt compaction saved {tokens_saved:,} input tokens")
             
             # Create knowledge base if enabled
             if options['create_kb'] and st.session_state.processed_data:
-                with st.spinner("Creating knowledge base..."):
-                    st.session_state.llm_handler.create_vector_store(st.session_state.processed_data)
-                    st.success("✅ Knowledge base created successfully!")
+                with st.spinner("Updating knowledge base..."):
+                    # The handler's cache counters cover every session; this run's are kept here
+                    embedding_stats = {}
+                    llm_handler.create_vector_store(st.session_state.processed_data, embedding_stats=embedding_stats)
+                    st.success("✅ Knowledge base updated successfully!")
+                    
+                    if embedding_stats.get("hits") or embedding_stats.get("misses"):
+                        st.caption(
+                            f"Embedding cache hit rate {embedding_stats['hit_rate']:.0%}, "
+                            f"{embedding_stats['embedded_tokens']:,} tokens embedded"
+                        )
             
             # Clean up temporary files
             cleanup_temp_files()
             st.session_state.files_to_process = []
+            st.session_state.drive_folder = None
             
         except Exception as e:
             st.error(f"Error processing invoices: {str(e)}")
+    
+    st.session_state.trace = trace
+    if "report" in profile:
+        st.session_state.profile_report = profile
 
 def check_api_key():
     """Check if OpenAI API key is configured"""
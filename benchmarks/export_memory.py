@@ -0,0 +1,90 @@
+"""
+Benchmark peak memory of exporting and preparing a download, old path vs streaming path.
+
+Old path: the whole list built in memory, json.dump(indent=2) of it, f.read() of
+the file as text for st.download_button, and a base64 HTML link of the same file.
+Streaming path: JSON Lines written row by row straight from a generator, and the
+file handed to st.download_button as a binary handle (read once).
+
+Usage: python benchmarks/export_memory.py [record counts...]
+"""
+import base64
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import settings
+from src.data_extractor import DataExtractor
+
+
+def synthetic_invoices(count):
+    for i in range(count):
+        yield {
+            "invoice_number": f"INV-{i:06d}",
+            "date": f"2024-{1 + i % 12:02d}-{1 + i % 28:02d}",
+            "vendor_name": f"Vendor {i % 50}",
+            "vendor_address": "123 Main Street, Springfield",
+            "customer_name": "Acme Corp",
+            "customer_address": "1 Acme Way, Metropolis",
+            "items": [
+                {"description": f"Item {j}", "quantity": j + 1, "unit_price": 9.99, "total": 9.99 * (j + 1)}
+                for j in range(5)
+            ],
+            "subtotal": 149.85,
+            "tax": 14.99,
+            "total": 164.84,
+            "payment_terms": "Net 30",
+            "due_date": "2024-12-31",
+            "source_file": f"invoice_{i}.pdf",
+        }
+
+
+def measure(fn):
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / (1024 * 1024)
+
+
+def legacy_export(data):
+    file_path = os.path.join(settings.EXPORT_DIR, "legacy.json")
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    with open(file_path, 'r') as f:
+        download = f.read().encode('utf-8')
+    with open(file_path, 'rb') as f:
+        link = f'<a href="data:file/octet-stream;base64,{base64.b64encode(f.read()).decode()}">x</a>'
+    return download, link
+
+
+def streaming_export(data):
+    file_path = DataExtractor().save_to_jsonl(data, "streaming.jsonl")
+    with open(file_path, 'rb') as f:
+        return f.read()
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 50000]
+    settings.EXPORT_DIR = tempfile.mkdtemp(prefix="export_bench_")
+
+    for count in counts:
+        # Each path gets its invoices the way it consumes them: the old one needs the full list
+        legacy_peak = measure(lambda: legacy_export(list(synthetic_invoices(count))))
+        streaming_peak = measure(lambda: streaming_export(synthetic_invoices(count)))
+        size_mb = os.path.getsize(os.path.join(settings.EXPORT_DIR, "streaming.jsonl")) / (1024 * 1024)
+        print(json.dumps({
+            "records": count,
+            "export_mb": round(size_mb, 2),
+            "legacy_peak_mb": round(legacy_peak, 2),
+            "streaming_peak_mb": round(streaming_peak, 2),
+        }))
+
+
+if __name__ == "__main__":
+    main()
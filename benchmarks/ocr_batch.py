@@ -0,0 +1,86 @@
+"""
+Benchmark the per-page tesseract backend against the batched one.
+
+Per-page: one tesseract process per page image (and per re-OCR crop), as
+pytesseract does by default.
+Batch: pages, images and crops go to tesseract OCR_BATCH_SIZE at a time as a
+file list, so process start-up and model loading are paid once per batch.
+
+Both runs use the same InvoiceProcessor settings otherwise, sequentially and
+then with PROCESSING_WORKERS, with the text cache off. Needs tesseract and
+poppler installed. Without arguments a synthetic corpus of small one-page
+receipts plus one multi-page scanned PDF is generated.
+
+Usage: python benchmarks/ocr_batch.py [receipt count] [batch size]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw, ImageFont
+
+from config.settings import settings
+from src.invoice_processor import InvoiceProcessor
+
+
+def synthetic_receipt(index):
+    receipt = Image.new("L", (600, 900), 255)
+    draw = ImageDraw.Draw(receipt)
+    font = ImageFont.load_default(size=22)
+    lines = [f"RECEIPT #{index:05d}", "Corner Store", "2024-05-02 14:31"]
+    lines += [f"Item {i}  {1.25 * (i + 1):.2f}" for i in range(8)]
+    lines += [f"TOTAL  {sum(1.25 * (i + 1) for i in range(8)):.2f}"]
+    for row, line in enumerate(lines):
+        draw.text((30, 30 + row * 34), line, font=font, fill=0)
+    return receipt
+
+
+def synthetic_corpus(directory, count):
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"receipt_{i:04d}.png")
+        synthetic_receipt(i).save(path)
+        paths.append(path)
+
+    pages = [synthetic_receipt(i).resize((1700, 2550)) for i in range(6)]
+    scan_path = os.path.join(directory, "scanned.pdf")
+    pages[0].save(scan_path, "PDF", resolution=200, save_all=True, append_images=pages[1:])
+    paths.append(scan_path)
+    return paths
+
+
+def run(paths, backend, parallel):
+    settings.OCR_BACKEND = backend
+    processor = InvoiceProcessor(use_cache=False)
+    started = time.perf_counter()
+    results = processor.process_multiple_files(paths, parallel=parallel)
+    seconds = time.perf_counter() - started
+    pages = sum(len(result.get("pages", [])) for result in results)
+    return {
+        "backend": backend,
+        "parallel": parallel,
+        "files": len(paths),
+        "pages": pages,
+        "errors": sum(1 for result in results if "error" in result),
+        "seconds": round(seconds, 2),
+        "seconds_per_page": round(seconds / pages, 3) if pages else None,
+    }
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    if len(sys.argv) > 2:
+        settings.OCR_BATCH_SIZE = int(sys.argv[2])
+    paths = synthetic_corpus(tempfile.mkdtemp(prefix="ocr_batch_bench_"), count)
+
+    for parallel in (False, True):
+        for backend in ("per_page", "batch"):
+            print(json.dumps(run(paths, backend, parallel)))
+
+
+if __name__ == "__main__":
+    main()
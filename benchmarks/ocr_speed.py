@@ -0,0 +1,103 @@
+"""
+Benchmark OCR seconds per page, fixed-DPI path vs adaptive preprocessing path.
+
+Fixed path: pdf2image at OCR_DPI (or the full-resolution image) straight into
+tesseract with default options, as before.
+Adaptive path: InvoiceProcessor's OCR with x-height-driven DPI, JPEG draft
+decoding, grayscale/binarize/deskew and the configured PSM/OEM.
+
+Needs tesseract and poppler installed. Without arguments a small synthetic
+corpus is generated (a scanned-style PDF and a 12 MP phone-style photo).
+
+Usage: python benchmarks/ocr_speed.py [pdf or image paths...]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytesseract
+from pdf2image import convert_from_path, pdfinfo_from_path
+from PIL import Image, ImageDraw, ImageFont
+
+from config.settings import settings
+from src.invoice_processor import InvoiceProcessor
+
+LINES = [
+    "INVOICE  INV-2024-0042",
+    "Acme Supplies Ltd, 12 Market Street, Springfield",
+    "Bill to: Globex Corporation",
+    "Date: 2024-03-14    Due: 2024-04-13",
+    "Widget, blue   x 12   @ 4.50   54.00",
+    "Gadget, large  x 3    @ 19.99  59.97",
+    "Subtotal 113.97   Tax 11.40   Total 125.37",
+]
+
+
+def synthetic_page(width, height, font_size, angle=0.0):
+    page = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(page)
+    font = ImageFont.load_default(size=font_size)
+    y = font_size * 2
+    while y < height - font_size * 2:
+        for line in LINES:
+            draw.text((font_size * 2, y), line, font=font, fill="black")
+            y += int(font_size * 1.6)
+    return page.rotate(angle, expand=False, fillcolor="white") if angle else page
+
+
+def synthetic_corpus(directory):
+    scan_path = os.path.join(directory, "scanned.pdf")
+    pages = [synthetic_page(1700, 2200, 28, angle) for angle in (0.0, 1.5, -2.0)]
+    pages[0].save(scan_path, "PDF", resolution=200, save_all=True, append_images=pages[1:])
+
+    photo_path = os.path.join(directory, "photo.jpg")
+    synthetic_page(4032, 3024, 64, angle=1.0).save(photo_path, "JPEG", quality=90)
+    return [scan_path, photo_path]
+
+
+def fixed_dpi_ocr(file_path):
+    if file_path.lower().endswith(".pdf"):
+        pages = pdfinfo_from_path(file_path)["Pages"]
+        for page_num in range(1, pages + 1):
+            image = convert_from_path(file_path, dpi=settings.OCR_DPI, first_page=page_num, last_page=page_num)[0]
+            pytesseract.image_to_string(image)
+        return pages
+    pytesseract.image_to_string(Image.open(file_path))
+    return 1
+
+
+def adaptive_ocr(processor, file_path):
+    if file_path.lower().endswith(".pdf"):
+        return len(processor.ocr_pdf_pages(file_path, list(range(1, pdfinfo_from_path(file_path)["Pages"] + 1))))
+    processor.extract_text_from_image(file_path)
+    return 1
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    pages = fn(*args)
+    return pages, time.perf_counter() - started
+
+
+def main():
+    paths = sys.argv[1:] or synthetic_corpus(tempfile.mkdtemp(prefix="ocr_bench_"))
+    processor = InvoiceProcessor(ocr_workers=1, use_cache=False)
+
+    for file_path in paths:
+        pages, fixed_seconds = timed(fixed_dpi_ocr, file_path)
+        _, adaptive_seconds = timed(adaptive_ocr, processor, file_path)
+        print(json.dumps({
+            "file": os.path.basename(file_path),
+            "pages": pages,
+            "fixed_seconds_per_page": round(fixed_seconds / pages, 3),
+            "adaptive_seconds_per_page": round(adaptive_seconds / pages, 3),
+            "speedup": round(fixed_seconds / adaptive_seconds, 2) if adaptive_seconds else None,
+        }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Benchmark the PDF text-layer engines on pages/second and memory.
+
+Each installed engine reads the whole corpus in a fresh process, so peak RSS
+(ru_maxrss) reflects that engine alone. Throughput is timed on a first pass;
+the Python-heap peak comes from tracemalloc on a second pass (native
+allocations, e.g. MuPDF's, only show up in RSS).
+
+Without arguments a synthetic corpus of text-layer invoices is generated:
+a short invoice, a 50-page statement and a font-heavy 20-page document.
+
+Usage: python benchmarks/pdf_engines.py [pdf files or directories...]
+"""
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.invoice_processor import PDF_TEXT_ENGINES
+
+FONTS = ["Helvetica", "Times-Roman", "Courier", "Helvetica-Bold", "Times-Italic", "Courier-Oblique"]
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_text_pdf(path, pages, fonts=1):
+    """Write a PDF with a real text layer: pages of invoice-like lines in up to len(FONTS) fonts"""
+    fonts = FONTS[:fonts]
+    objects = {1: "<< /Type /Catalog /Pages 2 0 R >>"}
+    font_ids = {name: 3 + i for i, name in enumerate(fonts)}
+    for name, object_id in font_ids.items():
+        objects[object_id] = f"<< /Type /Font /Subtype /Type1 /BaseFont /{name} >>"
+    font_resources = " ".join(f"/F{i} {object_id} 0 R" for i, object_id in enumerate(font_ids.values()))
+
+    next_id = 3 + len(fonts)
+    page_ids = []
+    for page in range(pages):
+        lines = [f"INVOICE INV-{page:05d}    Date 2024-{page % 12 + 1:02d}-15"]
+        lines += [
+            f"{row:3d}  Item {page}-{row} description text   {row % 9 + 1} x {row * 1.5:8.2f} = {row * 1.5 * (row % 9 + 1):9.2f}"
+            for row in range(1, 46)
+        ]
+        stream_lines = ["BT", "14 TL", "40 800 Td"]
+        for row, line in enumerate(lines):
+            stream_lines.append(f"/F{row % len(fonts)} 10 Tf ({_escape(line)}) '")
+        stream_lines.append("ET")
+        stream = "\n".join(stream_lines)
+
+        content_id, page_id = next_id, next_id + 1
+        next_id += 2
+        objects[content_id] = f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream"
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents {content_id} 0 R "
+            f"/Resources << /Font << {font_resources} >> >> >>"
+        )
+        page_ids.append(page_id)
+
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[2] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>"
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = {}
+        for object_id in sorted(objects):
+            offsets[object_id] = f.tell()
+            f.write(f"{object_id} 0 obj\n{objects[object_id]}\nendobj\n".encode("latin-1"))
+        xref = f.tell()
+        f.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+        for object_id in sorted(objects):
+            f.write(f"{offsets[object_id]:010d} 00000 n \n".encode())
+        f.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return path
+
+
+def synthetic_corpus(directory):
+    return [
+        write_text_pdf(os.path.join(directory, "invoice.pdf"), pages=2),
+        write_text_pdf(os.path.join(directory, "statement.pdf"), pages=50),
+        write_text_pdf(os.path.join(directory, "font_heavy.pdf"), pages=20, fonts=len(FONTS)),
+    ]
+
+
+def collect(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files += [os.path.join(root, name) for name in sorted(names) if name.lower().endswith(".pdf")]
+        else:
+            files.append(path)
+    return files
+
+
+def read_all(engine, files):
+    pages = chars = 0
+    for file_path in files:
+        texts = engine.page_texts(file_path)
+        pages += len(texts)
+        chars += sum(len(text) for text in texts)
+    return pages, chars
+
+
+def run_engine(name, files):
+    engine = PDF_TEXT_ENGINES[name]()
+    started = time.perf_counter()
+    pages, chars = read_all(engine, files)
+    seconds = time.perf_counter() - started
+
+    # Second pass for the heap peak, since tracemalloc slows pure-Python engines down
+    tracemalloc.start()
+    read_all(engine, files)
+    _, heap_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "engine": name,
+        "pages": pages,
+        "chars": chars,
+        "seconds": round(seconds, 3),
+        "pages_per_second": round(pages / seconds, 1) if seconds else None,
+        "python_heap_peak_mb": round(heap_peak / (1024 * 1024), 2),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main():
+    files = collect(sys.argv[1:]) if len(sys.argv) > 1 else synthetic_corpus(tempfile.mkdtemp(prefix="pdf_bench_"))
+    context = multiprocessing.get_context("spawn")
+
+    for name, engine_class in PDF_TEXT_ENGINES.items():
+        if not engine_class().available():
+            print(json.dumps({"engine": name, "skipped": "not installed"}))
+            continue
+        with context.Pool(1) as pool:
+            print(json.dumps(pool.apply(run_engine, (name, files))))
+
+
+if __name__ == "__main__":
+    main()
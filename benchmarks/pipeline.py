@@ -0,0 +1,386 @@
+"""
+End-to-end benchmark of the invoice pipeline on a synthetic corpus with an offline LLM.
+
+A corpus of text-layer invoices, scanned-image PDFs, phone-photo JPEGs and
+multi-page text statements is generated, then each stage is timed:
+- process: InvoiceProcessor.process_multiple_files (text cache off)
+- extract: LLMHandler.extract_batch (result cache off)
+- knowledge_base: LLMHandler.create_vector_store into a fresh collection (embedding cache off)
+- aggregate: DataExtractor.aggregate_data
+- export_csv, export_jsonl, export_json, export_parquet: the DataExtractor exporters
+
+The chat and embedding endpoints are replaced by FakeChatModel and
+FakeEmbeddings, which answer deterministically from the prompt after a
+configurable latency, so the LLM stages measure the pipeline's own overhead
+and concurrency rather than the network.
+
+Per stage: items/second, p50/p95 item latency and the peak RSS while it ran
+(sampled from /proc; OCR worker processes report their own peak separately).
+Item latency is the time a file spent being processed (its pages' seconds),
+the time from the start of the stage until a document's extraction completed,
+one embedding request, or one full aggregate/export run.
+
+One JSON line is printed per stage. --output writes the whole result with the
+git commit, and --baseline compares items/second against such a file, exiting
+1 when a stage got slower by more than --tolerance. Needs tesseract and
+poppler for the OCR inputs and chromadb for the knowledge base.
+
+Usage:
+    python benchmarks/pipeline.py [--text-pdfs 20] [--scanned-pdfs 5] [--photos 5] [--statements 2]
+                                  [--statement-pages 30] [--chat-latency 0.5] [--embedding-latency 0.1]
+                                  [--repeats 5] [--output result.json]
+    python benchmarks/pipeline.py --baseline result.json [--tolerance 0.25]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from langchain.chat_models.base import BaseChatModel
+from langchain.embeddings.base import Embeddings
+from langchain.schema import AIMessage, ChatGeneration, ChatMessage, ChatResult
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from config.settings import settings
+from pdf_engines import write_text_pdf
+from src.data_extractor import DataExtractor
+
+STAGES = ["process", "extract", "knowledge_base", "aggregate",
+          "export_csv", "export_jsonl", "export_json", "export_parquet"]
+
+
+# ──── OFFLINE STAND-INS FOR THE OPENAI ENDPOINTS ─────────────────────────────
+
+def _delay(latency: float, key: str) -> float:
+    """latency give or take 50%, fixed per input so runs are repeatable"""
+    spread = int(hashlib.sha256(key.encode("utf-8")).hexdigest()[:4], 16) / 0xFFFF
+    return latency * (0.5 + spread)
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that reads the invoice back out of the extraction prompt"""
+
+    latency: float = 0.5
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-invoice-chat"
+
+    def _convert_input(self, input):
+        # LLMHandler sends OpenAI-style role/content dicts
+        if isinstance(input, list):
+            input = [
+                ChatMessage(role=m["role"], content=m["content"]) if isinstance(m, dict) else m
+                for m in input
+            ]
+        return super()._convert_input(input)
+
+    def _answer(self, messages) -> ChatResult:
+        prompt = messages[-1].content
+        text = prompt.split("Invoice Text:", 1)[-1]
+        invoice = re.search(r"INV-\d+", text)
+        date = re.search(r"\d{4}-\d{2}-\d{2}", text)
+        items = []
+        for line in text.splitlines():
+            amounts = re.findall(r"\d+\.\d{2}", line)
+            if "Item" in line and amounts:
+                items.append({"description": line.split("  ")[0].strip(), "quantity": 1,
+                              "unit_price": float(amounts[-1]), "total": float(amounts[-1])})
+        subtotal = round(sum(item["total"] for item in items), 2)
+        answer = {
+            "invoice_number": invoice.group(0) if invoice else None,
+            "date": date.group(0) if date else None,
+            "vendor_name": "Synthetic Supplies Ltd",
+            "items": items[:50],
+            "subtotal": subtotal,
+            "tax": round(subtotal * 0.1, 2),
+            "total": round(subtotal * 1.1, 2),
+            "payment_terms": "Net 30",
+        }
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=json.dumps(answer)))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(_delay(self.latency, messages[-1].content))
+        return self._answer(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(_delay(self.latency, messages[-1].content))
+        return self._answer(messages)
+
+
+class FakeEmbeddings(Embeddings):
+    """Hashed bag-of-words vectors, one simulated request per call"""
+
+    def __init__(self, latency: float = 0.1, dimensions: int = 1536):
+        self.latency = latency
+        self.dimensions = dimensions
+        self.request_seconds: List[float] = []
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in text.lower().split():
+            vector[int(hashlib.md5(word.encode("utf-8")).hexdigest()[:8], 16) % self.dimensions] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        started = time.perf_counter()
+        time.sleep(_delay(self.latency, texts[0] if texts else ""))
+        vectors = [self._vector(text) for text in texts]
+        self.request_seconds.append(time.perf_counter() - started)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+# ──── SYNTHETIC CORPUS ───────────────────────────────────────────────────────
+
+def invoice_image(index: int, size=(1700, 2200)) -> Image.Image:
+    """A one-page invoice rendered as a white 200 DPI page"""
+    page = Image.new("L", size, 255)
+    draw = ImageDraw.Draw(page)
+    font = ImageFont.load_default(size=30)
+    lines = [f"INVOICE INV-{index:05d}", "Synthetic Supplies Ltd", f"Date 2024-{index % 12 + 1:02d}-15", ""]
+    lines += [f"Item {index}-{row} description  {row % 9 + 1} x {row * 1.5:.2f}  {row * 1.5 * (row % 9 + 1):.2f}"
+              for row in range(1, 25)]
+    lines += ["", f"TOTAL  {sum(row * 1.5 * (row % 9 + 1) for row in range(1, 25)):.2f}"]
+    for row, line in enumerate(lines):
+        draw.text((120, 120 + row * 58), line, font=font, fill=0)
+    return page
+
+
+def phone_photo(index: int) -> Image.Image:
+    """An invoice photographed on a desk: small in a 12 MP frame, tilted, blurred and noisy"""
+    desk = Image.new("L", (4000, 3000), 90)
+    paper = invoice_image(index).rotate(3, expand=True, fillcolor=90)
+    desk.paste(paper, ((desk.width - paper.width) // 2, (desk.height - paper.height) // 2))
+    noise = Image.effect_noise(desk.size, 12)
+    return Image.blend(desk, noise, 0.08).filter(ImageFilter.GaussianBlur(1.2)).convert("RGB")
+
+
+def synthetic_corpus(directory: str, text_pdfs: int, scanned_pdfs: int, photos: int,
+                     statements: int, statement_pages: int) -> List[str]:
+    paths = []
+    for i in range(text_pdfs):
+        paths.append(write_text_pdf(os.path.join(directory, f"text_{i:04d}.pdf"), pages=1))
+    for i in range(scanned_pdfs):
+        path = os.path.join(directory, f"scanned_{i:04d}.pdf")
+        pages = [invoice_image(i).rotate(0.8, fillcolor=255), invoice_image(i + 1)]
+        pages[0].save(path, "PDF", resolution=200, save_all=True, append_images=pages[1:])
+        paths.append(path)
+    for i in range(photos):
+        path = os.path.join(directory, f"photo_{i:04d}.jpg")
+        phone_photo(i).save(path, quality=85)
+        paths.append(path)
+    for i in range(statements):
+        paths.append(write_text_pdf(os.path.join(directory, f"statement_{i:04d}.pdf"), pages=statement_pages))
+    return paths
+
+
+# ──── MEASUREMENT ────────────────────────────────────────────────────────────
+
+def _rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class PeakRss:
+    """Samples this process's RSS on a background thread while the block runs"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.is_set():
+            rss = _rss_mb()
+            if rss is not None:
+                self.peak = rss if self.peak is None else max(self.peak, rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        if self.peak is None:
+            # No /proc: fall back to the process-lifetime peak
+            self.peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    return round(float(np.percentile(values, q)), 4) if values else None
+
+
+def report(stage: str, items: int, seconds: float, latencies: List[float], peak: PeakRss, **extra) -> dict:
+    result = {
+        "stage": stage,
+        "items": items,
+        "seconds": round(seconds, 3),
+        "items_per_second": round(items / seconds, 2) if seconds else None,
+        "p50_seconds": percentile(latencies, 50),
+        "p95_seconds": percentile(latencies, 95),
+        "peak_rss_mb": round(peak.peak, 1),
+        **extra,
+    }
+    print(json.dumps(result), flush=True)
+    return result
+
+
+def repeated(stage: str, repeats: int, items: int, run) -> dict:
+    latencies = []
+    with PeakRss() as peak:
+        for _ in range(repeats):
+            started = time.perf_counter()
+            run()
+            latencies.append(time.perf_counter() - started)
+    return report(stage, items * repeats, sum(latencies), latencies, peak)
+
+
+def run_pipeline(args, work_dir: str) -> List[dict]:
+    from src.invoice_processor import InvoiceProcessor
+    from src.llm_handler import LLMHandler
+
+    # Cold caches and a private vector store and export directory
+    settings.LLM_CACHE_ENABLED = False
+    settings.EMBEDDING_CACHE_ENABLED = False
+    settings.VECTOR_STORE_DIR = os.path.join(work_dir, "vectorstore")
+    settings.EXPORT_DIR = os.path.join(work_dir, "exports")
+
+    corpus_dir = os.path.join(work_dir, "corpus")
+    os.makedirs(corpus_dir)
+    paths = synthetic_corpus(corpus_dir, args.text_pdfs, args.scanned_pdfs, args.photos,
+                             args.statements, args.statement_pages)
+    results = []
+
+    processor = InvoiceProcessor(use_cache=False)
+    with PeakRss() as peak:
+        started = time.perf_counter()
+        documents = processor.process_multiple_files(paths)
+        seconds = time.perf_counter() - started
+    processed = [d for d in documents if "error" not in d]
+    results.append(report(
+        "process", len(paths), seconds,
+        [sum(page.get("seconds", 0) for page in d["pages"]) for d in processed], peak,
+        pages=sum(len(d["pages"]) for d in processed),
+        errors=len(documents) - len(processed),
+        ocr_workers_peak_rss_mb=round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    ))
+
+    embeddings = FakeEmbeddings(latency=args.embedding_latency)
+    llm_handler = LLMHandler(llm=FakeChatModel(latency=args.chat_latency), embeddings=embeddings)
+
+    completions = []
+    prompt_stats = {}
+    with PeakRss() as peak:
+        started = time.perf_counter()
+        structured = llm_handler.extract_batch(
+            processed, on_progress=lambda done, total: completions.append(time.perf_counter() - started),
+            use_cache=False, prompt_stats=prompt_stats
+        )
+        seconds = time.perf_counter() - started
+    results.append(report(
+        "extract", len(processed), seconds, completions, peak,
+        errors=sum(1 for s in structured if "error" in s),
+        tokens_saved=llm_handler.tokens_saved(prompt_stats),
+    ))
+
+    with PeakRss() as peak:
+        started = time.perf_counter()
+        llm_handler.create_vector_store(processed)
+        seconds = time.perf_counter() - started
+    chunks = len(llm_handler.vectorstore.get(include=[])["ids"])
+    results.append(report("knowledge_base", chunks, seconds, embeddings.request_seconds, peak,
+                          documents=len(processed), embedding_requests=len(embeddings.request_seconds)))
+
+    extractor = DataExtractor()
+    results.append(repeated("aggregate", args.repeats, len(structured),
+                            lambda: extractor.aggregate_data(structured)))
+    results.append(repeated("export_csv", args.repeats, len(structured),
+                            lambda: extractor.save_to_csv(structured, "bench.csv")))
+    results.append(repeated("export_jsonl", args.repeats, len(structured),
+                            lambda: extractor.save_to_jsonl(structured, "bench.jsonl")))
+    results.append(repeated("export_json", args.repeats, len(structured),
+                            lambda: extractor.save_to_json(structured, "bench.json")))
+    results.append(repeated("export_parquet", args.repeats, len(structured),
+                            lambda: extractor.save_to_parquet(structured, "bench")))
+    return results
+
+
+def git_commit() -> Optional[str]:
+    completed = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, cwd=ROOT)
+    return completed.stdout.strip() or None
+
+
+def compare(stages: List[dict], baseline_path: str, tolerance: float) -> List[str]:
+    with open(baseline_path) as f:
+        baseline = {stage["stage"]: stage for stage in json.load(f)["stages"]}
+    failures = []
+    for stage in stages:
+        before = baseline.get(stage["stage"], {}).get("items_per_second")
+        after = stage["items_per_second"]
+        if before and after is not None and after < before * (1 - tolerance):
+            failures.append(f"{stage['stage']} {after:.2f} items/s vs {before:.2f} in the baseline")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--text-pdfs", type=int, default=20)
+    parser.add_argument("--scanned-pdfs", type=int, default=5)
+    parser.add_argument("--photos", type=int, default=5)
+    parser.add_argument("--statements", type=int, default=2)
+    parser.add_argument("--statement-pages", type=int, default=30)
+    parser.add_argument("--chat-latency", type=float, default=0.5, help="mean seconds per chat completion")
+    parser.add_argument("--embedding-latency", type=float, default=0.1, help="mean seconds per embedding request")
+    parser.add_argument("--repeats", type=int, default=5, help="runs of each aggregate/export stage")
+    parser.add_argument("--output", help="write the full result (with git commit) here")
+    parser.add_argument("--baseline", help="compare items/second against this saved result")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="pipeline_bench_") as work_dir:
+        stages = run_pipeline(args, work_dir)
+
+    result = {
+        "commit": git_commit(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "tolerance")},
+        "stages": stages,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+    failures = compare(stages, args.baseline, args.tolerance) if args.baseline else []
+    for failure in failures:
+        print(f"REGRESSION: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark app cold start and guard it against regressions.
+
+Each run happens in a fresh interpreter and measures:
+- import_seconds: importing the modules app.py imports at the top
+- first_render_seconds: first full run of app.py for a new session (AppTest)
+- new_session_render_seconds: first run for a second session in the same
+  process, i.e. what every later user waits for
+- heavy_modules: heavy libraries loaded by that first render beyond what
+  streamlit itself imports; first paint should need none of them
+
+The median of --runs runs is compared against either a saved baseline
+(--baseline, failing when slower by more than --tolerance) or the absolute
+--max-* limits, and any heavy module loaded at first paint is a failure.
+Exit status 1 means a regression.
+
+Usage:
+    python benchmarks/startup.py [--runs 5] [--save-baseline benchmarks/startup_baseline.json]
+    python benchmarks/startup.py --baseline benchmarks/startup_baseline.json [--tolerance 0.25]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = [
+    "langchain", "chromadb", "openai", "tiktoken", "plotly", "pandas",
+    "pyarrow", "pdf2image", "pytesseract", "PyPDF2", "numpy",
+]
+
+METRICS = ["import_seconds", "first_render_seconds", "new_session_render_seconds"]
+
+
+def measure():
+    """Runs inside the fresh interpreter; prints one JSON result"""
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+
+    import streamlit  # noqa: F401  (baseline: the framework itself)
+    from streamlit.testing.v1 import AppTest
+    preloaded = {name for name in HEAVY_MODULES if name in sys.modules}
+
+    started = time.perf_counter()
+    import config.settings  # noqa: F401
+    import components.sidebar  # noqa: F401
+    import components.chat_interface  # noqa: F401
+    import_seconds = time.perf_counter() - started
+
+    def render():
+        app = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=120)
+        app.secrets["OPENAI_API_KEY"] = os.environ.get("OPENAI_API_KEY", "sk-startup-benchmark")
+        started = time.perf_counter()
+        app.run()
+        if app.exception:
+            raise SystemExit(f"app.py raised during first render: {app.exception[0].value}")
+        return time.perf_counter() - started
+
+    first_render_seconds = render()
+    heavy = sorted(name for name in HEAVY_MODULES if name in sys.modules and name not in preloaded)
+    new_session_render_seconds = render()
+
+    print(json.dumps({
+        "import_seconds": import_seconds,
+        "first_render_seconds": first_render_seconds,
+        "new_session_render_seconds": new_session_render_seconds,
+        "heavy_modules": heavy,
+    }))
+
+
+def run_once():
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child"],
+        capture_output=True, text=True, cwd=ROOT
+    )
+    if completed.returncode != 0:
+        raise SystemExit(completed.stderr or completed.stdout)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--baseline", help="compare against this saved result")
+    parser.add_argument("--save-baseline", help="write the result here as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    parser.add_argument("--max-import-seconds", type=float, default=2.0)
+    parser.add_argument("--max-first-render-seconds", type=float, default=4.0)
+    parser.add_argument("--max-new-session-render-seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    if args.child:
+        measure()
+        return
+
+    runs = [run_once() for _ in range(args.runs)]
+    result = {metric: round(statistics.median(run[metric] for run in runs), 3) for metric in METRICS}
+    result["heavy_modules"] = sorted({name for run in runs for name in run["heavy_modules"]})
+    result["runs"] = args.runs
+    print(json.dumps(result))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        limits = {metric: baseline[metric] * (1 + args.tolerance) for metric in METRICS}
+    else:
+        limits = {
+            "import_seconds": args.max_import_seconds,
+            "first_render_seconds": args.max_first_render_seconds,
+            "new_session_render_seconds": args.max_new_session_render_seconds,
+        }
+
+    failures = [
+        f"{metric} {result[metric]:.3f}s exceeds {limits[metric]:.3f}s"
+        for metric in METRICS if result[metric] > limits[metric]
+    ]
+    if result["heavy_modules"]:
+        failures.append(f"first render imported {', '.join(result['heavy_modules'])}")
+
+    for failure in failures:
+        print(f"REGRESSION: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Process a directory tree of invoices without the Streamlit app.
+
+Files are processed a chunk at a time with InvoiceProcessor (PROCESSING_WORKERS
+in parallel), structured data is extracted with the LLM (several requests in
+flight, as in the app), and each chunk's records are appended to a JSON Lines
+file as soon as it finishes. A manifest records every completed file, so
+rerunning the same command after an interruption skips what is already done
+and only picks up new, changed (size or mtime) and, with --retry-failed,
+previously failed files.
+
+Output directory layout:
+    invoices.jsonl             one extracted invoice per line (documents.jsonl with --no-extract)
+    invoices.manifest.jsonl    one line per completed file: path, size, mtime, status, error
+    invoices.csv, invoices_invoices.parquet, ...   with --export, built from invoices.jsonl
+    trace.jsonl, trace.chrome.json, profile.prof   with --trace / --profile
+
+Usage:
+    python cli.py INPUT_DIR [--output data/batch] [--workers 8] [--llm-concurrency 16]
+                  [--chunk-size 32] [--retry-failed] [--no-extract] [--knowledge-base]
+                  [--export csv parquet json] [--trace] [--profile]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from contextlib import nullcontext
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from config.settings import settings
+from src import tracing
+
+def find_files(input_dir: str) -> List[str]:
+    """Supported invoice files below input_dir, as sorted paths relative to it"""
+    found = []
+    for root, dirs, names in os.walk(input_dir):
+        dirs.sort()
+        for name in sorted(names):
+            if os.path.splitext(name)[1].lower() in settings.SUPPORTED_FORMATS:
+                found.append(os.path.relpath(os.path.join(root, name), input_dir))
+    return found
+
+
+def fingerprint(path: str) -> Dict:
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+class Manifest:
+    """Append-only record of completed files, paired with the results file it vouches for.
+
+    Each entry stores the results file's size after that file's records were
+    written. Records beyond the last entry belong to a chunk that was
+    interrupted before it was committed, so opening the manifest truncates
+    them away (they are redone), along with a torn trailing manifest line.
+    """
+
+    def __init__(self, path: str, results_path: str):
+        self.path = path
+        self.results_path = results_path
+        self.entries: Dict[str, Dict] = {}
+        committed = 0
+        results_end = 0
+
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    self.entries[entry["path"]] = entry
+                    committed += len(line)
+                    results_end = entry["results_end"]
+            if committed < os.path.getsize(path):
+                os.truncate(path, committed)
+
+        if os.path.exists(results_path) and os.path.getsize(results_path) > results_end:
+            os.truncate(results_path, results_end)
+
+    def is_done(self, rel_path: str, stamp: Dict, retry_failed: bool) -> bool:
+        entry = self.entries.get(rel_path)
+        if entry is None or entry["size"] != stamp["size"] or entry["mtime_ns"] != stamp["mtime_ns"]:
+            return False
+        return entry["status"] == "ok" or not retry_failed
+
+    def commit(self, entries: List[Dict]) -> None:
+        """Append entries once the results they point at are on disk"""
+        with open(self.path, "a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                self.entries[entry["path"]] = entry
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def chunks(items: List, size: int) -> Iterator[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def process_chunk(rel_paths: List[str], args, processor, llm_handler) -> List[Tuple[str, List[Dict], Optional[str]]]:
+    """Process one chunk; returns (rel_path, records to write, error) per file in order"""
+    file_paths = [os.path.join(args.input_dir, rel_path) for rel_path in rel_paths]
+    documents = processor.process_multiple_files(file_paths)
+    for rel_path, document in zip(rel_paths, documents):
+        # Names repeat across a directory tree; keep the path the record came from
+        document["source_path"] = rel_path
+
+    if llm_handler and args.knowledge_base:
+        llm_handler.create_vector_store([d for d in documents if "error" not in d])
+
+    if args.no_extract:
+        return [
+            (rel_path, [] if "error" in document else [document], document.get("error"))
+            for rel_path, document in zip(rel_paths, documents)
+        ]
+
+    # extract_batch runs extract_structured_data's prompt for the chunk with
+    # adaptive concurrency; it skips failed documents and keeps the rest in order
+    extracted = iter(llm_handler.extract_batch(documents))
+    outcomes = []
+    for rel_path, document in zip(rel_paths, documents):
+        if "error" in document:
+            outcomes.append((rel_path, [], document["error"]))
+            continue
+        invoice = next(extracted)
+        invoice["source_path"] = rel_path
+        outcomes.append((rel_path, [invoice], invoice.get("error")))
+    return outcomes
+
+
+def latest_records(results_path: str) -> Iterator[Dict]:
+    """Records from the results file, keeping only the newest for each source_path"""
+    last_line = {}
+    with open(results_path, encoding="utf-8") as f:
+        for number, line in enumerate(f):
+            last_line[json.loads(line).get("source_path")] = number
+    keep = set(last_line.values())
+    with open(results_path, encoding="utf-8") as f:
+        for number, line in enumerate(f):
+            if number in keep:
+                yield json.loads(line)
+
+
+def export(results_path: str, formats: List[str], output_dir: str) -> List[str]:
+    """Write the accumulated invoices in the requested formats with DataExtractor"""
+    from src.data_extractor import DataExtractor
+
+    # DataExtractor writes to EXPORT_DIR; exports land next to the results instead
+    settings.EXPORT_DIR = output_dir
+    extractor = DataExtractor()
+    base = os.path.splitext(os.path.basename(results_path))[0]
+    written = []
+    for fmt in formats:
+        if fmt == "csv":
+            written.append(extractor.save_to_csv(latest_records(results_path), f"{base}.csv"))
+        elif fmt == "json":
+            written.append(extractor.save_to_json(latest_records(results_path), f"{base}.json"))
+        elif fmt == "parquet":
+            written.extend(extractor.save_to_parquet(latest_records(results_path), base).values())
+    return written
+
+
+def run(args) -> int:
+    settings.PROCESSING_WORKERS = args.workers
+    if args.llm_concurrency:
+        settings.LLM_MAX_CONCURRENCY = args.llm_concurrency
+        settings.LLM_INITIAL_CONCURRENCY = min(settings.LLM_INITIAL_CONCURRENCY, args.llm_concurrency)
+
+    needs_llm = not args.no_extract or args.knowledge_base
+    if needs_llm and not settings.OPENAI_API_KEY:
+        print("OPENAI_API_KEY is not set (environment, .env or .streamlit/secrets.toml)", file=sys.stderr)
+        return 2
+
+    os.makedirs(args.output, exist_ok=True)
+    results_path = os.path.join(args.output, "documents.jsonl" if args.no_extract else "invoices.jsonl")
+    # One manifest per results file, so text-only and extraction runs can share an output directory
+    manifest = Manifest(os.path.splitext(results_path)[0] + ".manifest.jsonl", results_path)
+
+    files = find_files(args.input_dir)
+    stamps = {rel_path: fingerprint(os.path.join(args.input_dir, rel_path)) for rel_path in files}
+    pending = [rel_path for rel_path in files if not manifest.is_done(rel_path, stamps[rel_path], args.retry_failed)]
+    print(f"{len(files)} files found, {len(files) - len(pending)} already done, {len(pending)} to process",
+          file=sys.stderr)
+
+    from src.invoice_processor import InvoiceProcessor
+    processor = InvoiceProcessor()
+    llm_handler = None
+    if needs_llm:
+        from src.llm_handler import LLMHandler
+        llm_handler = LLMHandler()
+
+    done = failed = 0
+    started = time.perf_counter()
+    try:
+        for chunk in chunks(pending, args.chunk_size):
+            outcomes = process_chunk(chunk, args, processor, llm_handler)
+
+            entries = []
+            with open(results_path, "a", encoding="utf-8") as f:
+                for rel_path, records, error in outcomes:
+                    for record in records:
+                        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    f.flush()
+                    entries.append({
+                        "path": rel_path,
+                        **stamps[rel_path],
+                        "status": "error" if error else "ok",
+                        "error": error,
+                        "results_end": f.tell(),
+                        "completed_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    })
+                os.fsync(f.fileno())
+            manifest.commit(entries)
+
+            done += len(chunk)
+            failed += sum(1 for entry in entries if entry["status"] == "error")
+            elapsed = time.perf_counter() - started
+            print(f"[{done}/{len(pending)}] {failed} failed, {done / elapsed:.2f} files/s", file=sys.stderr)
+    except KeyboardInterrupt:
+        print(f"Interrupted after {done} files; rerun the same command to resume", file=sys.stderr)
+        return 130
+
+    if args.export and os.path.exists(results_path):
+        for path in export(results_path, args.export, args.output):
+            print(f"Exported {path}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input_dir", help="directory searched recursively for PDF and image invoices")
+    parser.add_argument("--output", default="data/batch", help="results, manifest and exports go here")
+    parser.add_argument("--workers", type=int, default=settings.PROCESSING_WORKERS,
+                        help="files processed in parallel (1 = sequential)")
+    parser.add_argument("--llm-concurrency", type=int, help="most extraction requests in flight")
+    parser.add_argument("--chunk-size", type=int, default=32,
+                        help="files per chunk; results and the manifest are written after each chunk")
+    parser.add_argument("--retry-failed", action="store_true", help="reprocess files that failed last time")
+    parser.add_argument("--no-extract", action="store_true", help="only extract text (no LLM), to documents.jsonl")
+    parser.add_argument("--knowledge-base", action="store_true", help="also add the documents to the knowledge base")
+    parser.add_argument("--export", nargs="+", choices=["csv", "json", "parquet"], default=[],
+                        help="after the run, export all results in these formats")
+    parser.add_argument("--trace", action="store_true",
+                        help="write per-file, per-stage spans as trace.jsonl and trace.chrome.json to --output")
+    parser.add_argument("--profile", action="store_true", help="run under cProfile and save profile.prof to --output")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.input_dir):
+        parser.error(f"not a directory: {args.input_dir}")
+    if args.no_extract and args.export:
+        parser.error("--export needs extracted invoices; drop --no-extract")
+
+    os.makedirs(args.output, exist_ok=True)
+    recording = tracing.record("cli.run", input_dir=args.input_dir) if args.trace else nullcontext()
+    profiling = tracing.profile(os.path.join(args.output, "profile.prof")) if args.profile else nullcontext()
+    with recording as trace, profiling:
+        status = run(args)
+    if trace is not None:
+        trace.export_jsonl(os.path.join(args.output, "trace.jsonl"))
+        trace.export_chrome_trace(os.path.join(args.output, "trace.chrome.json"))
+        for stage in trace.summary()[:10]:
+            print(f"{stage['stage']:<24} {stage['count']:>6}x {stage['seconds']:>10.2f}s", file=sys.stderr)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
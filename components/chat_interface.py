@@ -1,8 +1,15 @@
 import streamlit as st
 from datetime import datetime
 
-def render_chat_interface(llm_handler):
-    """Render the chat interface"""
+# (button label, question) pairs; the questions are answered by QueryRouter without an LLM call
+QUICK_ACTIONS = [
+    ("📊 Summarize All", "Please provide a summary of all invoices including total count, total amount, and key vendors."),
+    ("💰 Total Amount", "What is the total amount across all invoices?"),
+    ("📅 Date Range", "What is the date range of all invoices?"),
+]
+
+def render_chat_interface(get_llm_handler):
+    """Render the chat interface; get_llm_handler is only called once a question is asked"""
     st.markdown("### 💬 Invoice Assistant")
     
     # Initialize chat history
@@ -28,7 +35,10 @@ def render_chat_interface(llm_handler):
         # Get AI response
         with st.chat_message("assistant"):
             with st.spinner("Thinking..."):
-                response = llm_handler.query_invoices(prompt)
+                response = get_llm_handler().query_invoices(
+                    prompt,
+                    st.session_state.get("invoice_table")
+                )
                 
                 st.markdown(response["answer"])
                 if response["sources"]:
@@ -42,22 +52,10 @@ def render_chat_interface(llm_handler):
                 })
     
     # Quick actions
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        if st.button("📊 Summarize All"):
-            question = "Please provide a summary of all invoices including total count, total amount, and key vendors."
-            process_quick_query(question, llm_handler)
-    
-    with col2:
-        if st.button("💰 Total Amount"):
-            question = "What is the total amount across all invoices?"
-            process_quick_query(question, llm_handler)
-    
-    with col3:
-        if st.button("📅 Date Range"):
-            question = "What is the date range of all invoices?"
-            process_quick_query(question, llm_handler)
+    for col, (label, question) in zip(st.columns(len(QUICK_ACTIONS)), QUICK_ACTIONS):
+        with col:
+            if st.button(label):
+                process_quick_query(question, get_llm_handler())
 
 def process_quick_query(question: str, llm_handler):
     """Process a quick query button click"""
@@ -65,7 +63,7 @@ def process_quick_query(question: str, llm_handler):
     st.session_state.messages.append({"role": "user", "content": question})
     
     # Get response
-    response = llm_handler.query_invoices(question)
+    response = llm_handler.query_invoices(question, st.session_state.get("invoice_table"))
     
     # Add response to messages
     st.session_state.messages.append({
@@ -22,7 +22,7 @@ def render_data_viewer(structured_data, aggregated_data):
         render_details(structured_data)
     
     with tab3:
-        render_analytics(structured_data, aggregated_data)
+        render_analytics(st.session_state.invoice_table)
     
     with tab4:
         render_export_options(structured_data)
@@ -118,55 +118,52 @@ def render_details(structured_data):
     else:
         st.warning("No valid invoice data to display")
 
-def render_analytics(structured_data, aggregated_data):
-    """Render analytics and visualizations"""
+def render_analytics(invoice_table):
+    """Render analytics and visualizations from the typed invoice table"""
     st.markdown("### Invoice Analytics")
     
-    # Time series analysis
-    dates_amounts = []
-    for invoice in structured_data:
-        if "error" not in invoice and invoice.get("date") and invoice.get("total"):
-            dates_amounts.append({
-                "Date": invoice["date"],
-                "Amount": invoice["total"]
-            })
+    # Dates and totals were parsed once when the table was built; unparseable ones are NaT/NaN
+    df = invoice_table.frame[["date", "total"]].dropna()
+    if df.empty:
+        st.info("No dated invoice totals to chart yet.")
+        return
     
-    if dates_amounts:
-        df = pd.DataFrame(dates_amounts)
-        df['Date'] = pd.to_datetime(df['Date'])
-        df = df.sort_values('Date')
-        
-        # Line chart
-        fig = px.line(df, x='Date', y='Amount', title='Invoice Amounts Over Time')
+    st.caption(
+        f"Invoices dated {invoice_table.date_min:%Y-%m-%d} to {invoice_table.date_max:%Y-%m-%d}; "
+        f"{format_currency(invoice_table.total_amount)} across all {len(invoice_table)} invoices"
+    )
+    df = df.sort_values("date").rename(columns={"date": "Date", "total": "Amount"})
+    
+    # Line chart
+    fig = px.line(df, x='Date', y='Amount', title='Invoice Amounts Over Time')
+    st.plotly_chart(fig, use_container_width=True)
+    
+    # Monthly aggregation
+    monthly = df.groupby(df['Date'].dt.to_period('M').astype(str))['Amount'].agg(['sum', 'count'])
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        fig = px.bar(
+            x=monthly.index,
+            y=monthly['sum'],
+            title='Monthly Invoice Totals'
+        )
+        st.plotly_chart(fig, use_container_width=True)
+    
+    with col2:
+        fig = px.bar(
+            x=monthly.index,
+            y=monthly['count'],
+            title='Monthly Invoice Count'
+        )
         st.plotly_chart(fig, use_container_width=True)
-        
-        # Monthly aggregation
-        df['Month'] = df['Date'].dt.to_period('M').astype(str)
-        monthly = df.groupby('Month')['Amount'].agg(['sum', 'count', 'mean'])
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            fig = px.bar(
-                x=monthly.index,
-                y=monthly['sum'],
-                title='Monthly Invoice Totals'
-            )
-            st.plotly_chart(fig, use_container_width=True)
-        
-        with col2:
-            fig = px.bar(
-                x=monthly.index,
-                y=monthly['count'],
-                title='Monthly Invoice Count'
-            )
-            st.plotly_chart(fig, use_container_width=True)
 
 def render_export_options(structured_data):
     """Render export options"""
     st.markdown("### Export Data")
     
-    col1, col2 = st.columns(2)
+    col1, col2, col3, col4 = st.columns(4)
     
     with col1:
         if st.button("📥 Download as JSON"):
@@ -174,28 +171,47 @@ def render_export_options(structured_data):
             extractor = DataExtractor()
             file_path = extractor.save_to_json(structured_data)
             st.success(f"JSON file saved: {file_path}")
-            
-            # Create download link
-            with open(file_path, 'r') as f:
-                st.download_button(
-                    label="Click to Download JSON",
-                    data=f.read(),
-                    file_name=os.path.basename(file_path),
-                    mime='application/json'
-                )
+            render_file_download("Click to Download JSON", file_path, 'application/json')
     
     with col2:
+        if st.button("📥 Download as JSON Lines"):
+            from src.data_extractor import DataExtractor
+            extractor = DataExtractor()
+            file_path = extractor.save_to_jsonl(structured_data)
+            st.success(f"JSON Lines file saved: {file_path}")
+            render_file_download("Click to Download JSON Lines", file_path, 'application/x-ndjson')
+    
+    with col3:
         if st.button("📥 Download as CSV"):
             from src.data_extractor import DataExtractor
             extractor = DataExtractor()
             file_path = extractor.save_to_csv(structured_data)
             st.success(f"CSV file saved: {file_path}")
+            render_file_download("Click to Download CSV", file_path, 'text/csv')
+    
+    with col4:
+        if st.button("📥 Download as Parquet"):
+            from src.data_extractor import DataExtractor
+            extractor = DataExtractor()
+            file_paths = extractor.save_to_parquet(structured_data)
+            st.success(f"Parquet files saved: {file_paths['invoices']}")
             
-            # Create download link
-            with open(file_path, 'r') as f:
-                st.download_button(
-                    label="Click to Download CSV",
-                    data=f.read(),
-                    file_name=os.path.basename(file_path),
-                    mime='text/csv'
-                )
\ No newline at end of file
+            # One download per table; they join on invoice_id
+            for table, file_path in file_paths.items():
+                render_file_download(
+                    f"Click to Download {table.replace('_', ' ').title()}",
+                    file_path,
+                    'application/vnd.apache.parquet',
+                    key=f"download_parquet_{table}"
+                )
+
+def render_file_download(label, file_path, mime, key=None):
+    """Serve an export straight from disk; Streamlit reads the handle once, no text copies"""
+    with open(file_path, 'rb') as f:
+        st.download_button(
+            label=label,
+            data=f,
+            file_name=os.path.basename(file_path),
+            mime=mime,
+            key=key
+        )
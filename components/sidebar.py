@@ -1,5 +1,4 @@
 import streamlit as st
-from src.drive_handler import DriveHandler
 from src.utils import cleanup_temp_files
 import os
 from config.settings import settings
@@ -11,7 +10,7 @@ def render_sidebar():
     # Input method selection
     input_method = st.sidebar.radio(
         "Choose input method:",
-        ["Google Drive Link", "Local Upload"]
+        ["Google Drive Link", "Local Upload", "Previous Export"]
     )
     
     files_to_process = []
@@ -27,6 +26,7 @@ def render_sidebar():
             if drive_url:
                 with st.spinner("Downloading from Google Drive..."):
                     try:
+                        from src.drive_handler import DriveHandler
                         drive_handler = DriveHandler()
                         
                         # Validate link
@@ -42,15 +42,22 @@ def render_sidebar():
                             return []
                         
                         if file_type == 'folder':
-                            st.sidebar.warning(
-                                "Folder downloads are not supported yet. "
-                                "Please share individual files instead."
-                            )
+                            # Only list now; files are downloaded concurrently and
+                            # processed as each one lands when processing starts
+                            folder_files = drive_handler.list_folder(file_id)
+                            if not folder_files:
+                                st.sidebar.warning("No supported invoice files found in this folder")
+                                return []
+                            
+                            st.session_state['drive_folder'] = {"id": file_id, "files": folder_files}
+                            st.session_state['files_to_process'] = []
+                            st.sidebar.success(f"Found {len(folder_files)} invoice file(s) in the folder")
                             return []
                         
                         # Download file
                         file_path = drive_handler.download_file(file_id)
                         files_to_process = [file_path]
+                        st.session_state['drive_folder'] = None
                         st.sidebar.success(f"Downloaded 1 file successfully!")
                         st.session_state['files_to_process'] = files_to_process
                         
@@ -59,6 +66,17 @@ def render_sidebar():
             else:
                 st.sidebar.warning("Please enter a Google Drive link")
     
+    elif input_method == "Previous Export":
+        st.sidebar.markdown("### Load Parquet Export")
+        export_files = st.sidebar.file_uploader(
+            "Choose the invoices (and optionally line items) Parquet files",
+            type=['parquet'],
+            accept_multiple_files=True
+        )
+        
+        if export_files and st.sidebar.button("Load Export"):
+            load_parquet_export(export_files)
+    
     else:  # Local Upload
         st.sidebar.markdown("### Local File Upload")
         uploaded_files = st.sidebar.file_uploader(
@@ -79,6 +97,7 @@ def render_sidebar():
                 temp_paths.append(file_path)
             
             st.session_state['files_to_process'] = temp_paths
+            st.session_state['drive_folder'] = None
             st.sidebar.success(f"Uploaded {len(uploaded_files)} file(s)")
     
     # Processing options
@@ -98,4 +117,68 @@ def render_sidebar():
         'extract_data': extract_data,
         'create_kb': create_kb,
         'export_format': export_format
-    }
\ No newline at end of file
+    }
+
+def load_parquet_export(export_files):
+    """Load a previous Parquet export straight into the structured data views"""
+    from src.data_extractor import DataExtractor
+    from src.invoice_table import InvoiceTable
+    
+    os.makedirs(settings.TEMP_DIR, exist_ok=True)
+    paths = {}
+    for export_file in export_files:
+        file_path = os.path.join(settings.TEMP_DIR, export_file.name)
+        with open(file_path, "wb") as f:
+            f.write(export_file.getbuffer())
+        paths["line_items" if "_line_items" in export_file.name else "invoices"] = file_path
+    
+    if "invoices" not in paths:
+        st.sidebar.error("Please include the invoices Parquet file")
+        return
+    
+    try:
+        structured_data = DataExtractor().load_from_parquet(paths["invoices"], paths.get("line_items"))
+    except Exception as e:
+        st.sidebar.error(f"Error loading export: {str(e)}")
+        return
+    
+    st.session_state['structured_data'] = structured_data
+    st.session_state['invoice_table'] = InvoiceTable(structured_data)
+    st.sidebar.success(f"Loaded {len(structured_data)} invoice(s) from export")
+
+def render_diagnostics():
+    """Collapsible per-stage timings of the last processing run, with trace and profile downloads"""
+    with st.sidebar.expander("🩺 Diagnostics"):
+        st.checkbox(
+            "Profile processing runs (cProfile)",
+            key="profile_runs",
+            help="Adds overhead; stats are saved under " + settings.TRACE_DIR
+        )
+        
+        trace = st.session_state.get('trace')
+        if trace is None:
+            st.caption("Process some files to see where the time goes.")
+            return
+        
+        total = sum(span["seconds"] for span in trace.spans if span["parent"] is None)
+        st.caption(f"Last run: {total:.1f}s across {len(trace.spans)} spans")
+        st.dataframe(trace.summary(), hide_index=True, use_container_width=True)
+        
+        st.download_button(
+            "Download trace (JSON Lines)",
+            trace.to_jsonl(),
+            file_name="trace.jsonl",
+            mime="application/jsonl"
+        )
+        st.download_button(
+            "Download Chrome trace",
+            trace.to_chrome_trace(),
+            file_name="trace.json",
+            mime="application/json",
+            help="Open in chrome://tracing or ui.perfetto.dev"
+        )
+        
+        profile = st.session_state.get('profile_report')
+        if profile:
+            st.caption(f"cProfile stats: {profile['path']}")
+            st.code(profile['report'], language="text")
@@ -1,23 +1,123 @@
+import os
 import streamlit as st
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _secret(name, default=None):
+    """Streamlit secret, falling back to the environment (.env) outside `streamlit run`, e.g. for cli.py"""
+    try:
+        if name in st.secrets:
+            return st.secrets[name]
+    except Exception:
+        # No secrets.toml: st.secrets raises on first access
+        pass
+    return os.environ.get(name, default)
+
 
 class Settings:
     # API Keys
-    OPENAI_API_KEY = st.secrets["OPENAI_API_KEY"]
+    OPENAI_API_KEY = _secret("OPENAI_API_KEY")
     
     # Optional HTTP proxy for both OpenAI SDK and LangChain
     # ––– add this line –––
-    OPENAI_PROXY = st.secrets.get("OPENAI_PROXY", None)
+    OPENAI_PROXY = _secret("OPENAI_PROXY")
     
     # OpenAI Settings
     OPENAI_MODEL = "gpt-4o-mini"
     TEMPERATURE = 0.1
     MAX_TOKENS = 4000
     
+    # Extraction Result Cache
+    LLM_CACHE_ENABLED = True
+    LLM_CACHE_DIR = "data/cache/llm"
+    LLM_CACHE_MAX_MB = 100
+    LLM_CACHE_TTL_DAYS = 30
+    
+    # Knowledge Base
+    EMBEDDING_MODEL = "text-embedding-ada-002"
+    EMBEDDING_CACHE_ENABLED = True
+    EMBEDDING_CACHE_DIR = "data/cache/embeddings"
+    EMBEDDING_CACHE_DTYPE = "float16"
+    EMBEDDING_BATCH_SIZE = 512
+    VECTOR_STORE_DIR = "data/vectorstore"
+    VECTOR_COLLECTION_NAME = "invoices"
+    
+    # Prompt Compaction
+    PROMPT_COMPACTION_ENABLED = True
+    PROMPT_TOKEN_BUDGET = 6000
+    
+    # Batch Extraction (adaptive concurrency + retries)
+    LLM_INITIAL_CONCURRENCY = 4
+    LLM_MIN_CONCURRENCY = 1
+    LLM_MAX_CONCURRENCY = 16
+    LLM_LATENCY_TARGET_SECONDS = 30
+    LLM_MAX_RETRIES = 5
+    LLM_BACKOFF_BASE_SECONDS = 1.0
+    LLM_BACKOFF_MAX_SECONDS = 60
+    
     # File Processing
     SUPPORTED_FORMATS = ['.pdf', '.png', '.jpg', '.jpeg']
     MAX_FILE_SIZE_MB = 10
     TEMP_DIR = "data/temp"
     EXPORT_DIR = "data/exports"
+    EXPORT_PARQUET_COMPRESSION = "zstd"
+    PARQUET_ROW_GROUP_SIZE = 10000
+    
+    # Google Drive Downloads
+    DRIVE_DOWNLOAD_URL = "https://drive.google.com/uc"
+    DRIVE_FOLDER_VIEW_URL = "https://drive.google.com/embeddedfolderview"
+    DRIVE_DOWNLOAD_WORKERS = 8
+    DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+    DOWNLOAD_TIMEOUT_SECONDS = 60
+    DOWNLOAD_MAX_RETRIES = 3
+    DOWNLOAD_PARALLEL_CHUNKS = 4
+    DOWNLOAD_PARALLEL_MIN_MB = 20
+    
+    # PDF text layer: engines tried in order, skipping any that are not installed
+    # (pymupdf, pdftotext, pdfplumber, pypdf2); PyPDF2 is always the last resort
+    PDF_TEXT_ENGINES = ["pymupdf", "pdftotext", "pypdf2"]
+    PDF_TEXT_LAYOUT = False  # keep column layout (pdftotext -layout / pdfplumber layout mode)
+    
+    # OCR
+    OCR_DPI = 200
+    # Pages whose text layer has fewer characters than this are OCR'd instead
+    TEXT_LAYER_MIN_CHARS = 25
+    OCR_WORKERS = os.cpu_count() or 1
+    OCR_MAX_IN_FLIGHT_PAGES = 2 * OCR_WORKERS
+    TESSERACT_CONFIG = ""
+    
+    # OCR preprocessing
+    OCR_ADAPTIVE_DPI = True
+    OCR_TARGET_X_HEIGHT = 16  # pixels; tesseract accuracy drops off below ~10
+    OCR_PROBE_DPI = 100
+    OCR_MIN_DPI = 120
+    OCR_MAX_DPI = 300
+    OCR_MAX_PIXELS = 4_000_000  # larger images are decoded/downsampled to about this size
+    OCR_BINARIZE = True
+    OCR_DESKEW = True
+    OCR_DESKEW_MAX_ANGLE = 5
+    OCR_PSM = 3  # tesseract page segmentation mode (3 = automatic)
+    OCR_OEM = 1  # tesseract engine mode (1 = LSTM only)
+    OCR_BACKEND = "batch"  # "batch" (many images per tesseract run) or "per_page"
+    OCR_BATCH_SIZE = 8
+    
+    # Selective re-OCR: a fast low-resolution pass, then full resolution only where confidence is low
+    OCR_REOCR_ENABLED = True
+    OCR_FIRST_PASS_SCALE = 0.6
+    OCR_CONFIDENCE_THRESHOLD = 70  # mean word confidence (0-100) below which a line is re-read
+    OCR_REOCR_PAGE_FRACTION = 0.5  # above this share of low-confidence lines the whole page is re-read
+    OCR_REOCR_MAX_REGIONS = 8
+    
+    # Batch Processing
+    PROCESSING_WORKERS = os.cpu_count() or 1
+    FILE_TIMEOUT_SECONDS = 300
+    
+    # Extracted Text Cache
+    TEXT_CACHE_ENABLED = True
+    TEXT_CACHE_DIR = "data/cache/text"
+    TEXT_CACHE_MAX_MB = 500
     
     # Invoice Extraction Schema
     INVOICE_SCHEMA = {
@@ -42,6 +142,17 @@ class Settings:
         "due_date": "string (YYYY-MM-DD)"
     }
     
+    # Extraction Validation: responses are repaired against models/invoice_schema.py;
+    # fields that cannot be repaired are asked for once more, on their own
+    EXTRACTION_REASK_ENABLED = True
+    
+    # Invoice Analysis (map-reduce over a bounded sample)
+    ANALYSIS_CHUNK_SIZE = 100
+    ANALYSIS_MAX_CHUNKS = 8
+    
+    # Diagnostics (cProfile stats of profiled runs)
+    TRACE_DIR = "data/traces"
+    
     # Streamlit Settings
     PAGE_TITLE = "Smart Invoice Extractor"
     PAGE_ICON = "📄"
@@ -1,29 +1,172 @@
-from typing import List, Optional
+import re
+from typing import Dict, List, Optional, Union
 from datetime import date
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, root_validator, validator
+
+from src.parsing import normalize_date, parse_amount
+
+# Largest difference (in currency units) still treated as rounding
+AMOUNT_TOLERANCE = 0.01
+
+
+def _amount(value) -> Optional[float]:
+    """Coerce "$1,234.50"-style amounts to float; None when no amount was given"""
+    if value is None or (isinstance(value, str) and not re.search(r'\d', value)):
+        return None
+    amount = parse_amount(value)
+    if amount is None:
+        raise ValueError(f"not an amount: {value!r}")
+    return amount
+
+
+def _close(a: float, b: float) -> bool:
+    return abs(a - b) <= AMOUNT_TOLERANCE + 1e-9
+
+
+def _money(amount: float) -> str:
+    return f"{amount:.2f}"
+
 
 class LineItem(BaseModel):
     """Model for invoice line items"""
-    description: str
-    quantity: float
-    unit_price: float
-    total: float
+    description: Optional[str] = None
+    quantity: Optional[float] = None
+    unit_price: Optional[float] = None
+    total: Optional[float] = None
+    # Values derived, or kept despite disagreeing, during validation: {field: note}
+    validation_notes: Dict[str, str] = Field(default_factory=dict, exclude=True)
+
+    class Config:
+        extra = "allow"
+        anystr_strip_whitespace = True
+
+    @validator("quantity", "unit_price", "total", pre=True)
+    def coerce_amount(cls, value):
+        return _amount(value)
+
+    @root_validator(skip_on_failure=True)
+    def repair_total(cls, values):
+        """Derive whichever of quantity, unit_price and total is missing from the two stated; note a total that disagrees"""
+        quantity, unit_price, total = values.get("quantity"), values.get("unit_price"), values.get("total")
+        notes = {}
+        if quantity is not None and unit_price is not None:
+            if total is None:
+                values["total"] = round(quantity * unit_price, 2)
+                notes["total"] = "derived as quantity x unit_price"
+            elif not _close(quantity * unit_price, total):
+                # Discounts and rounding make this legitimate; the stated total is kept
+                notes["total"] = f"quantity x unit_price is {_money(quantity * unit_price)}, kept the stated {_money(total)}"
+        elif total is not None and unit_price:
+            values["quantity"] = round(total / unit_price, 4)
+            notes["quantity"] = "derived as total / unit_price"
+        elif total is not None and quantity:
+            values["unit_price"] = round(total / quantity, 4)
+            notes["unit_price"] = "derived as total / quantity"
+        values["validation_notes"] = notes
+        return values
+
 
 class Invoice(BaseModel):
-    """Model for invoice data"""
-    invoice_number: str
-    date: str
-    vendor_name: str
+    """Model for invoice data; fields the document may lack are nullable"""
+    invoice_number: Optional[str] = None
+    date: Optional[str] = None
+    vendor_name: Optional[str] = None
     vendor_address: Optional[str] = None
-    customer_name: str
+    customer_name: Optional[str] = None
     customer_address: Optional[str] = None
-    items: List[LineItem]
-    subtotal: float
-    tax: float
-    total: float
+    items: List[LineItem] = []
+    subtotal: Optional[float] = None
+    tax: Optional[Union[float, str]] = None
+    total: Optional[float] = None
     payment_terms: Optional[str] = None
     due_date: Optional[str] = None
-    source_file: str
+    source_file: Optional[str] = None
+    # Values derived or overridden during validation: {field: note}, e.g. {"tax": "derived as total - subtotal"}
+    validation_notes: Dict[str, str] = Field(default_factory=dict, exclude=True)
+
+    class Config:
+        extra = "allow"
+        anystr_strip_whitespace = True
+
+    @validator("invoice_number", "vendor_name", "vendor_address", "customer_name", "customer_address",
+               "payment_terms", pre=True)
+    def empty_to_none(cls, value):
+        if isinstance(value, str) and value.strip().lower() in ("", "n/a", "none", "null", "unknown"):
+            return None
+        return value
+
+    @validator("date", "due_date", pre=True)
+    def coerce_date(cls, value):
+        # Placeholders such as "N/A" carry no date
+        if isinstance(value, str) and not re.search(r'\d', value):
+            return None
+        return normalize_date(value)
+
+    @validator("subtotal", "tax", "total", pre=True)
+    def coerce_amount(cls, value, values, field):
+        # A tax rate ("8.25%") is kept as a string for repair_totals to apply to the stated subtotal
+        if field.name == "tax" and isinstance(value, str) and value.strip().endswith("%"):
+            if parse_amount(value.strip()[:-1]) is None or values.get("subtotal") is None:
+                raise ValueError(f"tax given as a rate without a subtotal: {value!r}")
+            return value.strip()
+        return _amount(value)
+
+    @validator("items", pre=True)
+    def coerce_items(cls, value):
+        if value is None:
+            return []
+        if isinstance(value, dict):
+            return [value]
+        return [item for item in value if isinstance(item, dict)] if isinstance(value, list) else value
+
+    @root_validator(skip_on_failure=True)
+    def repair_totals(cls, values):
+        """Fill in one missing amount of subtotal + tax = total from the two the document states.
+
+        Every value set here is recorded in validation_notes; nothing is derived
+        from another derived value or from the line items alone, which may be partial.
+        """
+        items = values.get("items") or []
+        notes = {
+            f"items.{i}.{field}": note
+            for i, item in enumerate(items) for field, note in item.validation_notes.items()
+        }
+        subtotal, tax, total = values.get("subtotal"), values.get("tax"), values.get("total")
+
+        if isinstance(tax, str):
+            tax = round(subtotal * parse_amount(tax[:-1]) / 100, 2)
+            notes["tax"] = f"computed as {values['tax']} of the subtotal"
+
+        stated = lambda name, value: value is not None and name not in notes
+        if subtotal is None and stated("tax", tax) and stated("total", total):
+            subtotal = round(total - tax, 2)
+            notes["subtotal"] = "derived as total - tax"
+        elif tax is None and stated("subtotal", subtotal) and stated("total", total) \
+                and total - subtotal > -AMOUNT_TOLERANCE:
+            tax = round(max(total - subtotal, 0.0), 2)
+            notes["tax"] = "derived as total - subtotal"
+        elif total is None and stated("subtotal", subtotal) and stated("tax", tax):
+            total = round(subtotal + tax, 2)
+            notes["total"] = "derived as subtotal + tax"
+
+        # A misread subtotal, when every line item states a consistent total and they agree with tax and total
+        items_sum = round(sum(item.total for item in items), 2) \
+            if items and all(item.total is not None and "total" not in item.validation_notes for item in items) \
+            else None
+        if None not in (subtotal, tax, total, items_sum) and "subtotal" not in notes \
+                and not _close(subtotal + tax, total) and _close(items_sum + tax, total):
+            notes["subtotal"] = f"changed from {_money(subtotal)} to the line-item sum, which agrees with tax and total"
+            subtotal = items_sum
+
+        values.update(subtotal=subtotal, tax=tax, total=total, validation_notes=notes)
+        return values
+
+    def totals_mismatch(self) -> Optional[str]:
+        """Why subtotal + tax does not give total, if it does not"""
+        if None in (self.subtotal, self.tax, self.total) or _close(self.subtotal + self.tax, self.total):
+            return None
+        return f"subtotal {self.subtotal} + tax {self.tax} does not equal total {self.total}"
+
 
 class InvoiceAnalysis(BaseModel):
     """Model for invoice analysis results"""
@@ -33,4 +176,4 @@ class InvoiceAnalysis(BaseModel):
     total_tax: float
     vendors: dict
     date_range: dict
-    insights: Optional[str] = None# Smart Invoice Extractor System
\ No newline at end of file
+    insights: Optional[str] = None
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Dict, Optional
+
+
+def sha256_file(file_path: str, extra: Optional[Dict] = None) -> str:
+    """Hash a file's bytes (plus optional settings that affect its processing)"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    if extra is not None:
+        digest.update(json.dumps(extra, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """Size-bounded on-disk key/value store with least-recently-used eviction.
+
+    Each entry is one file named after its key; reading an entry bumps its
+    modification time, which is what eviction orders by. Writes go through a
+    temp file and an atomic rename so concurrent workers never see partial data.
+    JSON entries additionally record when they were written so they can expire
+    after ttl_seconds.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, ttl_seconds: Optional[float] = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self._size = sum(self._file_size(path) for path, _ in self._entries())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    yield path, os.path.getmtime(path)
+                except OSError:
+                    # Removed by another process mid-scan
+                    continue
+
+    @staticmethod
+    def _file_size(path: str) -> int:
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the stored bytes for key, or None on a miss"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """Store bytes under key, evicting least-recently-used entries if over budget"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+        self._size += len(data)
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def get_json(self, key: str) -> Optional[Dict]:
+        """Return the stored value for key, or None on a miss or an expired entry"""
+        data = self.get(key)
+        if data is None:
+            return None
+
+        try:
+            entry = json.loads(data)
+            value = entry["value"]
+            expired = (
+                self.ttl_seconds is not None
+                and time.time() - entry["created_at"] > self.ttl_seconds
+            )
+        except (ValueError, KeyError, TypeError):
+            expired = True
+
+        if expired:
+            self.hits -= 1
+            self.misses += 1
+            self.delete(key)
+            return None
+        return value
+
+    def put_json(self, key: str, value: Dict) -> None:
+        entry = {"created_at": time.time(), "value": value}
+        self.put(key, json.dumps(entry, ensure_ascii=False).encode('utf-8'))
+
+    def delete(self, key: str) -> None:
+        path = self._path(key)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            self._size -= size
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        # Rescan rather than trust the running total, other processes share the directory
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        size = sum(self._file_size(path) for path, _ in entries)
+        target = int(self.max_bytes * 0.9)
+
+        for path, _ in entries:
+            if size <= target:
+                break
+            try:
+                entry_size = os.path.getsize(path)
+                os.remove(path)
+                size -= entry_size
+            except OSError:
+                pass
+
+        self._size = size
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size_bytes": self._size,
+        }
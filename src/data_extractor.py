@@ -1,47 +1,229 @@
+import csv
 import json
 import pandas as pd
-from typing import List, Dict, Optional, Union
+import pyarrow as pa
+import pyarrow.parquet as pq
+from typing import Iterable, Iterator, List, Dict, Optional, TextIO, Union
 import os
+import tempfile
 from datetime import datetime
 from config.settings import settings
+from src import tracing
+from src.invoice_table import InvoiceTable
+from src.parsing import parse_amount
+
+INVOICE_COLUMNS = pa.schema([
+    ("invoice_id", pa.int64()),
+    ("invoice_number", pa.string()),
+    ("date", pa.date32()),
+    ("vendor_name", pa.dictionary(pa.int32(), pa.string())),
+    ("vendor_address", pa.string()),
+    ("customer_name", pa.string()),
+    ("customer_address", pa.string()),
+    ("subtotal", pa.float64()),
+    ("tax", pa.float64()),
+    ("total", pa.float64()),
+    ("payment_terms", pa.string()),
+    ("due_date", pa.date32()),
+    ("source_file", pa.string()),
+    ("error", pa.string()),
+])
+
+LINE_ITEM_COLUMNS = pa.schema([
+    ("invoice_id", pa.int64()),
+    ("line_number", pa.int32()),
+    ("description", pa.string()),
+    ("quantity", pa.float64()),
+    ("unit_price", pa.float64()),
+    ("total", pa.float64()),
+])
+
+DATE_FIELDS = ("date", "due_date")
+AMOUNT_FIELDS = ("subtotal", "tax", "total")
+
+def _counted(data: Iterable[Dict], span: tracing.Span) -> Iterator[Dict]:
+    """Pass records through, counting them as the span's rows"""
+    for record in data:
+        span.add("rows")
+        yield record
 
 class DataExtractor:
     def __init__(self):
         self.extracted_data = []
     
-    def save_to_json(self, data: Union[Dict, List[Dict]], filename: str = None) -> str:
-        """Save extracted data to JSON file"""
+    def _export_path(self, filename: Optional[str], extension: str) -> str:
         if filename is None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"invoice_data_{timestamp}.json"
+            filename = f"invoice_data_{timestamp}{extension}"
         
-        filepath = os.path.join(settings.EXPORT_DIR, filename)
         os.makedirs(settings.EXPORT_DIR, exist_ok=True)
+        return os.path.join(settings.EXPORT_DIR, filename)
+    
+    def save_to_json(self, data: Union[Dict, Iterable[Dict]], filename: str = None) -> str:
+        """Save extracted data to JSON file, writing one record at a time"""
+        filepath = self._export_path(filename, ".json")
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        with tracing.span("export", format="json") as span:
+            with open(filepath, 'w', encoding='utf-8') as f:
+                if isinstance(data, dict):
+                    json.dump(data, f, indent=2, ensure_ascii=False)
+                else:
+                    self.write_json_array(_counted(data, span), f)
+            span.set(bytes=os.path.getsize(filepath))
         
         return filepath
     
-    def save_to_csv(self, data: List[Dict], filename: str = None) -> str:
-        """Save extracted data to CSV file"""
+    def save_to_jsonl(self, data: Iterable[Dict], filename: str = None) -> str:
+        """Save extracted data as JSON Lines (one invoice per line)"""
+        filepath = self._export_path(filename, ".jsonl")
+        
+        with tracing.span("export", format="jsonl") as span:
+            with open(filepath, 'w', encoding='utf-8') as f:
+                self.write_jsonl(_counted(data, span), f)
+            span.set(bytes=os.path.getsize(filepath))
+        
+        return filepath
+    
+    def save_to_csv(self, data: Iterable[Dict], filename: str = None) -> str:
+        """Save extracted data to CSV file, flattening and writing row by row"""
+        filepath = self._export_path(filename, ".csv")
+        
+        with tracing.span("export", format="csv") as span:
+            with open(filepath, 'w', encoding='utf-8', newline='') as f:
+                self.write_csv(_counted(data, span), f)
+            span.set(bytes=os.path.getsize(filepath))
+        
+        return filepath
+    
+    def write_json_array(self, data: Iterable[Dict], stream: TextIO) -> None:
+        """Stream a JSON array with the same layout json.dump(..., indent=2) produces"""
+        stream.write("[")
+        count = 0
+        for record in data:
+            stream.write(",\n  " if count else "\n  ")
+            stream.write(json.dumps(record, indent=2, ensure_ascii=False).replace("\n", "\n  "))
+            count += 1
+        stream.write("\n]" if count else "]")
+    
+    def write_jsonl(self, data: Iterable[Dict], stream: TextIO) -> None:
+        for record in data:
+            stream.write(json.dumps(record, ensure_ascii=False))
+            stream.write("\n")
+    
+    def csv_fieldnames(self) -> List[str]:
+        """Leading CSV columns: the flattened invoice schema plus bookkeeping fields"""
+        return list(self.flatten_dict(settings.INVOICE_SCHEMA)) + ["source_file", "error"]
+    
+    def write_csv(self, data: Iterable[Dict], stream: TextIO) -> None:
+        """Write flattened invoices as CSV with a column for every field any invoice has.
+        
+        The header needs the union of all keys, so flattened rows are spooled to
+        a temporary file (not memory) until the last invoice has been seen.
+        """
+        fieldnames = dict.fromkeys(self.csv_fieldnames())
+        with tempfile.TemporaryFile('w+', encoding='utf-8') as spool:
+            for invoice in data:
+                row = self.flatten_dict(invoice)
+                fieldnames.update(dict.fromkeys(row))
+                spool.write(json.dumps(row, ensure_ascii=False, default=str))
+                spool.write("\n")
+            
+            spool.seek(0)
+            writer = csv.DictWriter(stream, fieldnames=list(fieldnames))
+            writer.writeheader()
+            for line in spool:
+                writer.writerow(json.loads(line))
+    
+    def save_to_parquet(self, data: Iterable[Dict], filename: str = None) -> Dict[str, str]:
+        """Save invoices and their line items as two Parquet tables joined by invoice_id.
+        
+        data may be any iterable; rows are converted and written one row group
+        (PARQUET_ROW_GROUP_SIZE invoices) at a time so large exports stream.
+        Returns the paths of the invoices and line-items files.
+        """
         if filename is None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"invoice_data_{timestamp}.csv"
+            filename = f"invoice_data_{timestamp}"
+        base = os.path.splitext(filename)[0]
         
-        filepath = os.path.join(settings.EXPORT_DIR, filename)
         os.makedirs(settings.EXPORT_DIR, exist_ok=True)
+        paths = {
+            "invoices": os.path.join(settings.EXPORT_DIR, f"{base}_invoices.parquet"),
+            "line_items": os.path.join(settings.EXPORT_DIR, f"{base}_line_items.parquet"),
+        }
+        compression = settings.EXPORT_PARQUET_COMPRESSION
+        batch_size = settings.PARQUET_ROW_GROUP_SIZE
+        
+        with tracing.span("export", format="parquet") as span:
+            with pq.ParquetWriter(paths["invoices"], INVOICE_COLUMNS, compression=compression) as invoice_writer, \
+                    pq.ParquetWriter(paths["line_items"], LINE_ITEM_COLUMNS, compression=compression) as item_writer:
+                batch = []
+                for invoice_id, invoice in enumerate(_counted(data, span)):
+                    batch.append((invoice_id, invoice))
+                    if len(batch) >= batch_size:
+                        self._write_parquet_batch(batch, invoice_writer, item_writer)
+                        batch = []
+                if batch:
+                    self._write_parquet_batch(batch, invoice_writer, item_writer)
+            span.set(bytes=sum(os.path.getsize(path) for path in paths.values()))
         
-        # Flatten nested data for CSV
-        flattened_data = []
-        for invoice in data:
-            flat_invoice = self.flatten_dict(invoice)
-            flattened_data.append(flat_invoice)
+        return paths
+    
+    def _write_parquet_batch(self, batch, invoice_writer, item_writer) -> None:
+        columns = {name: [] for name in INVOICE_COLUMNS.names}
+        items = {name: [] for name in LINE_ITEM_COLUMNS.names}
         
-        df = pd.DataFrame(flattened_data)
-        df.to_csv(filepath, index=False)
+        for invoice_id, invoice in batch:
+            for name in INVOICE_COLUMNS.names:
+                value = invoice_id if name == "invoice_id" else invoice.get(name)
+                if name in AMOUNT_FIELDS:
+                    value = parse_amount(value)
+                elif value is not None and name not in DATE_FIELDS and name != "invoice_id":
+                    value = str(value)
+                columns[name].append(value)
+            
+            for line_number, item in enumerate(invoice.get("items") or [], 1):
+                if not isinstance(item, dict):
+                    continue
+                items["invoice_id"].append(invoice_id)
+                items["line_number"].append(line_number)
+                items["description"].append(None if item.get("description") is None else str(item["description"]))
+                for name in ("quantity", "unit_price", "total"):
+                    items[name].append(parse_amount(item.get(name)))
         
-        return filepath
+        # Dates are parsed per batch in one vectorized pass
+        for name in DATE_FIELDS:
+            parsed = pd.to_datetime(pd.Series(columns[name], dtype=object), errors="coerce", format="mixed")
+            columns[name] = [None if pd.isna(d) else d.date() for d in parsed]
+        
+        invoice_writer.write_table(pa.table(columns, schema=INVOICE_COLUMNS))
+        if items["invoice_id"]:
+            item_writer.write_table(pa.table(items, schema=LINE_ITEM_COLUMNS))
+    
+    def load_from_parquet(self, invoices_path: str, line_items_path: Optional[str] = None) -> List[Dict]:
+        """Load a Parquet export back into the structured-data shape used by the app"""
+        invoices = pq.read_table(invoices_path).to_pylist()
+        
+        items_by_invoice: Dict[int, List[Dict]] = {}
+        if line_items_path and os.path.exists(line_items_path):
+            for item in pq.read_table(line_items_path).to_pylist():
+                invoice_id = item.pop("invoice_id")
+                item.pop("line_number")
+                items_by_invoice.setdefault(invoice_id, []).append(item)
+        
+        records = []
+        for invoice in invoices:
+            invoice_id = invoice.pop("invoice_id")
+            for name in DATE_FIELDS:
+                if invoice[name] is not None:
+                    invoice[name] = invoice[name].isoformat()
+            if invoice["error"] is not None:
+                records.append({"error": invoice["error"], "source_file": invoice["source_file"]})
+                continue
+            invoice.pop("error")
+            invoice["items"] = items_by_invoice.get(invoice_id, [])
+            records.append(invoice)
+        return records
     
     def flatten_dict(self, d: Dict, parent_key: str = '', sep: str = '_') -> Dict:
         """Flatten nested dictionary for CSV export"""
@@ -55,7 +237,7 @@ class DataExtractor:
                 if v and isinstance(v[0], dict):
                     # Handle list of items
                     items.append((f"{new_key}_count", len(v)))
-                    items.append((f"{new_key}_total", sum(item.get('total', 0) for item in v if isinstance(item, dict))))
+                    items.append((f"{new_key}_total", sum(parse_amount(item.get('total')) or 0 for item in v if isinstance(item, dict))))
                 else:
                     items.append((new_key, str(v)))
             else:
@@ -64,37 +246,5 @@ class DataExtractor:
     
     def aggregate_data(self, structured_data: List[Dict]) -> Dict:
         """Aggregate data from multiple invoices"""
-        if not structured_data:
-            return {}
-        
-        total_amount = 0
-        total_tax = 0
-        vendors = {}
-        date_range = {"min": None, "max": None}
-        
-        for invoice in structured_data:
-            if "error" not in invoice:
-                # Sum totals
-                total_amount += invoice.get("total", 0) or 0
-                total_tax += invoice.get("tax", 0) or 0
-                
-                # Count vendors
-                vendor = invoice.get("vendor_name", "Unknown")
-                vendors[vendor] = vendors.get(vendor, 0) + 1
-                
-                # Track date range
-                invoice_date = invoice.get("date")
-                if invoice_date:
-                    if date_range["min"] is None or invoice_date < date_range["min"]:
-                        date_range["min"] = invoice_date
-                    if date_range["max"] is None or invoice_date > date_range["max"]:
-                        date_range["max"] = invoice_date
-        
-        return {
-            "total_invoices": len(structured_data),
-            "total_amount": total_amount,
-            "total_tax": total_tax,
-            "average_amount": total_amount / len(structured_data) if structured_data else 0,
-            "vendors": vendors,
-            "date_range": date_range
-        }
+        with tracing.span("aggregate", rows=len(structured_data)):
+            return InvoiceTable(structured_data).summary()
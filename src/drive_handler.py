@@ -1,17 +1,76 @@
+import html
+import json
 import os
 import re
-from typing import List, Dict, Optional, Tuple
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, List, Dict, Optional, Tuple
 import requests
-from urllib.parse import urlparse, parse_qs
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlparse, parse_qs, unquote
 import zipfile
 from config.settings import settings
+from src import tracing
+
+# Bytes of an HTML response read while looking for a download confirmation token
+CONFIRM_PEEK_BYTES = 64 * 1024
+
+RETRYABLE_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.ChunkedEncodingError,
+    requests.exceptions.Timeout,
+)
+
+class DriveFolderLister:
+    """Lists a publicly shared folder by parsing Drive's embedded folder view.
+    
+    Any object with a list_files(folder_id) -> [{"id", "name"}] method can be
+    given to DriveHandler instead, e.g. a stand-in for tests.
+    """
+    
+    ENTRY_PATTERN = re.compile(
+        r'id="entry-([\w-]+)".*?<a href="([^"]*)".*?class="flip-entry-title">([^<]*)<',
+        re.DOTALL
+    )
+    
+    def __init__(self, session: requests.Session, base_url: str = None, recursive: bool = False):
+        self.session = session
+        self.base_url = base_url or settings.DRIVE_FOLDER_VIEW_URL
+        self.recursive = recursive
+    
+    def list_files(self, folder_id: str) -> List[Dict]:
+        response = self.session.get(
+            self.base_url,
+            params={"id": folder_id},
+            timeout=settings.DOWNLOAD_TIMEOUT_SECONDS
+        )
+        response.raise_for_status()
+        
+        files = []
+        for entry_id, href, title in self.ENTRY_PATTERN.findall(response.text):
+            if '/folders/' in href:
+                if self.recursive:
+                    files.extend(self.list_files(entry_id))
+                continue
+            files.append({"id": entry_id, "name": html.unescape(title).strip()})
+        return files
+
 
 class DriveHandler:
-    def __init__(self):
+    def __init__(self, base_url: str = None, folder_lister=None):
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
+        # Enough pooled connections for parallel range requests
+        adapter = HTTPAdapter(pool_maxsize=max(
+            10, settings.DOWNLOAD_PARALLEL_CHUNKS, settings.DRIVE_DOWNLOAD_WORKERS
+        ))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.base_url = base_url or settings.DRIVE_DOWNLOAD_URL
+        self.folder_lister = folder_lister or DriveFolderLister(self.session)
+        self.download_errors: List[Dict] = []
     
     def extract_file_id(self, url: str) -> Tuple[Optional[str], str]:
         """Extract file or folder ID from Google Drive URL and determine type"""
@@ -43,67 +102,306 @@ class DriveHandler:
     def download_file(self, file_id: str, file_name: str = None) -> str:
         """Download a single file from Google Drive"""
         try:
-            # Try direct download first
-            download_url = f"https://drive.google.com/uc?export=download&id={file_id}"
-            response = self.session.get(download_url, stream=True)
-            
-            # Check if we need to confirm download (for large files)
-            if 'download_warning' in response.text:
-                # Extract confirmation token
-                for line in response.text.split('\n'):
-                    if 'confirm=' in line:
-                        confirm_token = re.search(r'confirm=([0-9A-Za-z_]+)', line)
-                        if confirm_token:
-                            download_url = f"https://drive.google.com/uc?export=download&confirm={confirm_token.group(1)}&id={file_id}"
-                            response = self.session.get(download_url, stream=True)
-                            break
+            with tracing.span("drive.download", file_id=file_id) as span:
+                # Try direct download first
+                download_url = self.get_direct_download_link(file_id)
+                response = self._get(download_url)
+                
+                # Large files get a virus-scan warning page first; only the headers
+                # and at most the first bytes of that page are looked at
+                prefix = b""
+                confirm_token = self._confirm_token_from_cookies(response)
+                if confirm_token is None and self._is_html(response):
+                    prefix = response.raw.read(CONFIRM_PEEK_BYTES, decode_content=True)
+                    confirm_token = self._confirm_token_from_page(prefix)
+                
+                if confirm_token:
+                    response.close()
+                    download_url = f"{self.base_url}?export=download&confirm={confirm_token}&id={file_id}"
+                    response = self._get(download_url)
+                    prefix = b""
+                
+                # Determine filename
+                if not file_name:
+                    file_name = self._file_name_from_headers(response) or f"invoice_{file_id}.pdf"
+                
+                # Save file
+                file_path = os.path.join(settings.TEMP_DIR, os.path.basename(file_name))
+                os.makedirs(settings.TEMP_DIR, exist_ok=True)
+                
+                # Partial downloads are keyed by file id: names are not unique and the
+                # confirm URL changes between runs
+                part_path = os.path.join(settings.TEMP_DIR, f"{file_id}.part")
+                self.download_url(download_url, file_path, response=response, prefix=prefix, part_path=part_path)
+                span.set(file=os.path.basename(file_path), bytes=os.path.getsize(file_path))
+                return file_path
+        except Exception as e:
+            raise Exception(f"Error downloading file: {str(e)}")
+    
+    def download_url(self, url: str, file_path: str, response: requests.Response = None,
+                     prefix: bytes = b"", part_path: str = None) -> str:
+        """Stream url to file_path through a .part file, resuming with Range requests.
+        
+        response may be an already-open streamed response for url (prefix holds
+        any bytes already read from it). Files of DOWNLOAD_PARALLEL_MIN_MB or more
+        from servers that accept ranges are fetched as parallel byte ranges.
+        
+        part_path defaults to file_path + ".part". A leftover part is only resumed
+        with If-Range set to the ETag (or Last-Modified) it was started with, so
+        if the remote file has changed the server sends all of it (200) and the
+        download starts over.
+        """
+        part_path = part_path or file_path + ".part"
+        validator_path = part_path + ".json"
+        
+        for attempt in range(settings.DOWNLOAD_MAX_RETRIES + 1):
+            offset, validator = self._resume_point(part_path, validator_path)
+            if response is not None and offset:
+                # Left over from an interrupted run: resume rather than start over
+                response.close()
+                response = None
             
-            # Determine filename
-            if not file_name:
-                # Try to get filename from headers
-                content_disposition = response.headers.get('content-disposition')
-                if content_disposition:
-                    filename_match = re.search(r'filename="(.+)"', content_disposition)
-                    if filename_match:
-                        file_name = filename_match.group(1)
-                    else:
-                        file_name = f"invoice_{file_id}.pdf"
+            try:
+                if response is None:
+                    headers = {'Range': f'bytes={offset}-', 'If-Range': validator} if offset else {}
+                    response = self._get(url, headers=headers)
+                    prefix = b""
+                
+                if offset and response.status_code == 206 and self._range_start(response) != offset:
+                    # Not the range asked for; drop the part and ask again for the whole file
+                    self._discard(part_path, validator_path)
+                    continue
+                if offset and response.status_code != 206:
+                    # The file changed (If-Range did not match) or ranges are not supported
+                    offset = 0
+                if not offset:
+                    self._save_validator(validator_path, response)
+                
+                total = int(response.headers.get('Content-Length') or 0)
+                if not offset and not prefix and self._supports_parallel(response, total):
+                    response.close()
+                    self._download_ranges(url, part_path, total, self._validator(response))
                 else:
-                    file_name = f"invoice_{file_id}.pdf"
-            
-            # Save file
-            file_path = os.path.join(settings.TEMP_DIR, file_name)
-            os.makedirs(settings.TEMP_DIR, exist_ok=True)
-            
-            with open(file_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
+                    with open(part_path, 'ab' if offset else 'wb') as f:
+                        f.write(prefix)
+                        for chunk in response.iter_content(chunk_size=settings.DOWNLOAD_CHUNK_SIZE):
+                            if chunk:
+                                f.write(chunk)
+                
+                os.replace(part_path, file_path)
+                self._discard(validator_path)
+                return file_path
+            except RETRYABLE_ERRORS:
+                if attempt == settings.DOWNLOAD_MAX_RETRIES:
+                    raise
+                tracing.current_span().add("retries")
+                time.sleep(min(2 ** attempt, 30))
+            finally:
+                if response is not None:
+                    response.close()
+                response = None
+    
+    def _resume_point(self, part_path: str, validator_path: str) -> Tuple[int, Optional[str]]:
+        """Size of a leftover part and the validator it was started with; (0, None) if it cannot be resumed"""
+        if not os.path.exists(part_path):
+            return 0, None
+        validator = None
+        if os.path.exists(validator_path):
+            with open(validator_path) as f:
+                validator = json.load(f).get("validator")
+        if not validator:
+            # Nothing to check the part against; it may belong to another version of the file
+            self._discard(part_path, validator_path)
+            return 0, None
+        return os.path.getsize(part_path), validator
+    
+    @staticmethod
+    def _validator(response: requests.Response) -> Optional[str]:
+        """The If-Range value for this response's content: a strong ETag, else Last-Modified"""
+        etag = response.headers.get('ETag')
+        if etag and not etag.startswith('W/'):
+            return etag
+        return response.headers.get('Last-Modified')
+    
+    def _save_validator(self, validator_path: str, response: requests.Response) -> None:
+        validator = self._validator(response)
+        if validator:
+            with open(validator_path, 'w') as f:
+                json.dump({"validator": validator}, f)
+        else:
+            self._discard(validator_path)
+    
+    @staticmethod
+    def _range_start(response: requests.Response) -> Optional[int]:
+        match = re.match(r'bytes (\d+)-', response.headers.get('Content-Range', ''))
+        return int(match.group(1)) if match else None
+    
+    @staticmethod
+    def _discard(*paths: str) -> None:
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+    
+    def _get(self, url: str, headers: Dict = None) -> requests.Response:
+        response = self.session.get(
+            url,
+            headers=headers,
+            stream=True,
+            timeout=settings.DOWNLOAD_TIMEOUT_SECONDS
+        )
+        response.raise_for_status()
+        return response
+    
+    def _supports_parallel(self, response: requests.Response, total: int) -> bool:
+        return (
+            settings.DOWNLOAD_PARALLEL_CHUNKS > 1
+            and total >= settings.DOWNLOAD_PARALLEL_MIN_MB * 1024 * 1024
+            and response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+        )
+    
+    def _download_ranges(self, url: str, part_path: str, total: int, validator: Optional[str] = None) -> None:
+        """Fetch [0, total) as parallel byte ranges written in place into part_path"""
+        with open(part_path, 'wb') as f:
+            f.truncate(total)
+        
+        parts = settings.DOWNLOAD_PARALLEL_CHUNKS
+        step = -(-total // parts)
+        ranges = [(start, min(start + step, total) - 1) for start in range(0, total, step)]
+        
+        fd = os.open(part_path, os.O_WRONLY)
+        try:
+            with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+                futures = [
+                    executor.submit(self._download_range, url, fd, start, end, validator)
+                    for start, end in ranges
+                ]
+                for future in futures:
+                    future.result()
+        except Exception:
+            # A half-filled preallocated file cannot be resumed from its size
+            os.close(fd)
+            os.remove(part_path)
+            raise
+        os.close(fd)
+    
+    def _download_range(self, url: str, fd: int, start: int, end: int, validator: Optional[str] = None) -> None:
+        position = start
+        headers = {'If-Range': validator} if validator else {}
+        for attempt in range(settings.DOWNLOAD_MAX_RETRIES + 1):
+            try:
+                response = self._get(url, headers={**headers, 'Range': f'bytes={position}-{end}'})
+                try:
+                    if response.status_code != 206:
+                        # Also what a changed file gets with If-Range; the whole download fails
+                        raise Exception("Server did not honour the byte range request")
+                    for chunk in response.iter_content(chunk_size=settings.DOWNLOAD_CHUNK_SIZE):
+                        if chunk:
+                            os.pwrite(fd, chunk, position)
+                            position += len(chunk)
+                finally:
+                    response.close()
+                if position > end:
+                    return
+            except RETRYABLE_ERRORS:
+                if attempt == settings.DOWNLOAD_MAX_RETRIES:
+                    raise
+                time.sleep(min(2 ** attempt, 30))
+        raise Exception(f"Incomplete byte range {start}-{end}")
+    
+    def _is_html(self, response: requests.Response) -> bool:
+        return response.headers.get('Content-Type', '').lower().startswith('text/html')
+    
+    def _confirm_token_from_cookies(self, response: requests.Response) -> Optional[str]:
+        for name, value in response.cookies.items():
+            if name.startswith('download_warning'):
+                return value
+        return None
+    
+    def _confirm_token_from_page(self, page: bytes) -> Optional[str]:
+        text = page.decode('utf-8', errors='ignore')
+        if 'download_warning' not in text and 'confirm' not in text:
+            return None
+        match = (
+            re.search(r'confirm=([0-9A-Za-z_-]+)', text)
+            or re.search(r'name="confirm"\s+value="([0-9A-Za-z_-]+)"', text)
+        )
+        return match.group(1) if match else None
+    
+    def _file_name_from_headers(self, response: requests.Response) -> Optional[str]:
+        content_disposition = response.headers.get('content-disposition')
+        if not content_disposition:
+            return None
+        match = re.search(r"filename\*=(?:UTF-8'')?([^;]+)", content_disposition, re.IGNORECASE)
+        if match:
+            return unquote(match.group(1).strip().strip('"'))
+        match = re.search(r'filename="?([^";]+)"?', content_disposition)
+        return match.group(1) if match else None
+    
+    def list_folder(self, folder_id: str) -> List[Dict]:
+        """List the supported invoice files ({"id", "name"}) in a shared folder"""
+        with tracing.span("drive.list", folder_id=folder_id) as span:
+            try:
+                files = self.folder_lister.list_files(folder_id)
+            except Exception as e:
+                raise Exception(f"Error listing folder: {str(e)}")
             
-            return file_path
-        except Exception as e:
-            raise Exception(f"Error downloading file: {str(e)}")
+            supported = [
+                f for f in files
+                if os.path.splitext(f["name"])[1].lower() in settings.SUPPORTED_FORMATS
+            ]
+            span.set(files=len(supported))
+            return supported
+    
+    def iter_folder_downloads(self, folder_id: str, files: List[Dict] = None,
+                              max_workers: int = None) -> Iterator[str]:
+        """Download a folder's files concurrently, yielding each path as soon as it lands.
+        
+        Files that fail to download are recorded in self.download_errors as
+        {"file_name", "error", "file_path"} records instead of stopping the rest.
+        """
+        if files is None:
+            files = self.list_folder(folder_id)
+        self.download_errors = []
+        
+        # Two files with the same name must not overwrite each other in TEMP_DIR
+        names = {}
+        for f in files:
+            name = os.path.basename(f["name"])
+            if name in names.values():
+                stem, ext = os.path.splitext(name)
+                name = f"{stem}_{f['id']}{ext}"
+            names[f["id"]] = name
+        
+        executor = ThreadPoolExecutor(max_workers=max_workers or settings.DRIVE_DOWNLOAD_WORKERS)
+        try:
+            # Submitted with the caller's context so the downloads show up in its trace
+            futures = {
+                tracing.run_in_context(executor, self.download_file, f["id"], names[f["id"]]): f
+                for f in files
+            }
+            for future in as_completed(futures):
+                try:
+                    yield future.result()
+                except Exception as e:
+                    self.download_errors.append({
+                        "file_name": names[futures[future]["id"]],
+                        "error": str(e),
+                        "file_path": ""
+                    })
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def download_folder(self, folder_id: str) -> List[str]:
+        """Download all supported files from a public Google Drive folder"""
+        return list(self.iter_folder_downloads(folder_id))
     
     def download_folder_as_zip(self, folder_id: str) -> List[str]:
         """Download all files from a public Google Drive folder"""
-        try:
-            # For folders, we'll use a different approach
-            # First, try to download as zip
-            download_url = f"https://drive.google.com/drive/folders/{folder_id}"
-            
-            # Note: Downloading entire folders requires different handling
-            # For now, return a message indicating manual download needed
-            raise NotImplementedError(
-                "Folder download requires manual selection of files. "
-                "Please share individual files or use Google Drive API with authentication."
-            )
-            
-        except Exception as e:
-            raise Exception(f"Error downloading folder: {str(e)}")
+        return self.download_folder(folder_id)
     
     def get_direct_download_link(self, file_id: str) -> str:
         """Generate direct download link for a file"""
-        return f"https://drive.google.com/uc?export=download&id={file_id}"
+        return f"{self.base_url}?export=download&id={file_id}"
     
     def validate_link(self, url: str) -> bool:
         """Validate if the provided link is a valid Google Drive link"""
@@ -0,0 +1,215 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+import numpy as np
+import tiktoken
+from langchain.embeddings.base import Embeddings
+
+from config.settings import settings
+from src import tracing
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Each line of the keys file is a SHA-256 hex digest and a newline
+KEY_LINE_BYTES = 65
+
+
+class CachedEmbeddings(Embeddings):
+    """Wrap an embeddings client with an on-disk cache keyed by (chunk-text hash, model).
+
+    Vectors live in one append-only binary file per model (float16 or float32
+    rows, read through a memory map) next to a keys file holding the SHA-256
+    of each row's text in row order. Only texts missing from the cache are sent
+    to the wrapped client, in batches of EMBEDDING_BATCH_SIZE.
+
+    Several processes (the app and cli.py) may share a cache directory: appends
+    happen under an OS file lock, after picking up rows the others appended.
+    """
+
+    def __init__(self, embeddings: Embeddings, model: str, directory: str = None, dtype: str = None):
+        self.embeddings = embeddings
+        self.model = model
+        self.dtype = np.dtype(dtype or settings.EMBEDDING_CACHE_DTYPE)
+        self.directory = os.path.join(
+            directory or settings.EMBEDDING_CACHE_DIR,
+            re.sub(r'[^A-Za-z0-9_.-]', '_', model)
+        )
+        self._keys_path = os.path.join(self.directory, "keys.txt")
+        self._vectors_path = os.path.join(self.directory, "vectors.bin")
+        self._meta_path = os.path.join(self.directory, "meta.json")
+        self._lock_path = os.path.join(self.directory, "lock")
+        self._lock = threading.Lock()
+        self._encoding = None
+
+        self.hits = 0
+        self.misses = 0
+        self.embedded_tokens = 0
+        self.api_calls = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        with self._file_lock():
+            self._load()
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Exclusive lock on the cache directory, held across processes"""
+        with open(self._lock_path, 'a+b') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _load(self) -> None:
+        self.dim = None
+        self._rows: Dict[str, int] = {}
+        self._row_count = 0
+        self._vectors = None
+
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                meta = json.load(f)
+            if np.dtype(meta["dtype"]) != self.dtype:
+                # Stored with a different precision; start a fresh cache
+                for path in (self._keys_path, self._vectors_path, self._meta_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                return
+            self.dim = meta["dim"]
+
+        if self.dim is None or not os.path.exists(self._keys_path):
+            return
+
+        self._refresh()
+
+    def _rows_on_disk(self) -> int:
+        """Rows complete in both files; a crash between the two appends can leave extra rows in one"""
+        keys = os.path.getsize(self._keys_path) // KEY_LINE_BYTES if os.path.exists(self._keys_path) else 0
+        vectors = os.path.getsize(self._vectors_path) // (self.dim * self.dtype.itemsize) \
+            if os.path.exists(self._vectors_path) else 0
+        return min(keys, vectors)
+
+    def _refresh(self) -> None:
+        """Pick up rows appended by other processes; call with the file lock held"""
+        if self.dim is None:
+            if not os.path.exists(self._meta_path):
+                return
+            with open(self._meta_path) as f:
+                self.dim = json.load(f)["dim"]
+
+        rows = self._rows_on_disk()
+        if rows <= self._row_count:
+            return
+        with open(self._keys_path, 'rb') as f:
+            f.seek(self._row_count * KEY_LINE_BYTES)
+            keys = f.read((rows - self._row_count) * KEY_LINE_BYTES).decode('ascii').split()
+        for i, key in enumerate(keys, self._row_count):
+            self._rows.setdefault(key, i)
+        self._row_count = rows
+        self._map(rows)
+
+    def _map(self, rows: int) -> None:
+        self._vectors = (
+            np.memmap(self._vectors_path, dtype=self.dtype, mode='r', shape=(rows, self.dim))
+            if rows else None
+        )
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def _append(self, keys: List[str], vectors: List[List[float]]) -> None:
+        array = np.asarray(vectors, dtype=self.dtype)
+        with self._file_lock():
+            self._refresh()
+            if self.dim is None:
+                self.dim = array.shape[1]
+                with open(self._meta_path, 'w') as f:
+                    json.dump({"dim": self.dim, "dtype": self.dtype.name}, f)
+
+            # Another process may have cached some of these meanwhile
+            fresh = [i for i, key in enumerate(keys) if key not in self._rows]
+            if not fresh:
+                return
+            keys = [keys[i] for i in fresh]
+
+            # Drop rows of an interrupted append first so row numbers line up with keys
+            start = self._row_count
+            with open(self._vectors_path, 'ab') as f:
+                f.truncate(start * self.dim * self.dtype.itemsize)
+                f.write(array[fresh].tobytes())
+            with open(self._keys_path, 'ab') as f:
+                f.truncate(start * KEY_LINE_BYTES)
+                f.write("".join(f"{key}\n" for key in keys).encode('ascii'))
+
+            for i, key in enumerate(keys, start):
+                self._rows[key] = i
+            self._row_count = start + len(keys)
+            self._map(self._row_count)
+
+    def _count_tokens(self, text: str) -> int:
+        if self._encoding is None:
+            self._encoding = tiktoken.get_encoding("cl100k_base")
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+
+        with self._lock, tracing.span("embeddings", chunks=len(texts)) as span:
+            with self._file_lock():
+                self._refresh()
+            missing: Dict[str, str] = {}
+            for key, text in zip(keys, texts):
+                if key in self._rows:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+                    missing.setdefault(key, text)
+            span.set(cache_hits=len(texts) - len(missing), cache_misses=len(missing))
+
+            miss_keys = list(missing)
+            batch_size = settings.EMBEDDING_BATCH_SIZE
+            for start in range(0, len(miss_keys), batch_size):
+                batch_keys = miss_keys[start:start + batch_size]
+                batch_texts = [missing[key] for key in batch_keys]
+                with tracing.span("embeddings.request", chunks=len(batch_texts)) as request:
+                    vectors = self.embeddings.embed_documents(batch_texts)
+                    tokens = sum(self._count_tokens(text) for text in batch_texts)
+                    request.set(prompt_tokens=tokens)
+                self.api_calls += 1
+                self.embedded_tokens += tokens
+                self._append(batch_keys, vectors)
+
+            return [self._vectors[self._rows[key]].astype(np.float32).tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        # Queries are rarely repeated, so they go straight to the client
+        return self.embeddings.embed_query(text)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "embedded_tokens": self.embedded_tokens,
+            "api_calls": self.api_calls,
+            "cached_vectors": self._row_count,
+        }
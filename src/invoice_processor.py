@@ -1,92 +1,750 @@
+import importlib.util
+import math
 import os
-from typing import List, Dict, Union
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import List, Dict, Iterable, Optional, Union
 import PyPDF2
-from pdf2image import convert_from_path
-import pytesseract
+from pdf2image import convert_from_path, pdfinfo_from_path
 from PIL import Image
-import json
 from config.settings import settings
+from src import tracing
+from src.cache import DiskCache, sha256_file
+from src.ocr_engine import ocr_text, selective_ocr_batch
+from src.ocr_preprocess import choose_dpi, load_image, preprocess, tesseract_config
+
+
+class PdfTextEngine:
+    """Extracts a PDF's text layer page by page; subclasses wrap one library"""
+    
+    name = ""
+    
+    def available(self) -> bool:
+        raise NotImplementedError
+    
+    def page_texts(self, pdf_path: str, last_page: Optional[int] = None) -> List[str]:
+        """Text of each page (up to last_page), "" for pages without a text layer"""
+        raise NotImplementedError
+
+
+class PyPDF2Engine(PdfTextEngine):
+    name = "pypdf2"
+    
+    def available(self) -> bool:
+        return True
+    
+    def page_texts(self, pdf_path: str, last_page: Optional[int] = None) -> List[str]:
+        texts = []
+        with open(pdf_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            for page in pdf_reader.pages[:last_page]:
+                try:
+                    texts.append(page.extract_text() or "")
+                except Exception:
+                    texts.append("")
+        return texts
+
+
+class PyMuPDFEngine(PdfTextEngine):
+    """MuPDF through PyMuPDF: much faster than the pure-Python readers"""
+    
+    name = "pymupdf"
+    
+    def available(self) -> bool:
+        return importlib.util.find_spec("fitz") is not None
+    
+    def page_texts(self, pdf_path: str, last_page: Optional[int] = None) -> List[str]:
+        import fitz
+        
+        with fitz.open(pdf_path) as document:
+            return [page.get_text() for page in document.pages(0, last_page)]
+
+
+class PdfPlumberEngine(PdfTextEngine):
+    """pdfplumber: slower, but keeps the horizontal layout of table rows"""
+    
+    name = "pdfplumber"
+    
+    def available(self) -> bool:
+        return importlib.util.find_spec("pdfplumber") is not None
+    
+    def page_texts(self, pdf_path: str, last_page: Optional[int] = None) -> List[str]:
+        import pdfplumber
+        
+        with pdfplumber.open(pdf_path) as document:
+            texts = []
+            for page in document.pages[:last_page]:
+                texts.append(page.extract_text(layout=settings.PDF_TEXT_LAYOUT) or "")
+                # pdfplumber caches parsed objects per page; drop them as we go
+                page.flush_cache()
+            return texts
+
+
+class PdftotextEngine(PdfTextEngine):
+    """Poppler's pdftotext command (already installed for pdf2image), one run per document"""
+    
+    name = "pdftotext"
+    
+    def available(self) -> bool:
+        return shutil.which("pdftotext") is not None
+    
+    def page_texts(self, pdf_path: str, last_page: Optional[int] = None) -> List[str]:
+        command = ["pdftotext", "-enc", "UTF-8"]
+        if settings.PDF_TEXT_LAYOUT:
+            command.append("-layout")
+        if last_page:
+            command += ["-l", str(last_page)]
+        completed = subprocess.run(command + [pdf_path, "-"], capture_output=True, check=True)
+        # Every page, including the last, ends with a form feed
+        return completed.stdout.decode("utf-8", errors="replace").split("\f")[:-1]
+
+
+PDF_TEXT_ENGINES = {
+    engine.name: engine
+    for engine in (PyMuPDFEngine, PdftotextEngine, PdfPlumberEngine, PyPDF2Engine)
+}
+
+
+def pdf_text_engines() -> List[PdfTextEngine]:
+    """Installed engines in PDF_TEXT_ENGINES order; PyPDF2 is always the last resort"""
+    names = list(settings.PDF_TEXT_ENGINES)
+    if "pypdf2" not in names:
+        names.append("pypdf2")
+    engines = [PDF_TEXT_ENGINES[name]() for name in names if name in PDF_TEXT_ENGINES]
+    return [engine for engine in engines if engine.available()]
+
+
+def _render_page(pdf_path: str, page_num: int, dpi: int, output_folder: str = None) -> Image.Image:
+    with tracing.span("pdf.render", page=page_num, dpi=dpi):
+        return convert_from_path(
+            pdf_path,
+            dpi=dpi,
+            first_page=page_num,
+            last_page=page_num,
+            output_folder=output_folder,
+            grayscale=True
+        )[0]
+
+
+def _ocr_pdf_pages(pdf_path: str, page_numbers: List[int], dpi: int) -> Dict[int, Dict]:
+    """Rasterize a group of PDF pages to disk and OCR them (safe to run in a worker process).
+    
+    With OCR_ADAPTIVE_DPI a cheap low-resolution probe of each page picks the
+    DPI that puts its text at OCR_TARGET_X_HEIGHT pixels; dpi is the fallback.
+    With OCR_REOCR_ENABLED pages are first read at OCR_FIRST_PASS_SCALE of
+    that DPI and only low-confidence parts are re-read at the full DPI. The
+    pages of a group share tesseract invocations under the batch backend, so
+    each page's seconds is its share of the group's time.
+    """
+    started = time.perf_counter()
+    page_dpis = {}
+    first_passes = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for page_num in page_numbers:
+            page_dpi = dpi
+            probe = None
+            if settings.OCR_ADAPTIVE_DPI:
+                probe = _render_page(pdf_path, page_num, settings.OCR_PROBE_DPI)
+                page_dpi = choose_dpi(probe, settings.OCR_PROBE_DPI)
+            page_dpis[page_num] = page_dpi
+            
+            first_pass_dpi = page_dpi
+            if settings.OCR_REOCR_ENABLED:
+                first_pass_dpi = max(settings.OCR_PROBE_DPI, round(page_dpi * settings.OCR_FIRST_PASS_SCALE))
+            if probe is None or first_pass_dpi != settings.OCR_PROBE_DPI:
+                probe = _render_page(pdf_path, page_num, first_pass_dpi, temp_dir)
+            first_passes[page_num] = (first_pass_dpi, probe)
+        
+        if settings.OCR_REOCR_ENABLED:
+            ocr_results = selective_ocr_batch([
+                (first_passes[n][1], lambda n=n: _render_page(pdf_path, n, page_dpis[n], temp_dir))
+                for n in page_numbers
+            ])
+            for page_num, ocr_result in zip(page_numbers, ocr_results):
+                ocr_result["first_pass_dpi"] = first_passes[page_num][0]
+        else:
+            texts = ocr_text([preprocess(first_passes[n][1]) for n in page_numbers])
+            ocr_results = [{"text": text} for text in texts]
+    
+    seconds = (time.perf_counter() - started) / len(page_numbers)
+    return {
+        page_num: {**ocr_result, "seconds": seconds, "dpi": page_dpis[page_num]}
+        for page_num, ocr_result in zip(page_numbers, ocr_results)
+    }
+
+
+def _is_image(file_path: str) -> bool:
+    return os.path.splitext(file_path)[1].lower() in ['.png', '.jpg', '.jpeg']
+
+
+def _batches_images() -> bool:
+    return settings.OCR_BACKEND == "batch" and settings.OCR_BATCH_SIZE > 1
+
 
 class InvoiceProcessor:
-    def __init__(self):
+    def __init__(self, ocr_workers: Optional[int] = None, use_cache: Optional[bool] = None):
         self.processed_invoices = []
+        self.ocr_workers = ocr_workers or settings.OCR_WORKERS
+        
+        if use_cache is None:
+            use_cache = settings.TEXT_CACHE_ENABLED
+        self.text_cache = DiskCache(
+            settings.TEXT_CACHE_DIR,
+            settings.TEXT_CACHE_MAX_MB * 1024 * 1024
+        ) if use_cache else None
+    
+    def extraction_settings(self) -> Dict:
+        """Settings that change the extracted text, and so are part of the cache key"""
+        return {
+            "version": 4,
+            "engines": [engine.name for engine in pdf_text_engines()],
+            "layout": settings.PDF_TEXT_LAYOUT,
+            "text_layer_min_chars": settings.TEXT_LAYER_MIN_CHARS,
+            "dpi": settings.OCR_DPI,
+            "adaptive_dpi": settings.OCR_ADAPTIVE_DPI and {
+                "target_x_height": settings.OCR_TARGET_X_HEIGHT,
+                "probe_dpi": settings.OCR_PROBE_DPI,
+                "min_dpi": settings.OCR_MIN_DPI,
+                "max_dpi": settings.OCR_MAX_DPI,
+            },
+            "max_pixels": settings.OCR_MAX_PIXELS,
+            "binarize": settings.OCR_BINARIZE,
+            "deskew": settings.OCR_DESKEW and settings.OCR_DESKEW_MAX_ANGLE,
+            "tesseract_config": tesseract_config(),
+            "ocr_backend": settings.OCR_BACKEND,
+            "reocr": settings.OCR_REOCR_ENABLED and {
+                "first_pass_scale": settings.OCR_FIRST_PASS_SCALE,
+                "confidence_threshold": settings.OCR_CONFIDENCE_THRESHOLD,
+                "page_fraction": settings.OCR_REOCR_PAGE_FRACTION,
+                "max_regions": settings.OCR_REOCR_MAX_REGIONS,
+            },
+        }
+    
+    def cache_key(self, file_path: str) -> str:
+        return sha256_file(file_path, self.extraction_settings())
+    
+    def _from_cache(self, file_path: str):
+        """Return (cache key, cached result or None); the key is None when caching is off"""
+        if self.text_cache is None:
+            return None, None
+        with tracing.span("text_cache.get", file=os.path.basename(file_path)) as span:
+            key = self.cache_key(file_path)
+            cached = self.text_cache.get_json(key)
+            span.set(**{"cache_hits" if cached is not None else "cache_misses": 1})
+        if cached is None:
+            return key, None
+        return key, {
+            "file_name": os.path.basename(file_path),
+            **cached,
+            "file_path": file_path
+        }
+    
+    def _store_in_cache(self, key: Optional[str], result: Dict) -> None:
+        if key is None or "error" in result:
+            return
+        self.text_cache.put_json(key, {
+            k: v for k, v in result.items() if k not in ("file_name", "file_path")
+        })
+    
+    def cache_stats(self) -> Dict:
+        return self.text_cache.stats() if self.text_cache else {}
         
     def process_file(self, file_path: str) -> Dict:
-        """Process a single invoice file"""
+        """Process a single invoice file, reusing cached text for files seen before"""
+        key, cached = self._from_cache(file_path)
+        if cached is not None:
+            return cached
+        
+        with tracing.span("process_file", file=os.path.basename(file_path)) as span:
+            result = self._extract(file_path)
+            span.set(bytes=os.path.getsize(file_path), pages=len(result.get("pages", [])))
+        self._store_in_cache(key, result)
+        return result
+    
+    def _extract(self, file_path: str) -> Dict:
         file_ext = os.path.splitext(file_path)[1].lower()
         
         if file_ext == '.pdf':
-            text = self.extract_text_from_pdf(file_path)
-        elif file_ext in ['.png', '.jpg', '.jpeg']:
-            text = self.extract_text_from_image(file_path)
+            extracted = self.extract_pdf(file_path)
+        elif _is_image(file_path):
+            result = self._extract_images([file_path])[0]
+            if "error" in result:
+                raise Exception(result["error"])
+            return result
         else:
             raise ValueError(f"Unsupported file format: {file_ext}")
         
         return {
             "file_name": os.path.basename(file_path),
-            "raw_text": text,
+            **extracted,
             "file_path": file_path
         }
     
     def extract_text_from_pdf(self, pdf_path: str) -> str:
-        """Extract text from PDF using PyPDF2 and OCR fallback"""
-        text = ""
+        """Extract text from PDF, using the text layer where present and OCR elsewhere"""
+        return self.extract_pdf(pdf_path)["raw_text"]
+    
+    def extract_pdf(self, pdf_path: str) -> Dict:
+        """Extract a PDF page by page, deciding per page between text layer and OCR.
+        
+        Pages whose text layer has at least TEXT_LAYER_MIN_CHARS characters use
+        it; only the remaining pages are rasterized and OCR'd. Returns
+        {"raw_text", "pages"} where pages records the method and seconds per page.
+        """
+        page_texts = {}
+        pages = {}
         
         try:
-            # Try PyPDF2 first
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page_num in range(len(pdf_reader.pages)):
-                    page = pdf_reader.pages[page_num]
-                    text += page.extract_text() + "\n"
+            engine, texts, seconds = self._read_text_layer(pdf_path)
+            page_count = len(texts)
+            for page_num, (page_text, page_seconds) in enumerate(zip(texts, seconds), 1):
+                if len(page_text.strip()) >= settings.TEXT_LAYER_MIN_CHARS:
+                    page_texts[page_num] = page_text
+                    pages[page_num] = {
+                        "page": page_num,
+                        "method": "text",
+                        "engine": engine,
+                        "seconds": round(page_seconds, 3)
+                    }
+        except Exception:
+            # No engine could read the file at all; OCR every page
+            try:
+                page_count = pdfinfo_from_path(pdf_path)["Pages"]
+            except Exception as e:
+                raise Exception(f"OCR failed: {str(e)}")
+        
+        ocr_pages = [n for n in range(1, page_count + 1) if n not in page_texts]
+        if ocr_pages:
+            try:
+                with tracing.span("ocr.pdf", pages=len(ocr_pages)):
+                    ocr_results = self.ocr_pdf_pages(pdf_path, ocr_pages)
+            except Exception as e:
+                if not page_texts:
+                    raise Exception(f"OCR failed: {str(e)}")
+                # Keep the pages that had a text layer rather than failing the file
+                ocr_results = {}
+                for page_num in ocr_pages:
+                    pages[page_num] = {"page": page_num, "method": "failed", "seconds": 0.0, "error": str(e)}
             
-            # If no text extracted, use OCR
-            if not text.strip():
-                text = self.ocr_pdf(pdf_path)
-                
-        except Exception as e:
-            # Fallback to OCR
-            text = self.ocr_pdf(pdf_path)
+            for page_num, ocr_result in ocr_results.items():
+                page_texts[page_num] = ocr_result["text"]
+                pages[page_num] = {
+                    "page": page_num,
+                    "method": "ocr",
+                    "seconds": round(ocr_result["seconds"], 3),
+                    "dpi": ocr_result["dpi"]
+                }
+                if "confidence" in ocr_result:
+                    pages[page_num]["first_pass_dpi"] = ocr_result["first_pass_dpi"]
+                    pages[page_num]["confidence"] = ocr_result["confidence"]
         
-        return text
+        parts = []
+        for page_num in range(1, page_count + 1):
+            parts.append(f"--- Page {page_num} ---\n{page_texts.get(page_num, '')}\n")
+        
+        return {
+            "raw_text": "".join(parts),
+            "pages": [pages[n] for n in sorted(pages)]
+        }
+    
+    def _read_text_layer(self, pdf_path: str, last_page: Optional[int] = None):
+        """(engine name, page texts, per-page seconds) from the first engine that reads the file"""
+        errors = []
+        for engine in pdf_text_engines():
+            started = time.perf_counter()
+            try:
+                with tracing.span("pdf.text_layer", engine=engine.name) as span:
+                    texts = engine.page_texts(pdf_path, last_page)
+                    span.set(pages=len(texts))
+            except Exception as e:
+                errors.append(f"{engine.name}: {str(e)}")
+                continue
+            seconds = (time.perf_counter() - started) / max(1, len(texts))
+            return engine.name, texts, [seconds] * len(texts)
+        raise Exception("; ".join(errors) or "No PDF text engine available")
     
     def ocr_pdf(self, pdf_path: str) -> str:
-        """OCR PDF using pdf2image and pytesseract"""
+        """OCR PDF using pdf2image and pytesseract, one page at a time"""
         try:
-            images = convert_from_path(pdf_path)
-            text = ""
+            page_count = pdfinfo_from_path(pdf_path)["Pages"]
+            page_texts = self.ocr_pdf_pages(pdf_path, list(range(1, page_count + 1)))
             
-            for i, image in enumerate(images):
-                text += f"--- Page {i+1} ---\n"
-                text += pytesseract.image_to_string(image)
-                text += "\n"
+            parts = []
+            for page_num in range(1, page_count + 1):
+                parts.append(f"--- Page {page_num} ---\n{page_texts[page_num]['text']}\n")
             
-            return text
+            return "".join(parts)
         except Exception as e:
             raise Exception(f"OCR failed: {str(e)}")
     
+    def ocr_pdf_pages(self, pdf_path: str, page_numbers: List[int]) -> Dict[int, Dict]:
+        """OCR the given 1-based PDF pages, returning {"text", "seconds", ...} keyed by page number.
+        
+        Pages are rasterized lazily inside the workers, and at most
+        OCR_MAX_IN_FLIGHT_PAGES pages are submitted at once so memory stays
+        flat regardless of document length. With the batch backend, pages go to
+        the workers in groups of up to OCR_BATCH_SIZE that share tesseract runs.
+        """
+        dpi = settings.OCR_DPI
+        group_size = 1
+        if settings.OCR_BACKEND == "batch":
+            group_size = max(1, min(settings.OCR_BATCH_SIZE, math.ceil(len(page_numbers) / self.ocr_workers)))
+        groups = [page_numbers[i:i + group_size] for i in range(0, len(page_numbers), group_size)]
+        workers = min(self.ocr_workers, len(groups))
+        results = {}
+        
+        if workers <= 1:
+            for group in groups:
+                results.update(_ocr_pdf_pages(pdf_path, group, dpi))
+            return results
+        
+        max_in_flight = max(workers, settings.OCR_MAX_IN_FLIGHT_PAGES // group_size)
+        pending = {}
+        remaining = iter(enumerate(groups))
+        
+        traced = tracing.active()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for group_index, group in remaining:
+                pending[group_index] = executor.submit(tracing.traced_call, traced, _ocr_pdf_pages, pdf_path, group, dpi)
+                if len(pending) >= max_in_flight:
+                    break
+            
+            while pending:
+                # Collect in page order so the window only advances past finished pages
+                group_index = min(pending)
+                group_results, spans = pending.pop(group_index).result()
+                tracing.adopt(spans)
+                results.update(group_results)
+                next_group = next(remaining, None)
+                if next_group is not None:
+                    pending[next_group[0]] = executor.submit(
+                        tracing.traced_call, traced, _ocr_pdf_pages, pdf_path, next_group[1], dpi
+                    )
+        
+        return results
+    
     def extract_text_from_image(self, image_path: str) -> str:
-        """Extract text from image using OCR"""
+        """Extract text from image using OCR, after downscaling and cleaning it up"""
+        return self.ocr_image(image_path)["text"]
+    
+    def ocr_image(self, image_path: str) -> Dict:
+        """OCR an image, returning {"text"} plus "confidence" stats when re-OCR is enabled"""
         try:
-            image = Image.open(image_path)
-            text = pytesseract.image_to_string(image)
-            return text
+            return self._ocr_images([load_image(image_path)])[0]
         except Exception as e:
             raise Exception(f"Image OCR failed: {str(e)}")
     
-    def process_multiple_files(self, file_paths: List[str]) -> List[Dict]:
-        """Process multiple invoice files"""
-        results = []
-        for file_path in file_paths:
+    def _ocr_images(self, images: List[Image.Image]) -> List[Dict]:
+        if not settings.OCR_REOCR_ENABLED:
+            return [{"text": text} for text in ocr_text([preprocess(image) for image in images])]
+        
+        scale = settings.OCR_FIRST_PASS_SCALE
+        return selective_ocr_batch([
+            (
+                image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale)))),
+                lambda image=image: image
+            )
+            for image in images
+        ])
+    
+    def process_images(self, image_paths: List[str]) -> List[Dict]:
+        """Process image files together, OCR'ing the ones not in the cache in shared tesseract batches"""
+        results = {}
+        misses = []
+        for index, image_path in enumerate(image_paths):
+            try:
+                key, cached = self._from_cache(image_path)
+            except Exception as e:
+                results[index] = self._error_result(image_path, e)
+                continue
+            if cached is not None:
+                results[index] = cached
+            else:
+                misses.append((index, image_path, key))
+        
+        extracted = self._extract_images([image_path for _, image_path, _ in misses])
+        for (index, _, key), result in zip(misses, extracted):
+            self._store_in_cache(key, result)
+            results[index] = result
+        
+        return [results[index] for index in range(len(image_paths))]
+    
+    def _extract_images(self, image_paths: List[str]) -> List[Dict]:
+        """OCR images together, returning one result or error record per file"""
+        if not image_paths:
+            return []
+        
+        started = time.perf_counter()
+        results = {}
+        loaded = {}
+        for image_path in image_paths:
             try:
-                result = self.process_file(file_path)
-                results.append(result)
+                with tracing.span("image.load", file=os.path.basename(image_path)) as span:
+                    span.set(bytes=os.path.getsize(image_path))
+                    loaded[image_path] = load_image(image_path)
             except Exception as e:
-                results.append({
-                    "file_name": os.path.basename(file_path),
-                    "error": str(e),
-                    "file_path": file_path
-                })
+                results[image_path] = self._error_result(image_path, f"Image OCR failed: {str(e)}")
+        
+        if loaded:
+            try:
+                with tracing.span("ocr.images", images=len(loaded)):
+                    ocr_results = self._ocr_images(list(loaded.values()))
+            except Exception as e:
+                ocr_results = [e] * len(loaded)
+            seconds = round((time.perf_counter() - started) / len(loaded), 3)
+            
+            for image_path, ocr_result in zip(loaded, ocr_results):
+                if isinstance(ocr_result, Exception):
+                    results[image_path] = self._error_result(image_path, f"Image OCR failed: {str(ocr_result)}")
+                    continue
+                page = {"page": 1, "method": "ocr", "seconds": seconds}
+                if "confidence" in ocr_result:
+                    page["confidence"] = ocr_result["confidence"]
+                results[image_path] = {
+                    "file_name": os.path.basename(image_path),
+                    "raw_text": ocr_result["text"],
+                    "pages": [page],
+                    "file_path": image_path
+                }
+        
+        return [results[image_path] for image_path in image_paths]
+    
+    def process_multiple_files(self, file_paths: Iterable[str], parallel: Optional[bool] = None) -> List[Dict]:
+        """Process multiple invoice files, concurrently unless parallel is False.
+        
+        file_paths may be any iterable (including a generator that yields files
+        as they are downloaded); results always come back in input order.
+        """
+        if parallel is None:
+            parallel = settings.PROCESSING_WORKERS > 1
+        
+        with tracing.span("process_files", parallel=parallel) as span:
+            if parallel:
+                results = self._process_concurrently(file_paths)
+            else:
+                results = self._process_sequentially(file_paths)
+            span.set(files=len(results), errors=sum(1 for result in results if "error" in result))
         
         self.processed_invoices = results
         return results
+    
+    def _process_sequentially(self, file_paths: Iterable[str]) -> List[Dict]:
+        """Process files one at a time, except that the batch OCR backend takes images OCR_BATCH_SIZE at a time"""
+        results: Dict[int, Dict] = {}
+        image_batch = []
+        
+        def flush():
+            for (index, _), result in zip(image_batch, self.process_images([path for _, path in image_batch])):
+                results[index] = result
+            image_batch.clear()
+        
+        for index, file_path in enumerate(file_paths):
+            if _batches_images() and _is_image(file_path):
+                image_batch.append((index, file_path))
+                if len(image_batch) >= settings.OCR_BATCH_SIZE:
+                    flush()
+            else:
+                results[index] = self._process_file_safely(file_path)
+        flush()
+        
+        return [results[index] for index in sorted(results)]
+    
+    def _process_file_safely(self, file_path: str) -> Dict:
+        """Process a single file, turning any failure into an error record"""
+        try:
+            return self.process_file(file_path)
+        except Exception as e:
+            return self._error_result(file_path, e)
+    
+    def _error_result(self, file_path: str, error: Union[Exception, str]) -> Dict:
+        return {
+            "file_name": os.path.basename(file_path),
+            "error": str(error),
+            "file_path": file_path
+        }
+    
+    def needs_ocr(self, file_path: str) -> bool:
+        """Cheaply guess whether a file will need OCR (images, or PDFs without a text layer)"""
+        if os.path.splitext(file_path)[1].lower() != '.pdf':
+            return True
+        try:
+            _, texts, _ = self._read_text_layer(file_path, last_page=2)
+        except Exception:
+            return True
+        return not any(len(text.strip()) >= settings.TEXT_LAYER_MIN_CHARS for text in texts)
+    
+    def _process_concurrently(self, file_paths: Iterable[str]) -> List[Dict]:
+        """Fan files out to a process pool (OCR) or a thread pool (text-layer PDFs).
+        
+        Each pool only ever has as many tasks submitted as it has workers, so a
+        file's timeout clock starts when it actually begins running. A task that
+        exceeds FILE_TIMEOUT_SECONDS per file is reported as an error and
+        abandoned; if all workers of a pool end up stuck, that pool is replaced.
+        
+        With the batch OCR backend, images that arrive while every OCR worker is
+        busy are grouped (up to OCR_BATCH_SIZE) and go to the next free worker
+        as one task sharing tesseract runs, so an idle worker never waits for a
+        batch to fill but a backlog is worked off in batches.
+        """
+        workers = settings.PROCESSING_WORKERS
+        timeout = settings.FILE_TIMEOUT_SECONDS
+        pools = {
+            "process": _FilePool(lambda: ProcessPoolExecutor(max_workers=workers), _process_files_worker),
+            "thread": _FilePool(lambda: ThreadPoolExecutor(max_workers=workers), _process_files_worker),
+        }
+        ocr_pool = pools["process"]
+        results: Dict[int, Dict] = {}
+        running = {}
+        pending_paths = enumerate(file_paths)
+        held = None
+        image_batch = []
+        exhausted = False
+        
+        try:
+            while True:
+                # Top up the pools, holding back a task whose pool is full
+                while True:
+                    if held is None and image_batch and (ocr_pool.busy < workers or ocr_pool.stuck >= workers):
+                        held = (image_batch, "process")
+                        image_batch = []
+                    
+                    if held is None:
+                        item = None if exhausted else next(pending_paths, None)
+                        if item is None:
+                            exhausted = True
+                            break
+                        index, file_path = item
+                        
+                        # Cache lookups happen here so hit/miss counts stay in this process
+                        try:
+                            key, cached = self._from_cache(file_path)
+                        except Exception as e:
+                            results[index] = self._error_result(file_path, e)
+                            continue
+                        if cached is not None:
+                            results[index] = cached
+                            continue
+                        
+                        entry = (index, file_path, key)
+                        if _batches_images() and _is_image(file_path) and ocr_pool.busy >= workers:
+                            image_batch.append(entry)
+                            if len(image_batch) < settings.OCR_BATCH_SIZE:
+                                continue
+                            held = (image_batch, "process")
+                            image_batch = []
+                        else:
+                            held = ([entry], "process" if self.needs_ocr(file_path) else "thread")
+                    
+                    entries, kind = held
+                    pool = pools[kind]
+                    if pool.busy >= workers:
+                        if pool.stuck >= workers:
+                            pool.recycle()
+                        else:
+                            break
+                    
+                    held = None
+                    file_batch = [file_path for _, file_path, _ in entries]
+                    running[pool.submit(file_batch)] = (entries, kind, time.monotonic())
+                
+                if not running:
+                    break
+                
+                now = time.monotonic()
+                next_deadline = min(
+                    started + timeout * len(entries) for entries, _, started in running.values()
+                )
+                done, _ = wait(running, timeout=max(0.0, next_deadline - now), return_when=FIRST_COMPLETED)
+                
+                for future in done:
+                    entries, kind, _ = running.pop(future)
+                    pools[kind].busy -= 1
+                    try:
+                        file_results, spans = future.result()
+                        tracing.adopt(spans)
+                    except Exception as e:
+                        file_results = [self._error_result(file_path, e) for _, file_path, _ in entries]
+                    for (index, _, key), result in zip(entries, file_results):
+                        results[index] = result
+                        self._store_in_cache(key, result)
+                
+                now = time.monotonic()
+                for future, (entries, kind, started) in list(running.items()):
+                    if now - started >= timeout * len(entries):
+                        del running[future]
+                        pools[kind].abandon(future)
+                        for index, file_path, _ in entries:
+                            results[index] = self._error_result(
+                                file_path, f"Processing timed out after {timeout} seconds"
+                            )
+                
+                for pool in pools.values():
+                    pool.reap()
+        finally:
+            for pool in pools.values():
+                pool.shutdown()
+        
+        return [results[index] for index in sorted(results)]
+
+
+def _process_files_worker(file_paths: List[str]) -> List[Dict]:
+    """Process one file, or a batch of images, with page-level OCR parallelism disabled
+    (runs inside a pool worker).
+    
+    Caching is handled by the submitting process.
+    """
+    processor = InvoiceProcessor(ocr_workers=1, use_cache=False)
+    if len(file_paths) == 1:
+        return [processor.process_file(file_paths[0])]
+    return processor.process_images(file_paths)
+
+
+class _FilePool:
+    """An executor plus bookkeeping for submitted and abandoned (timed-out) files"""
+    
+    def __init__(self, factory, worker):
+        self.factory = factory
+        self.worker = worker
+        self.executor = None
+        self.busy = 0
+        self.abandoned = set()
+    
+    @property
+    def stuck(self) -> int:
+        return len(self.abandoned)
+    
+    def submit(self, file_paths: List[str]):
+        if self.executor is None:
+            self.executor = self.factory()
+        self.busy += 1
+        return self.executor.submit(tracing.traced_call, tracing.active(), self.worker, file_paths)
+    
+    def abandon(self, future) -> None:
+        future.cancel()
+        self.abandoned.add(future)
+    
+    def reap(self) -> None:
+        """Release the capacity held by abandoned files that have since finished"""
+        finished = {future for future in self.abandoned if future.done()}
+        self.busy -= len(finished)
+        self.abandoned -= finished
+    
+    def recycle(self) -> None:
+        """Replace an executor whose workers are all stuck on abandoned files"""
+        self.shutdown()
+        self.busy = 0
+        self.abandoned = set()
+    
+    def shutdown(self) -> None:
+        if self.executor is None:
+            return
+        if self.abandoned:
+            # Worker processes stuck on a pathological file are killed outright;
+            # stuck threads cannot be killed and are left to finish on their own
+            for process in list((getattr(self.executor, "_processes", None) or {}).values()):
+                process.terminate()
+        self.executor.shutdown(wait=not self.abandoned, cancel_futures=True)
+        self.executor = None
@@ -0,0 +1,128 @@
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from src.parsing import parse_amount
+
+FRAME_COLUMNS = ["invoice_number", "date", "vendor", "total", "tax", "source_file"]
+
+# Cap on the outlier and duplicate lists so the summary stays compact
+MAX_LISTED = 20
+
+
+def _to_amounts(values: pd.Series) -> pd.Series:
+    """Vectorized numeric conversion; only values that look like "$1,234.50" fall back to parse_amount"""
+    amounts = pd.to_numeric(values, errors="coerce")
+    needs_parsing = amounts.isna() & values.notna()
+    if needs_parsing.any():
+        amounts[needs_parsing] = values[needs_parsing].map(parse_amount).astype("float64")
+    return amounts.astype("float64")
+
+
+def invoice_frame(structured_data: List[Dict]) -> pd.DataFrame:
+    """Build a typed frame (numeric totals/tax, parsed dates) from valid invoice dicts"""
+    valid = [invoice for invoice in structured_data if "error" not in invoice]
+    frame = pd.DataFrame(
+        {
+            "invoice_number": [invoice.get("invoice_number") for invoice in valid],
+            "date": [invoice.get("date") for invoice in valid],
+            "vendor": [invoice.get("vendor_name") for invoice in valid],
+            "total": [invoice.get("total") for invoice in valid],
+            "tax": [invoice.get("tax") for invoice in valid],
+            "source_file": [invoice.get("source_file", "") for invoice in valid],
+        },
+        columns=FRAME_COLUMNS,
+        dtype=object
+    )
+    frame["invoice_number"] = frame["invoice_number"].fillna("").astype(str)
+    frame["vendor"] = frame["vendor"].fillna("Unknown").astype(str).replace("", "Unknown")
+    frame["date"] = pd.to_datetime(frame["date"], errors="coerce", format="mixed")
+    frame["total"] = _to_amounts(frame["total"])
+    frame["tax"] = _to_amounts(frame["tax"])
+    return frame
+
+
+def _records(frame: pd.DataFrame) -> List[Dict]:
+    records = frame[["invoice_number", "vendor", "total", "source_file"]].copy()
+    records["total"] = records["total"].round(2)
+    return records.head(MAX_LISTED).to_dict("records")
+
+
+def find_outliers(frame: pd.DataFrame) -> pd.DataFrame:
+    """Invoices whose total is extreme by z-score (|z| > 3) or by the 1.5 x IQR rule"""
+    totals = frame["total"]
+    valid = totals.dropna()
+    if len(valid) < 4:
+        return frame.iloc[0:0]
+
+    std = valid.std()
+    z = (totals - valid.mean()) / std if std else pd.Series(0.0, index=totals.index)
+    q1, q3 = valid.quantile([0.25, 0.75])
+    iqr = q3 - q1
+    outside_iqr = (totals < q1 - 1.5 * iqr) | (totals > q3 + 1.5 * iqr)
+
+    return frame[(z.abs() > 3) | outside_iqr].sort_values("total", ascending=False)
+
+
+def find_duplicates(frame: pd.DataFrame) -> pd.DataFrame:
+    """Invoices sharing an invoice number with the same vendor"""
+    numbered = frame[frame["invoice_number"] != ""]
+    return numbered[numbered.duplicated(["vendor", "invoice_number"], keep=False)].sort_values(
+        ["vendor", "invoice_number"]
+    )
+
+
+def compute_statistics(structured_data: List[Dict]) -> Dict:
+    """Compute the numeric parts of an invoice analysis locally and vectorized"""
+    frame = invoice_frame(structured_data)
+    totals = frame["total"]
+    dates = frame["date"].dropna()
+    outliers = find_outliers(frame)
+    duplicates = find_duplicates(frame)
+
+    def money(value) -> float:
+        return round(float(value), 2) if pd.notna(value) else 0.0
+
+    return {
+        "invoice_count": len(structured_data),
+        "valid_invoices": len(frame),
+        "failed_extractions": len(structured_data) - len(frame),
+        "invoices_missing_total": int(totals.isna().sum()),
+        "total_amount": money(totals.sum()),
+        "average_amount": money(totals.mean()),
+        "median_amount": money(totals.median()),
+        "min_amount": money(totals.min()),
+        "max_amount": money(totals.max()),
+        "total_tax": money(frame["tax"].sum()),
+        "vendor_frequencies": frame["vendor"].value_counts().head(10).to_dict(),
+        "date_range": {
+            "min": dates.min().strftime("%Y-%m-%d") if not dates.empty else None,
+            "max": dates.max().strftime("%Y-%m-%d") if not dates.empty else None,
+        },
+        "outlier_count": len(outliers),
+        "outliers": _records(outliers),
+        "duplicate_invoice_count": len(duplicates),
+        "duplicate_invoices": _records(duplicates),
+    }
+
+
+def sample_for_review(structured_data: List[Dict], max_records: int) -> pd.DataFrame:
+    """Pick at most max_records invoices for qualitative review.
+
+    Outliers and duplicates are always included first; the rest is an evenly
+    spaced sample in date order so every period is represented.
+    """
+    frame = invoice_frame(structured_data)
+    if len(frame) <= max_records:
+        return frame
+
+    flagged = pd.concat([find_outliers(frame), find_duplicates(frame)])
+    flagged = flagged[~flagged.index.duplicated()].head(max_records)
+
+    rest = frame.drop(flagged.index).sort_values("date")
+    remaining = max_records - len(flagged)
+    if remaining > 0 and len(rest):
+        positions = np.linspace(0, len(rest) - 1, num=min(remaining, len(rest))).astype(int)
+        flagged = pd.concat([flagged, rest.iloc[np.unique(positions)]])
+    return flagged
@@ -0,0 +1,87 @@
+from typing import Dict, List, Optional, Union
+
+import pandas as pd
+
+from src.invoice_stats import FRAME_COLUMNS, invoice_frame
+
+
+class InvoiceTable:
+    """Typed, columnar table of extracted invoices with incrementally maintained aggregates.
+
+    Each call to add() normalizes the new invoices in one vectorized pass
+    (numeric totals/tax, parsed dates) and folds them into running sums,
+    vendor counts and the date range, so summary() costs nothing on rerun.
+    """
+
+    def __init__(self, structured_data: Optional[List[Dict]] = None):
+        self._chunks: List[pd.DataFrame] = []
+        self._frame: Optional[pd.DataFrame] = None
+        self.record_count = 0
+        self.total_amount = 0.0
+        self.total_tax = 0.0
+        self.amount_count = 0
+        self.vendor_counts = pd.Series(dtype="int64")
+        self.date_min: Optional[pd.Timestamp] = None
+        self.date_max: Optional[pd.Timestamp] = None
+
+        if structured_data:
+            self.add(structured_data)
+
+    def __len__(self) -> int:
+        return self.record_count
+
+    def add(self, invoices: List[Dict]) -> None:
+        """Normalize and append invoices (error records count but carry no values)"""
+        if not invoices:
+            return
+
+        chunk = invoice_frame(invoices)
+        self.record_count += len(invoices)
+        self.total_amount += float(chunk["total"].sum())
+        self.total_tax += float(chunk["tax"].sum())
+        self.amount_count += int(chunk["total"].count())
+        self.vendor_counts = self.vendor_counts.add(chunk["vendor"].value_counts(), fill_value=0).astype("int64")
+
+        dates = chunk["date"].dropna()
+        if not dates.empty:
+            low, high = dates.min(), dates.max()
+            self.date_min = low if self.date_min is None else min(self.date_min, low)
+            self.date_max = high if self.date_max is None else max(self.date_max, high)
+
+        self._chunks.append(chunk)
+        self._frame = None
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """All valid invoices as one frame, with vendor stored as a categorical"""
+        if self._frame is None:
+            if self._chunks:
+                frame = pd.concat(self._chunks, ignore_index=True)
+                self._chunks = [frame]
+            else:
+                frame = pd.DataFrame(columns=FRAME_COLUMNS)
+            frame = frame.copy()
+            frame["vendor"] = frame["vendor"].astype("category")
+            self._frame = frame
+        return self._frame
+
+    def summary(self) -> Dict:
+        """Aggregates in the shape DataExtractor.aggregate_data has always returned"""
+        if not self.record_count:
+            return {}
+
+        return {
+            "total_invoices": self.record_count,
+            "total_amount": self.total_amount,
+            "total_tax": self.total_tax,
+            "average_amount": self.total_amount / self.amount_count if self.amount_count else 0,
+            "vendors": {vendor: int(count) for vendor, count in self.vendor_counts.sort_values(ascending=False).items()},
+            "date_range": {
+                "min": self.date_min.strftime("%Y-%m-%d") if self.date_min is not None else None,
+                "max": self.date_max.strftime("%Y-%m-%d") if self.date_max is not None else None,
+            }
+        }
+
+
+def as_invoice_table(invoices: Union["InvoiceTable", List[Dict], None]) -> "InvoiceTable":
+    return invoices if isinstance(invoices, InvoiceTable) else InvoiceTable(invoices or [])
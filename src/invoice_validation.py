@@ -0,0 +1,123 @@
+import json
+import re
+from typing import Dict, List, Tuple
+
+from pydantic import ValidationError
+
+from models.invoice_schema import Invoice
+
+# Fields an extraction is not usable without; re-asked for when missing
+REQUIRED_FIELDS = ["invoice_number", "date", "vendor_name", "total"]
+# Re-asked together when subtotal + tax = total cannot be restored locally
+ARITHMETIC_FIELDS = ["subtotal", "tax", "total"]
+
+_decoder = json.JSONDecoder()
+
+# Cheap fixes for near-JSON, applied only when the response does not parse as is
+_JSON_REPAIRS = [
+    (re.compile(r'[“”]'), '"'),
+    (re.compile(r'[‘’]'), "'"),
+    (re.compile(r',\s*([}\]])'), r'\1'),
+    (re.compile(r'(?<=[:\[,])(\s*)None\b'), r'\1null'),
+    (re.compile(r'(?<=[:\[,])(\s*)True\b'), r'\1true'),
+    (re.compile(r'(?<=[:\[,])(\s*)False\b'), r'\1false'),
+]
+
+
+def _first_object(text: str) -> Dict:
+    """The JSON object starting at the first "{" in text, ignoring anything before or after it"""
+    start = text.find("{")
+    if start == -1:
+        raise ValueError("no JSON object in response")
+    return _decoder.raw_decode(text, start)[0]
+
+
+def parse_json_response(content: str) -> Dict:
+    """Parse the JSON object in an LLM response, tolerating code fences, surrounding
+    prose, trailing commas, smart quotes and Python literals. Raises ValueError."""
+    try:
+        return _first_object(content)
+    except ValueError:
+        pass
+
+    repaired = content
+    for pattern, replacement in _JSON_REPAIRS:
+        repaired = pattern.sub(replacement, repaired)
+    return _first_object(repaired)
+
+
+def validate_invoice(data: Dict) -> Tuple[Dict, Dict[str, str]]:
+    """Validate an extraction against the Invoice model, repairing what can be repaired locally.
+
+    Returns the repaired invoice and {field: reason} for fields that are still
+    wrong: unusable values (set to None), missing required fields and amounts
+    that do not add up (kept as extracted). Values the models derived or kept
+    despite a disagreement are listed in the invoice's "warnings".
+    """
+    candidate = dict(data)
+    warnings = list(candidate.pop("warnings", None) or [])
+    problems: Dict[str, str] = {}
+
+    # Each failed pass drops the offending fields, so the rest are still repaired
+    while True:
+        try:
+            invoice = Invoice.parse_obj(candidate)
+            break
+        except ValidationError as e:
+            for error in e.errors():
+                field = error["loc"][0]
+                path = ".".join(str(part) for part in error["loc"][1:])
+                problems.setdefault(field, f"{path}: {error['msg']}" if path else error["msg"])
+                candidate.pop(field, None)
+
+    result = invoice.dict()
+    notes = dict(invoice.validation_notes)
+    for name in list(problems):
+        # An amount that did not parse may have been derived from the other two
+        if name in notes:
+            notes[name] = f"{problems.pop(name)}; {notes[name]}"
+    warnings.extend(describe_problems(notes))
+    if warnings:
+        result["warnings"] = list(dict.fromkeys(warnings))
+    mismatch = invoice.totals_mismatch()
+    if mismatch:
+        problems.update((name, mismatch) for name in ARITHMETIC_FIELDS)
+    for name in REQUIRED_FIELDS:
+        if result.get(name) is None:
+            problems.setdefault(name, "missing")
+    return result, problems
+
+
+def describe_problems(problems: Dict[str, str]) -> List[str]:
+    """One line per reason, naming the fields it applies to"""
+    by_reason: Dict[str, List[str]] = {}
+    for field, reason in problems.items():
+        by_reason.setdefault(reason, []).append(field)
+    return [f"{', '.join(fields)}: {reason}" for reason, fields in by_reason.items()]
+
+
+def reask_messages(messages: List[Dict], response: str, problems: Dict[str, str]) -> List[Dict]:
+    """The extraction conversation followed by a request for just the fields in problems"""
+    listing = "\n".join(f"- {line}" for line in describe_problems(problems))
+    return messages + [
+        {"role": "assistant", "content": response},
+        {
+            "role": "user",
+            "content": (
+                f"These fields of your answer could not be used:\n{listing}\n\n"
+                f"Check them against the invoice text and return _only_ valid JSON with just these keys: "
+                f"{json.dumps(list(problems))}. Use null for anything the invoice does not state.\n\n"
+                f"JSON Output:"
+            )
+        }
+    ]
+
+
+def merge_reask(invoice: Dict, problems: Dict[str, str], response: str) -> Tuple[Dict, Dict[str, str]]:
+    """Fill the problem fields from a re-ask response and validate again"""
+    try:
+        answer = parse_json_response(response)
+    except ValueError:
+        return invoice, problems
+    updates = {field: answer[field] for field in problems if field in answer}
+    return validate_invoice({**invoice, **updates})
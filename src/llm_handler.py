@@ -1,10 +1,16 @@
 # src/llm_handler.py
 
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Tuple, Union
 import os
 import json
+import time
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import openai
+import tiktoken
 from langchain.llms import OpenAI
 from langchain.embeddings import OpenAIEmbeddings
 from langchain.vectorstores import Chroma
@@ -12,10 +18,20 @@ from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.chains import ConversationalRetrievalChain
 
 from config.settings import settings
+from src import tracing
+from src.cache import DiskCache
+from src.embedding_cache import CachedEmbeddings
+from src.invoice_stats import compute_statistics, sample_for_review
+from src.invoice_table import InvoiceTable
+from src.invoice_validation import describe_problems, merge_reask, parse_json_response, reask_messages, validate_invoice
+from src.prompt_compactor import PromptCompactor
+from src.query_router import QueryRouter
+from src.rate_limit import AdaptiveConcurrencyLimiter, backoff_delay, is_rate_limited, is_retryable
 
 
 class LLMHandler:
-    def __init__(self):
+    def __init__(self, llm=None, embeddings=None):
+        """llm and embeddings replace the OpenAI clients, e.g. with offline stand-ins for benchmarks."""
         # ──── OPENAI KEY & OPTIONAL PROXY ─────────────────────────────────────────
         openai.api_key = settings.OPENAI_API_KEY
 
@@ -28,23 +44,80 @@ class LLMHandler:
         #     os.environ["HTTPS_PROXY"] = proxy
 
         # ──── INITIALIZE LLM & EMBEDDINGS ────────────────────────────────────────
-        self.llm = OpenAI(
+        self.llm = llm or OpenAI(
             model_name=settings.OPENAI_MODEL,
             temperature=settings.TEMPERATURE,
             max_tokens=settings.MAX_TOKENS,
             openai_api_key=settings.OPENAI_API_KEY
         )
-        self.embeddings = OpenAIEmbeddings(
+        self.embeddings = embeddings or OpenAIEmbeddings(
+            model=settings.EMBEDDING_MODEL,
             openai_api_key=settings.OPENAI_API_KEY
         )
+        if settings.EMBEDDING_CACHE_ENABLED:
+            self.embeddings = CachedEmbeddings(self.embeddings, settings.EMBEDDING_MODEL)
 
         # ──── PLACEHOLDERS FOR VECTORSTORE + QA CHAIN ────────────────────────────
         self.vectorstore: Optional[Chroma] = None
         self.qa_chain:   Optional[ConversationalRetrievalChain] = None
+        # The app shares one handler between sessions, so knowledge-base writes are serialized
+        self._kb_lock = threading.Lock()
 
+        # ──── PERSISTENT CACHE OF PARSED EXTRACTIONS ─────────────────────────────
+        self.result_cache: Optional[DiskCache] = None
+        if settings.LLM_CACHE_ENABLED:
+            self.result_cache = DiskCache(
+                settings.LLM_CACHE_DIR,
+                settings.LLM_CACHE_MAX_MB * 1024 * 1024,
+                ttl_seconds=settings.LLM_CACHE_TTL_DAYS * 24 * 3600
+            )
+
+        # ──── PROMPT COMPACTION ──────────────────────────────────────────────────
+        self.compactor: Optional[PromptCompactor] = (
+            PromptCompactor() if settings.PROMPT_COMPACTION_ENABLED else None
+        )
+        self._encoding = None
+
+        # ──── WARM-START THE KNOWLEDGE BASE FROM DISK ────────────────────────────
+        self.load_vector_store()
+
+
+    def extraction_cache_key(self, text: str) -> str:
+        """Key on the whitespace-normalized text plus everything that shapes the answer."""
+        normalized = " ".join(text.split())
+        parts = {
+            "text":        hashlib.sha256(normalized.encode("utf-8")).hexdigest(),
+            "schema":      hashlib.sha256(
+                json.dumps(settings.INVOICE_SCHEMA, sort_keys=True).encode("utf-8")
+            ).hexdigest(),
+            "model":       settings.OPENAI_MODEL,
+            "temperature": settings.TEMPERATURE,
+            "compaction":  settings.PROMPT_TOKEN_BUDGET if self.compactor else None,
+            # Bump when validation changes what a cached result looks like
+            "validation":  1,
+        }
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+    def _cached_extraction(self, text: str, file_name: str, use_cache: bool):
+        """Return (cache key, cached result or None); the key is None when caching is off."""
+        cache_key = self.extraction_cache_key(text) if self.result_cache else None
+        if cache_key and use_cache:
+            cached = self.result_cache.get_json(cache_key)
+            if cached is not None:
+                cached["source_file"] = file_name
+                return cache_key, cached
+        return cache_key, None
+
+
+    def _extraction_messages(self, text: str, file_name: str,
+                             prompt_stats: Optional[Dict[str, Dict]] = None) -> List[Dict]:
+        if self.compactor:
+            stats = self.compactor.compact(text)
+            text = stats.pop("text")
+            if prompt_stats is not None:
+                prompt_stats[file_name] = stats
 
-    def extract_structured_data(self, text: str, file_name: str) -> Dict:
-        """Extract structured JSON from raw invoice text."""
         system = {
             "role":    "system",
             "content": "You are an expert invoice data extractor. Always return valid JSON."
@@ -53,57 +126,234 @@ class LLMHandler:
             "role":    "user",
             "content": (
                 f"Extract the following fields from this invoice, returning _only_ valid JSON "
-                f"matching this schema:\n{json.dumps(settings.INVOICE_SCHEMA, indent=2)}\n\n"
+                f"matching this schema:\n{json.dumps(settings.INVOICE_SCHEMA, separators=(',', ':'))}\n\n"
                 f"Invoice Text:\n{text}\n\n"
                 f"JSON Output:"
             )
         }
+        return [system, user]
 
-        resp = self.llm.invoke([system, user])
-        json_str = resp.content.strip()
 
-        # strip ```json fences if present
-        if json_str.startswith("```json"):
-            json_str = json_str[7:]
-        if json_str.endswith("```"):
-            json_str = json_str[:-3]
+    def _record_tokens(self, span: tracing.Span, messages: List[Dict], completion: str) -> None:
+        """Prompt and completion token counts on a span (only counted while tracing)."""
+        if not tracing.active():
+            return
+        if self._encoding is None:
+            self._encoding = self.compactor.encoding if self.compactor else tiktoken.get_encoding("cl100k_base")
+        count = lambda text: len(self._encoding.encode(text, disallowed_special=()))
+        span.set(
+            prompt_tokens=sum(count(message["content"]) for message in messages),
+            completion_tokens=count(completion)
+        )
+
+
+    @staticmethod
+    def tokens_saved(prompt_stats: Dict[str, Dict]) -> int:
+        """Total input tokens removed by prompt compaction, from the prompt_stats an extraction filled in."""
+        return sum(stats["tokens_saved"] for stats in prompt_stats.values())
+
 
+    def _parse_extraction(self, content: str, file_name: str, span: tracing.Span) -> Tuple[Dict, Dict[str, str]]:
+        """Parse a response and repair it against the Invoice model.
+
+        Returns (invoice, {field: reason} for fields to re-ask for); a response
+        with no parsable JSON gives an error record and nothing to re-ask.
+        """
         try:
-            data = json.loads(json_str)
-        except json.JSONDecodeError as e:
+            data = parse_json_response(content)
+        except ValueError as e:
+            span.set(errors=1)
             return {
                 "error":        f"JSON parse error: {e}",
-                "raw_response": resp.content,
+                "raw_response": content,
                 "source_file":  file_name
-            }
+            }, {}
 
-        data["source_file"] = file_name
-        return data
+        invoice, problems = validate_invoice(data)
+        span.set(repaired_fields=sum(
+            1 for field, value in invoice.items()
+            if field in data and field not in problems and value != data[field]
+        ))
+        return invoice, problems
 
 
-    def create_vector_store(self, documents: List[Dict]) -> None:
-        """Chunk texts, embed with Chroma, and build a QA chain."""
-        texts:     List[str] = []
-        metadatas: List[Dict] = []
-        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    def _reask(self, messages: List[Dict], content: str, problems: Dict[str, str],
+               span: tracing.Span) -> Optional[str]:
+        """Ask once more for just the fields that could not be repaired; None if the request fails."""
+        span.add("reasks")
+        try:
+            return self.llm.invoke(reask_messages(messages, content, problems)).content
+        except Exception as e:
+            span.set(error=str(e))
+            return None
 
-        for doc in documents:
-            raw = doc.get("raw_text") or ""
-            for chunk in splitter.split_text(raw):
-                texts.append(chunk)
-                metadatas.append({
-                    "source":    doc["file_name"],
-                    "file_path": doc.get("file_path", "")
-                })
 
-        if not texts:
-            return
+    async def _areask(self, messages: List[Dict], content: str, problems: Dict[str, str],
+                      span: tracing.Span, limiter: AdaptiveConcurrencyLimiter) -> Optional[str]:
+        span.add("reasks")
+        await limiter.acquire()
+        try:
+            return (await self.llm.ainvoke(reask_messages(messages, content, problems))).content
+        except Exception as e:
+            span.set(error=str(e))
+            return None
+        finally:
+            await limiter.release()
+
+
+    def _finish_extraction(self, invoice: Dict, problems: Dict[str, str], file_name: str,
+                           cache_key: Optional[str]) -> Dict:
+        """Stamp the source file, add fields that are still unusable to the warnings and cache the result."""
+        invoice["source_file"] = file_name
+        if "error" in invoice:
+            return invoice
+        if problems:
+            invoice["warnings"] = invoice.get("warnings", []) + describe_problems(problems)
+        if cache_key:
+            self.result_cache.put_json(cache_key, invoice)
+        return invoice
+
+
+    def extract_structured_data(self, text: str, file_name: str, use_cache: bool = True,
+                                prompt_stats: Optional[Dict[str, Dict]] = None) -> Dict:
+        """Extract structured JSON from raw invoice text.
+
+        Successful results are memoized on disk; pass use_cache=False to force
+        a fresh LLM call (the fresh result still refreshes the cache). Responses
+        are validated and repaired locally; only fields that cannot be repaired
+        are asked for again (EXTRACTION_REASK_ENABLED). Compaction stats for
+        the prompt go into the caller's prompt_stats dict, if given (the handler
+        is shared across sessions, so it keeps no per-run state).
+        """
+        with tracing.span("llm.extract", file=file_name) as span:
+            cache_key, cached = self._cached_extraction(text, file_name, use_cache)
+            if cached is not None:
+                span.set(cache_hits=1)
+                return cached
+
+            messages = self._extraction_messages(text, file_name, prompt_stats)
+            resp = self.llm.invoke(messages)
+            self._record_tokens(span, messages, resp.content)
+            invoice, problems = self._parse_extraction(resp.content, file_name, span)
+            if problems and settings.EXTRACTION_REASK_ENABLED:
+                answer = self._reask(messages, resp.content, problems, span)
+                if answer is None:
+                    # Keep the repaired result, but let the next run try again
+                    cache_key = None
+                else:
+                    invoice, problems = merge_reask(invoice, problems, answer)
+            return self._finish_extraction(invoice, problems, file_name, cache_key)
+
+
+    def extract_batch(
+        self,
+        documents: List[Dict],
+        on_progress: Optional[Callable[[int, int], None]] = None,
+        use_cache: bool = True,
+        prompt_stats: Optional[Dict[str, Dict]] = None
+    ) -> List[Dict]:
+        """Synchronous wrapper around aextract_batch for Streamlit and scripts."""
+        return asyncio.run(self.aextract_batch(documents, on_progress, use_cache, prompt_stats))
+
+
+    async def aextract_batch(
+        self,
+        documents: List[Dict],
+        on_progress: Optional[Callable[[int, int], None]] = None,
+        use_cache: bool = True,
+        prompt_stats: Optional[Dict[str, Dict]] = None
+    ) -> List[Dict]:
+        """Extract structured data for many processed documents concurrently.
+
+        Documents carrying an "error" or no "raw_text" are skipped; results come
+        back in document order. Cache hits are answered up front, the rest are
+        sent with an adaptive number of requests in flight, and on_progress is
+        called with (completed, total) as each document finishes. Pass a dict
+        as prompt_stats to collect per-file compaction stats for this batch.
+        """
+        docs = [d for d in documents if "error" not in d and "raw_text" in d]
+        results: List[Optional[Dict]] = [None] * len(docs)
+        total = len(docs)
+        completed = 0
+
+        def report() -> None:
+            if on_progress:
+                on_progress(completed, total)
+
+        with tracing.span("llm.extract_batch", documents=total) as span:
+            pending = []
+            for i, doc in enumerate(docs):
+                cache_key, cached = self._cached_extraction(doc["raw_text"], doc["file_name"], use_cache)
+                if cached is not None:
+                    results[i] = cached
+                    completed += 1
+                    report()
+                else:
+                    pending.append((i, doc, cache_key))
+
+            limiter = AdaptiveConcurrencyLimiter(
+                initial=settings.LLM_INITIAL_CONCURRENCY,
+                minimum=settings.LLM_MIN_CONCURRENCY,
+                maximum=settings.LLM_MAX_CONCURRENCY,
+                latency_target=settings.LLM_LATENCY_TARGET_SECONDS
+            )
+
+            async def run(i: int, doc: Dict, cache_key: Optional[str]) -> None:
+                nonlocal completed
+                results[i] = await self._aextract_one(doc, cache_key, limiter, prompt_stats)
+                completed += 1
+                report()
+
+            span.set(cache_hits=total - len(pending))
+            await asyncio.gather(*(run(i, doc, key) for i, doc, key in pending))
+            return results
+
+
+    async def _aextract_one(self, doc: Dict, cache_key: Optional[str], limiter: AdaptiveConcurrencyLimiter,
+                            prompt_stats: Optional[Dict[str, Dict]] = None) -> Dict:
+        with tracing.span("llm.extract", file=doc["file_name"]) as span:
+            messages = self._extraction_messages(doc["raw_text"], doc["file_name"], prompt_stats)
+
+            for attempt in range(settings.LLM_MAX_RETRIES + 1):
+                queued = time.monotonic()
+                await limiter.acquire()
+                started = time.monotonic()
+                span.add("queued_seconds", started - queued)
+                try:
+                    resp = await self.llm.ainvoke(messages)
+                except Exception as e:
+                    await limiter.release()
+                    if not is_retryable(e) or attempt == settings.LLM_MAX_RETRIES:
+                        span.set(errors=1, error=str(e))
+                        return {"error": str(e), "source_file": doc["file_name"]}
+                    if is_rate_limited(e):
+                        limiter.on_throttle()
+                    span.add("retries")
+                    await asyncio.sleep(backoff_delay(attempt, e))
+                    continue
 
-        self.vectorstore = Chroma.from_texts(
-            texts=texts,
-            metadatas=metadatas,
-            embedding=self.embeddings
+                limiter.on_success(time.monotonic() - started)
+                await limiter.release()
+                self._record_tokens(span, messages, resp.content)
+                invoice, problems = self._parse_extraction(resp.content, doc["file_name"], span)
+                if problems and settings.EXTRACTION_REASK_ENABLED:
+                    answer = await self._areask(messages, resp.content, problems, span, limiter)
+                    if answer is None:
+                        cache_key = None
+                    else:
+                        invoice, problems = merge_reask(invoice, problems, answer)
+                return self._finish_extraction(invoice, problems, doc["file_name"], cache_key)
+
+
+    def _open_vector_store(self) -> Chroma:
+        return Chroma(
+            collection_name=settings.VECTOR_COLLECTION_NAME,
+            embedding_function=self.embeddings,
+            persist_directory=settings.VECTOR_STORE_DIR
         )
+
+
+    def _build_qa_chain(self) -> None:
         self.qa_chain = ConversationalRetrievalChain.from_llm(
             llm=self.llm,
             retriever=self.vectorstore.as_retriever(search_kwargs={"k": 3}),
@@ -112,15 +362,152 @@ class LLMHandler:
         )
 
 
-    def query_invoices(self, question: str) -> Dict:
-        """Run a stateless QA query against the processed invoices."""
+    def load_vector_store(self) -> bool:
+        """Warm-start the QA chain from the persisted collection, if it has any chunks."""
+        if not os.path.isdir(settings.VECTOR_STORE_DIR):
+            return False
+
+        self.vectorstore = self._open_vector_store()
+        if not self.vectorstore.get(limit=1, include=["metadatas"])["ids"]:
+            return False
+
+        self._build_qa_chain()
+        return True
+
+
+    @staticmethod
+    def _source_path(doc: Dict) -> str:
+        """The document's full path: chunks are keyed on it, since file names repeat across folders."""
+        return os.path.abspath(doc["file_path"]) if doc.get("file_path") else doc["file_name"]
+
+
+    def create_vector_store(self, documents: List[Dict], embedding_stats: Optional[Dict] = None) -> None:
+        """Upsert documents into the persistent Chroma collection and build a QA chain.
+
+        Chunks are keyed by the document's full path and the SHA-256 of its raw
+        text, so only new or changed documents are chunked and embedded, and the
+        chunks of a path's earlier version are deleted. "source" keeps the file
+        name for display. embedding_stats, if given, receives this call's
+        embedding cache hits, misses and embedded tokens.
+        """
+        with self._kb_lock, tracing.span("kb.upsert", documents=len(documents)) as span:
+            if self.vectorstore is None:
+                self.vectorstore = self._open_vector_store()
+            # The cache counters are process-wide; writes are serialized, so the difference is this call's
+            before = self.embedding_stats()
+
+            texts:     List[str] = []
+            metadatas: List[Dict] = []
+            ids:       List[str] = []
+            stale:     List[str] = []
+            seen:      set = set()
+            splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+
+            for doc in documents:
+                raw = doc.get("raw_text") or ""
+                if not raw.strip():
+                    continue
+
+                source_path = self._source_path(doc)
+                if source_path in seen:
+                    continue
+                seen.add(source_path)
+                doc_hash = hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+                existing = self.vectorstore.get(where={"source_path": source_path}, include=["metadatas"])
+                stale.extend(
+                    chunk_id for chunk_id, meta in zip(existing["ids"], existing["metadatas"])
+                    if meta.get("doc_hash") != doc_hash
+                )
+                if any(meta.get("doc_hash") == doc_hash for meta in existing["metadatas"]):
+                    continue
+
+                # Chunks written before they carried source_path are keyed by content alone
+                legacy = self.vectorstore.get(where={"doc_hash": doc_hash}, include=["metadatas"])
+                stale.extend(
+                    chunk_id for chunk_id, meta in zip(legacy["ids"], legacy["metadatas"])
+                    if "source_path" not in meta and meta.get("source") == doc["file_name"]
+                )
+
+                path_id = hashlib.sha256(source_path.encode("utf-8")).hexdigest()[:16]
+                for i, chunk in enumerate(splitter.split_text(raw)):
+                    texts.append(chunk)
+                    ids.append(f"{path_id}-{doc_hash}-{i}")
+                    metadatas.append({
+                        "source":      doc["file_name"],
+                        "source_path": source_path,
+                        "file_path":   doc.get("file_path", ""),
+                        "doc_hash":    doc_hash
+                    })
+
+            span.set(chunks=len(texts), stale_chunks=len(stale))
+            if stale:
+                self.vectorstore.delete(ids=stale)
+            if texts:
+                # Embedding happens inside add_texts
+                with tracing.span("chroma.add", chunks=len(texts)):
+                    self.vectorstore.add_texts(texts=texts, metadatas=metadatas, ids=ids)
+            if stale or texts:
+                self.vectorstore.persist()
+            if embedding_stats is not None:
+                embedding_stats.update(self._embedding_stats_since(before))
+
+            if self.qa_chain is None and self.vectorstore.get(limit=1, include=["metadatas"])["ids"]:
+                self._build_qa_chain()
+
+
+    def embedding_stats(self) -> Dict:
+        """Hit rate and embedded-token counts of the chunk embedding cache since the process started."""
+        if isinstance(self.embeddings, CachedEmbeddings):
+            return self.embeddings.stats()
+        return {}
+
+
+    def _embedding_stats_since(self, before: Dict) -> Dict:
+        after = self.embedding_stats()
+        if not after:
+            return {}
+        delta = {name: after[name] - before[name] for name in ("hits", "misses", "embedded_tokens", "api_calls")}
+        lookups = delta["hits"] + delta["misses"]
+        delta["hit_rate"] = delta["hits"] / lookups if lookups else 0.0
+        return delta
+
+
+    def delete_document(self, file_path: str) -> int:
+        """Remove every chunk of the document at file_path from the collection; returns the chunk count."""
+        with self._kb_lock:
+            if self.vectorstore is None:
+                return 0
+
+            source_path = os.path.abspath(file_path)
+            ids = self.vectorstore.get(where={"source_path": source_path}, include=["metadatas"])["ids"]
+            if ids:
+                self.vectorstore.delete(ids=ids)
+                self.vectorstore.persist()
+            return len(ids)
+
+
+    def query_invoices(self, question: str,
+                       invoices: Optional[Union[InvoiceTable, List[Dict]]] = None) -> Dict:
+        """Answer a question about the processed invoices.
+
+        Aggregate and filter questions (totals, counts, date ranges, per-vendor
+        or per-month breakdowns, top-N) are answered directly from the
+        structured invoices; anything else goes through stateless retrieval QA.
+        """
+        if invoices:
+            routed = QueryRouter(invoices).route(question)
+            if routed is not None:
+                return routed
+
         if not self.qa_chain:
             return {
                 "answer": "No invoices processed yet. Please upload & process first.",
                 "sources": []
             }
 
-        result = self.qa_chain({"question": question, "chat_history": []})
+        with tracing.span("llm.query"):
+            result = self.qa_chain({"question": question, "chat_history": []})
         answer = result.get("answer", "")
         docs   = result.get("source_documents", [])
 
@@ -134,19 +521,45 @@ class LLMHandler:
 
 
     def analyze_invoices(self, structured_data: List[Dict]) -> Dict:
-        """Produce aggregate insights over multiple invoices."""
+        """Produce aggregate insights over multiple invoices.
+
+        Counts, sums, averages, vendor frequencies, date range, outliers and
+        duplicate invoice numbers are computed locally. The model only sees that
+        compact summary plus a bounded sample of invoices, reviewed map-reduce
+        style in chunks, so prompt size stays flat as the dataset grows.
+        """
         if not structured_data:
             return {"error": "No structured data available"}
 
+        statistics = compute_statistics(structured_data)
+        chunk_size = settings.ANALYSIS_CHUNK_SIZE
+        sample = sample_for_review(structured_data, chunk_size * settings.ANALYSIS_MAX_CHUNKS)
+        sample = sample.assign(date=sample["date"].dt.strftime("%Y-%m-%d"))
+        chunks = [
+            sample.iloc[i:i + chunk_size].to_csv(index=False)
+            for i in range(0, len(sample), chunk_size)
+        ]
+
+        # Map: short qualitative notes per chunk, run concurrently
+        if len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+                notes = list(executor.map(self._review_invoice_chunk, chunks))
+            findings = "\n".join(f"Chunk {i + 1}:\n{note}" for i, note in enumerate(notes))
+        else:
+            findings = f"Invoices (CSV):\n{chunks[0] if chunks else '(none)'}"
+
+        # Reduce: combine the exact statistics with the qualitative findings
         prompt = (
-            "You are a financial analyst. Given this list of invoices (JSON), please provide:\n"
+            "You are a financial analyst. The statistics below were computed exactly from "
+            f"{statistics['invoice_count']} invoices; do not recompute them. Please provide:\n"
             "1. Total number of invoices\n"
             "2. Sum of all invoice totals\n"
             "3. Average invoice amount\n"
             "4. Top vendors by frequency\n"
             "5. Date range covered\n"
             "6. Any detected anomalies or patterns\n\n"
-            f"Data:\n{json.dumps(structured_data, indent=2)}\n\n"
+            f"Statistics:\n{json.dumps(statistics, separators=(',', ':'), default=str)}\n\n"
+            f"{findings}\n\n"
             "Analysis:"
         )
         resp = self.llm.invoke([
@@ -156,4 +569,19 @@ class LLMHandler:
         return {
             "analysis":      resp.content,
             "invoice_count": len(structured_data),
+            "statistics":    statistics,
         }
+
+
+    def _review_invoice_chunk(self, invoices_csv: str) -> str:
+        prompt = (
+            "Review these invoices (CSV) and list at most 5 short bullet points on notable "
+            "patterns or anomalies (unusual amounts, vendors, dates or gaps). "
+            "Do not compute totals.\n\n"
+            f"{invoices_csv}"
+        )
+        resp = self.llm.invoke([
+            {"role": "system", "content": "You are a financial analyst."},
+            {"role": "user",   "content": prompt}
+        ])
+        return resp.content.strip()
@@ -0,0 +1,260 @@
+import os
+import shlex
+import subprocess
+import tempfile
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pytesseract
+from PIL import Image
+
+from config.settings import settings
+from src import tracing
+from src.ocr_preprocess import estimate_skew, preprocess, tesseract_config
+
+# Page segmentation mode for re-OCR crops: a single uniform block of text
+REGION_PSM = 6
+
+TSV_FIELDS = ["level", "page_num", "block_num", "par_num", "line_num", "word_num",
+              "left", "top", "width", "height", "conf", "text"]
+
+
+def ocr_data(images: List[Image.Image], psm: Optional[int] = None) -> List[Dict]:
+    """Run tesseract over images, returning word-level image_to_data dicts in order.
+
+    With OCR_BACKEND "batch" the images go to tesseract OCR_BATCH_SIZE at a
+    time as a file list, so process start-up and model loading are paid once
+    per batch instead of once per image.
+    """
+    if not images:
+        return []
+    config = tesseract_config(psm)
+    with tracing.span("tesseract", images=len(images), output="data", psm=psm or settings.OCR_PSM):
+        if settings.OCR_BACKEND == "batch" and len(images) > 1:
+            return _in_batches(images, lambda batch: _run_batch(batch, config, "tsv"))
+        return [
+            pytesseract.image_to_data(image, config=config, output_type=pytesseract.Output.DICT)
+            for image in images
+        ]
+
+
+def ocr_text(images: List[Image.Image], psm: Optional[int] = None) -> List[str]:
+    """Run tesseract over images, returning plain text per image in order"""
+    if not images:
+        return []
+    config = tesseract_config(psm)
+    with tracing.span("tesseract", images=len(images), output="text", psm=psm or settings.OCR_PSM):
+        if settings.OCR_BACKEND == "batch" and len(images) > 1:
+            return _in_batches(images, lambda batch: _run_batch(batch, config, "txt"))
+        return [pytesseract.image_to_string(image, config=config) for image in images]
+
+
+def _in_batches(images: List[Image.Image], run: Callable[[List[Image.Image]], List]) -> List:
+    results = []
+    for start in range(0, len(images), settings.OCR_BATCH_SIZE):
+        results.extend(run(images[start:start + settings.OCR_BATCH_SIZE]))
+    return results
+
+
+def _run_batch(images: List[Image.Image], config: str, output: str) -> List:
+    """One tesseract invocation over a list file of images, split back per image.
+
+    Text output separates images with form feeds; TSV output numbers them in
+    its page_num column.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = []
+        for i, image in enumerate(images):
+            # Uncompressed PGM: far cheaper to write and read than PNG
+            path = os.path.join(temp_dir, f"{i:05d}.pgm")
+            image.convert("L").save(path)
+            paths.append(path)
+        list_path = os.path.join(temp_dir, "images.txt")
+        with open(list_path, "w") as f:
+            f.write("\n".join(paths) + "\n")
+
+        out_base = os.path.join(temp_dir, "out")
+        completed = subprocess.run(
+            [pytesseract.pytesseract.tesseract_cmd, list_path, out_base, *shlex.split(config), output],
+            capture_output=True
+        )
+        if completed.returncode != 0:
+            raise Exception(f"tesseract failed: {completed.stderr.decode(errors='replace').strip()}")
+
+        with open(f"{out_base}.{output}", encoding="utf-8") as f:
+            content = f.read()
+
+    if output == "txt":
+        pages = content.split("\f")
+        return (pages + [""] * len(images))[:len(images)]
+
+    results = [{field: [] for field in TSV_FIELDS} for _ in images]
+    for row in content.splitlines()[1:]:
+        values = row.split("\t", len(TSV_FIELDS) - 1)
+        if len(values) < len(TSV_FIELDS):
+            continue
+        page = results[int(values[1]) - 1]
+        for field, value in zip(TSV_FIELDS[:-2], values):
+            page[field].append(int(value))
+        page["conf"].append(float(values[10]))
+        page["text"].append(values[11])
+    return results
+
+
+def text_lines(data: Dict) -> List[Dict]:
+    """Group image_to_data words into lines with text, mean confidence and bounding box"""
+    lines: Dict[tuple, Dict] = {}
+    for i, word in enumerate(data["text"]):
+        confidence = float(data["conf"][i])
+        if confidence < 0 or not str(word).strip():
+            continue
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        left, top = data["left"][i], data["top"][i]
+        right, bottom = left + data["width"][i], top + data["height"][i]
+
+        line = lines.get(key)
+        if line is None:
+            lines[key] = {"key": key, "words": [str(word)], "confidences": [confidence],
+                          "box": [left, top, right, bottom]}
+        else:
+            line["words"].append(str(word))
+            line["confidences"].append(confidence)
+            box = line["box"]
+            line["box"] = [min(box[0], left), min(box[1], top), max(box[2], right), max(box[3], bottom)]
+
+    return [
+        {
+            "key": line["key"],
+            "text": " ".join(line["words"]),
+            "confidence": sum(line["confidences"]) / len(line["confidences"]),
+            "words": len(line["words"]),
+            "box": tuple(line["box"]),
+        }
+        for _, line in sorted(lines.items())
+    ]
+
+
+def join_lines(lines: List[Dict]) -> str:
+    """Lines back to text, with a blank line between paragraphs"""
+    parts = []
+    previous = None
+    for line in lines:
+        if previous is not None and line["key"][:2] != previous[:2]:
+            parts.append("")
+        parts.append(line["text"])
+        previous = line["key"]
+    return "\n".join(parts) + "\n" if parts else ""
+
+
+def mean_confidence(lines: List[Dict]) -> float:
+    """Word-weighted mean confidence (0 when there are no words)"""
+    words = sum(line["words"] for line in lines)
+    return sum(line["confidence"] * line["words"] for line in lines) / words if words else 0.0
+
+
+def _low_confidence_regions(lines: List[Dict]) -> List[List[int]]:
+    """Runs of consecutive low-confidence lines within the same block, as line indexes"""
+    threshold = settings.OCR_CONFIDENCE_THRESHOLD
+    regions: List[List[int]] = []
+    for i, line in enumerate(lines):
+        if line["confidence"] >= threshold:
+            continue
+        if regions and regions[-1][-1] == i - 1 and lines[i - 1]["key"][0] == line["key"][0]:
+            regions[-1].append(i)
+        else:
+            regions.append([i])
+    return regions
+
+
+def _crop(image: Image.Image, lines: List[Dict], scale: float) -> Image.Image:
+    """Crop the union of the lines' boxes (first-pass coordinates) from the high-resolution image"""
+    left = min(line["box"][0] for line in lines)
+    top = min(line["box"][1] for line in lines)
+    right = max(line["box"][2] for line in lines)
+    bottom = max(line["box"][3] for line in lines)
+    pad = (bottom - top) / len(lines) / 2
+    return image.crop((
+        max(0, int((left - pad) * scale)),
+        max(0, int((top - pad) * scale)),
+        min(image.width, int((right + pad) * scale) + 1),
+        min(image.height, int((bottom + pad) * scale) + 1),
+    ))
+
+
+def selective_ocr(fast_image: Image.Image, high_image: Callable[[], Image.Image]) -> Dict:
+    """OCR one page at low resolution, then re-OCR only what came back with low confidence"""
+    return selective_ocr_batch([(fast_image, high_image)])[0]
+
+
+def selective_ocr_batch(pages: List[Tuple[Image.Image, Callable[[], Image.Image]]]) -> List[Dict]:
+    """OCR pages at low resolution, then re-OCR only what came back with low confidence.
+
+    Each page is (fast_image, high_image): the page at first-pass resolution
+    and a callable rendering it at full resolution, only called when something
+    needs re-OCR. Low-confidence lines are re-read as cropped regions from the
+    high-resolution image; if most of a page is low confidence (or there are
+    too many regions) the whole page is re-read instead. A re-read only
+    replaces the first pass when its confidence is higher. Each stage is one
+    ocr_data call across all pages, so the batch backend spawns tesseract at
+    most three times.
+
+    Returns {"text", "confidence"} per page, where confidence holds the page stats.
+    """
+    # One skew angle per page for both resolutions so first-pass boxes map onto the high-resolution page
+    angles = [estimate_skew(fast.convert("L")) if settings.OCR_DESKEW else 0.0 for fast, _ in pages]
+    fasts = [preprocess(fast, angle) for (fast, _), angle in zip(pages, angles)]
+    page_lines = [text_lines(data) for data in ocr_data(fasts)]
+    first_pass = [mean_confidence(lines) for lines in page_lines]
+    page_regions = [_low_confidence_regions(lines) for lines in page_lines]
+
+    whole, crops, crop_owners = [], [], []
+    for i, (lines, regions) in enumerate(zip(page_lines, page_regions)):
+        low_lines = sum(len(region) for region in regions)
+        if not lines or low_lines / len(lines) > settings.OCR_REOCR_PAGE_FRACTION \
+                or len(regions) > settings.OCR_REOCR_MAX_REGIONS:
+            whole.append(i)
+        elif regions:
+            high = preprocess(pages[i][1](), angles[i])
+            scale = high.width / fasts[i].width
+            for region in regions:
+                crops.append(_crop(high, [lines[n] for n in region], scale))
+                crop_owners.append((i, region))
+
+    reocr = ["none"] * len(pages)
+    replaced = [0] * len(pages)
+
+    highs = [preprocess(pages[i][1](), angles[i]) for i in whole]
+    for i, data in zip(whole, ocr_data(highs)):
+        lines = text_lines(data)
+        if mean_confidence(lines) > first_pass[i]:
+            page_lines[i], reocr[i] = lines, "page"
+
+    # Replace from the last region of each page backwards so earlier line indexes stay valid
+    region_results = list(zip(crop_owners, ocr_data(crops, psm=REGION_PSM)))
+    for (i, region), data in reversed(region_results):
+        lines = page_lines[i]
+        region_lines = text_lines(data)
+        if region_lines and mean_confidence(region_lines) > mean_confidence([lines[n] for n in region]):
+            # Keep the region's position in the page; its own block numbering is local
+            key = lines[region[0]]["key"]
+            for line in region_lines:
+                line["key"] = key
+            lines[region[0]:region[-1] + 1] = region_lines
+            replaced[i] += 1
+            reocr[i] = "regions"
+
+    return [
+        {
+            "text": join_lines(lines),
+            "confidence": {
+                "mean": round(mean_confidence(lines), 1),
+                "first_pass_mean": round(first_pass[i], 1),
+                "lines": len(lines),
+                "low_confidence_lines": sum(
+                    1 for line in lines if line["confidence"] < settings.OCR_CONFIDENCE_THRESHOLD
+                ),
+                "reocr": reocr[i],
+                "reocr_regions": replaced[i],
+            },
+        }
+        for i, lines in enumerate(page_lines)
+    ]
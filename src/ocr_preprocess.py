@@ -0,0 +1,157 @@
+import math
+from typing import Optional
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from config.settings import settings
+
+# Working width for skew detection; angles are found on a downsampled copy
+DESKEW_WIDTH = 800
+
+# A measurement needs at least this many text lines to be trusted
+MIN_TEXT_LINES = 3
+
+
+def tesseract_config(psm: Optional[int] = None) -> str:
+    """Tesseract command-line options from the OCR settings (psm overrides OCR_PSM)"""
+    options = f"--oem {settings.OCR_OEM} --psm {psm or settings.OCR_PSM}"
+    if settings.TESSERACT_CONFIG:
+        options += f" {settings.TESSERACT_CONFIG}"
+    return options
+
+
+def otsu_threshold(gray: Image.Image) -> int:
+    """Gray level that best separates ink from paper (Otsu's method)"""
+    hist = np.asarray(gray.histogram()[:256], dtype=np.float64)
+    total = hist.sum()
+    omega = np.cumsum(hist) / total
+    mu = np.cumsum(hist * np.arange(256)) / total
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (mu[-1] * omega - mu) ** 2 / (omega * (1 - omega))
+    if np.isnan(between).all():
+        # A single gray level (blank page): nothing is ink
+        return 0
+    return int(np.nanargmax(between))
+
+
+def _ink_mask(image: Image.Image) -> np.ndarray:
+    gray = image.convert("L")
+    ink = np.asarray(gray) <= otsu_threshold(gray)
+    # Light text on a dark background: treat the minority class as ink
+    return ~ink if ink.mean() > 0.5 else ink
+
+
+def estimate_x_height(image: Image.Image) -> Optional[float]:
+    """Median x-height of the text lines in pixels, from a horizontal projection profile.
+
+    Each run of inked rows is one text line; within it, rows holding at least
+    half the line's peak ink are the x-height band (ascenders and descenders
+    are sparse). Returns None when too few lines are found to be reliable.
+    """
+    ink = _ink_mask(image)
+    profile = ink.sum(axis=1)
+    # Ignore specks, and rows that are mostly ink (rules, borders, photo edges)
+    text_rows = (profile > max(1, ink.shape[1] // 500)) & (profile < ink.shape[1] * 0.8)
+
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], text_rows.astype(np.int8), [0]))))
+    heights = []
+    for start, end in zip(edges[::2], edges[1::2]):
+        if end - start < 3:
+            continue
+        line = profile[start:end]
+        heights.append(int((line >= line.max() / 2).sum()))
+
+    if len(heights) < MIN_TEXT_LINES:
+        return None
+    return float(np.median(heights))
+
+
+def _level(image: Image.Image) -> Image.Image:
+    """Deskewed copy used for measuring (skewed lines inflate the x-height)"""
+    if not settings.OCR_DESKEW:
+        return image
+    gray = image.convert("L")
+    angle = estimate_skew(gray)
+    return gray.rotate(angle, fillcolor=255) if abs(angle) >= 0.25 else gray
+
+
+def choose_dpi(probe: Image.Image, probe_dpi: int) -> int:
+    """DPI at which the probe page's text reaches OCR_TARGET_X_HEIGHT pixels"""
+    x_height = estimate_x_height(_level(probe))
+    if not x_height:
+        return settings.OCR_DPI
+    dpi = probe_dpi * settings.OCR_TARGET_X_HEIGHT / x_height
+    return int(min(max(dpi, settings.OCR_MIN_DPI), settings.OCR_MAX_DPI))
+
+
+def load_image(image_path: str) -> Image.Image:
+    """Open an image for OCR, decoding oversized JPEGs at reduced size.
+
+    JPEG draft mode lets the decoder produce a 1/2, 1/4 or 1/8 scale image
+    directly, so a 12 MP phone photo never has to be decoded at full size.
+    """
+    image = Image.open(image_path)
+    pixels = image.width * image.height
+    if image.format == "JPEG" and pixels > settings.OCR_MAX_PIXELS:
+        scale = math.sqrt(settings.OCR_MAX_PIXELS / pixels)
+        image.draft("L", (int(image.width * scale), int(image.height * scale)))
+    image = ImageOps.exif_transpose(image)
+
+    factor = math.ceil(math.sqrt(image.width * image.height / settings.OCR_MAX_PIXELS))
+    if factor > 1:
+        image = image.reduce(factor)
+    return rescale_to_target(image)
+
+
+def rescale_to_target(image: Image.Image) -> Image.Image:
+    """Resize so text x-height is close to OCR_TARGET_X_HEIGHT (never more than 2x up)"""
+    x_height = estimate_x_height(_level(image))
+    if not x_height:
+        return image
+    scale = min(settings.OCR_TARGET_X_HEIGHT / x_height, 2.0)
+    if 0.8 <= scale <= 1.25:
+        return image
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.LANCZOS)
+
+
+def estimate_skew(gray: Image.Image, max_angle: float = None) -> float:
+    """Rotation in degrees that best aligns text lines with the horizontal.
+
+    Scores angles on a downsampled ink mask by the variance of its row profile
+    (text lines give sharp peaks when level): whole degrees across
+    [-max_angle, max_angle] first, then quarter degrees around the best one.
+    """
+    max_angle = settings.OCR_DESKEW_MAX_ANGLE if max_angle is None else max_angle
+    scale = min(1.0, DESKEW_WIDTH / gray.width)
+    small = gray.resize((max(1, int(gray.width * scale)), max(1, int(gray.height * scale))))
+    mask = _ink_mask(small)
+    if not mask.any():
+        return 0.0
+    ink = Image.fromarray(mask.astype(np.uint8) * 255)
+
+    def score(angle: float) -> float:
+        return float(np.asarray(ink.rotate(angle, resample=Image.NEAREST), dtype=np.float32).sum(axis=1).var())
+
+    coarse = max(np.arange(-max_angle, max_angle + 0.5, 1.0), key=score)
+    return float(max(np.arange(coarse - 0.75, coarse + 0.8, 0.25), key=score))
+
+
+def preprocess(image: Image.Image, angle: Optional[float] = None) -> Image.Image:
+    """Grayscale, contrast-stretch, deskew and binarize a page before OCR.
+
+    angle skips skew estimation, e.g. to rotate two renderings of one page alike.
+    """
+    gray = ImageOps.autocontrast(image.convert("L"))
+
+    if settings.OCR_DESKEW:
+        if angle is None:
+            angle = estimate_skew(gray)
+        if abs(angle) >= 0.25:
+            gray = gray.rotate(angle, resample=Image.BILINEAR, expand=True, fillcolor=255)
+
+    if settings.OCR_BINARIZE:
+        threshold = otsu_threshold(gray)
+        gray = gray.point([0 if level <= threshold else 255 for level in range(256)])
+    return gray
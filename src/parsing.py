@@ -0,0 +1,79 @@
+import re
+from datetime import datetime
+from typing import Optional
+
+# A number with optional sign, parentheses and currency symbol or code, and nothing else
+AMOUNT_PATTERN = re.compile(
+    r"^\(?\s*[-+]?\s*(?:[A-Z]{3}|[$€£¥₹])?\s*[-+]?\s*(\d[\d.,' ]*)\s*(?:[A-Z]{3}|[$€£¥₹])?\s*\)?-?$"
+)
+
+
+def parse_amount(value) -> Optional[float]:
+    """
+    Parse an amount the LLM may have returned as a string (e.g. "$1,234.50",
+    "1.234,50 EUR", "(12.00)") into a float. Returns None if the value is not
+    such an amount (e.g. "abc1" or "see attached").
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    text = str(value).strip()
+    match = AMOUNT_PATTERN.match(text)
+    if not match:
+        return None
+    negative = (text.startswith('(') and text.endswith(')')) or '-' in text
+    digits = re.sub(r'[^\d.,]', '', match.group(1))
+
+    if ',' in digits and '.' in digits:
+        # Whichever separator comes last is the decimal point
+        if digits.rfind(',') > digits.rfind('.'):
+            digits = digits.replace('.', '').replace(',', '.')
+        else:
+            digits = digits.replace(',', '')
+    elif ',' in digits:
+        whole, _, fraction = digits.rpartition(',')
+        digits = f"{whole.replace(',', '')}.{fraction}" if len(fraction) in (1, 2) else digits.replace(',', '')
+
+    try:
+        amount = float(digits)
+    except ValueError:
+        return None
+    return -amount if negative else amount
+
+
+# Tried in order; ambiguous numeric dates read month first, as pandas does
+DATE_FORMATS = [
+    "%Y-%m-%d", "%Y/%m/%d", "%Y.%m.%d", "%Y%m%d",
+    "%m/%d/%Y", "%d/%m/%Y", "%m-%d-%Y", "%d-%m-%Y", "%d.%m.%Y",
+    "%m/%d/%y", "%d/%m/%y", "%d.%m.%y",
+    "%B %d, %Y", "%b %d, %Y", "%B %d %Y", "%b %d %Y",
+    "%d %B %Y", "%d %b %Y", "%d-%b-%Y", "%d-%B-%Y", "%b-%d-%Y",
+]
+
+
+def normalize_date(value) -> Optional[str]:
+    """
+    Normalize a date the LLM may have returned in any common layout
+    (e.g. "03/15/2024", "15.03.2024", "March 15th, 2024", "2024-03-15T00:00:00")
+    to YYYY-MM-DD. Returns None for empty values; raises ValueError if the
+    value is not a recognizable date.
+    """
+    if value is None:
+        return None
+    text = str(value).strip()
+    if not text:
+        return None
+
+    # Drop a time part and ordinal suffixes ("1st", "22nd")
+    text = re.sub(r'[T ]\d{1,2}:\d{2}.*$', '', text)
+    text = re.sub(r'(\d)(st|nd|rd|th)\b', r'\1', text, flags=re.IGNORECASE)
+    text = re.sub(r'\s+', ' ', text.replace('Sept', 'Sep')).strip()
+
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    raise ValueError(f"unrecognized date: {value!r}")
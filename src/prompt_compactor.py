@@ -0,0 +1,203 @@
+import re
+from collections import Counter
+from typing import Dict, List, Optional
+
+import tiktoken
+
+from config.settings import settings
+
+PAGE_MARKER = re.compile(r'^--- Page \d+ ---$')
+
+BOILERPLATE_PATTERNS = re.compile(
+    r'terms (and|&) conditions|all rights reserved|subject to (the|our) (standard )?terms'
+    r'|governing law|jurisdiction|limitation of liability|interest (will|shall) be charged'
+    r'|late (payment|fee)s? (will|may|shall)|thank you for (your business|choosing)'
+    r'|this (invoice|document) (was|is) (computer|electronically) generated'
+    r'|confidential(ity)? notice|privacy policy|unsubscribe|www\.\S+\.\S+/(terms|privacy)',
+    re.IGNORECASE
+)
+
+TOTALS_PATTERNS = re.compile(
+    r'\b(sub\s*-?total|total|tax|vat|gst|amount due|balance( due)?|grand total|discount|shipping)\b',
+    re.IGNORECASE
+)
+
+AMOUNT_PATTERN = re.compile(r'\d[\d,]*[.,]\d{2}\b')
+
+# Labels, dates and amounts of the fields INVOICE_SCHEMA asks for; a line carrying one is never dropped
+KEY_FIELD_PATTERNS = re.compile(
+    r'\b(invoice\s*(no|number|#|date)|inv\s*#|bill(ed)?\s+to|ship\s+to|sold\s+to|customer|vendor|supplier'
+    r'|sub\s*-?total|total|tax|vat|gst|amount due|balance|due date|date|payment terms|net\s+\d+)\b'
+    r'|\b\d{1,4}[/.-]\d{1,2}[/.-]\d{2,4}\b|[$€£¥]\s*\d',
+    re.IGNORECASE
+)
+
+# Where a line splits into clauses: after a sentence, around dashes/pipes, before a comma or bracket
+CLAUSE_BOUNDARY = re.compile(r'(?<=[.;!?])\s+|\s+[-–—|]\s+|,\s+|\s+(?=\()')
+
+# Lines kept as the invoice header (vendor, customer, number, dates) when trimming
+HEADER_LINES = 25
+
+
+def _encoding_for(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+class PromptCompactor:
+    """Shrink raw invoice text to the parts the extractor needs, within a token budget.
+
+    Repeated page headers/footers, legal boilerplate and redundant whitespace
+    are always removed; on a line that also carries a key field (a schema
+    label, a date or an amount) only the boilerplate clause is. If the text
+    is still over budget, the header region, the totals lines and the
+    line-item rows (lines with amounts) are kept in that order of priority,
+    and everything else is dropped.
+    """
+
+    def __init__(self, token_budget: Optional[int] = None, model: Optional[str] = None):
+        self.token_budget = token_budget or settings.PROMPT_TOKEN_BUDGET
+        self.encoding = _encoding_for(model or settings.OPENAI_MODEL)
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def compact(self, text: str) -> Dict:
+        """Return the compacted text together with before/after token counts"""
+        original_tokens = self.count_tokens(text)
+
+        pages = self._split_pages(text)
+        pages = self._drop_repeated_lines(pages)
+        lines = [line for page in pages for line in page]
+        lines = [line for line in map(self._strip_boilerplate, lines) if line is not None]
+        lines = self._collapse_blank_lines(lines)
+
+        compacted = "\n".join(lines)
+        compacted_tokens = self.count_tokens(compacted)
+        if compacted_tokens > self.token_budget:
+            compacted = self._fit_budget(lines)
+            compacted_tokens = self.count_tokens(compacted)
+
+        return {
+            "text": compacted,
+            "original_tokens": original_tokens,
+            "compacted_tokens": compacted_tokens,
+            "tokens_saved": original_tokens - compacted_tokens,
+        }
+
+    def _split_pages(self, text: str) -> List[List[str]]:
+        pages: List[List[str]] = [[]]
+        for raw_line in text.replace('\f', '\n--- Page 0 ---\n').splitlines():
+            line = re.sub(r'[ \t ]+', ' ', raw_line).strip()
+            if PAGE_MARKER.match(line):
+                if pages[-1]:
+                    pages.append([])
+                continue
+            pages[-1].append(line)
+        return pages
+
+    def _drop_repeated_lines(self, pages: List[List[str]]) -> List[List[str]]:
+        """Remove header/footer lines that recur at the edges of most pages, keeping the first copy"""
+        if len(pages) < 2:
+            return pages
+
+        def signature(line: str) -> str:
+            # Running page numbers and dates vary between copies, but a line with
+            # amounts on it is only treated as repeated when it matches exactly
+            if AMOUNT_PATTERN.search(line) or not re.search(r'[A-Za-z]', line):
+                return line
+            return re.sub(r'\d+', '#', line.lower())
+
+        def edges(page: List[str]) -> List[str]:
+            content = [line for line in page if line]
+            return content[:3] + content[-3:]
+
+        counts = Counter()
+        for page in pages:
+            counts.update({signature(line) for line in edges(page)})
+        repeated = {sig for sig, n in counts.items() if n >= max(2, len(pages) // 2)}
+
+        result = [pages[0]]
+        for page in pages[1:]:
+            edge_lines = set(edges(page))
+            result.append([
+                line for line in page
+                if not (line in edge_lines and signature(line) in repeated)
+            ])
+        return result
+
+    def _is_boilerplate(self, line: str) -> bool:
+        if BOILERPLATE_PATTERNS.search(line):
+            return True
+        # Long runs of prose with no figures are almost always terms and conditions
+        return len(line) > 200 and not re.search(r'\d', line)
+
+    def _has_key_field(self, text: str) -> bool:
+        return bool(KEY_FIELD_PATTERNS.search(text) or AMOUNT_PATTERN.search(text))
+
+    def _strip_boilerplate(self, line: str) -> Optional[str]:
+        """None for a boilerplate line; a line that also carries a key field loses only its boilerplate clauses"""
+        if not self._is_boilerplate(line):
+            return line
+        if not self._has_key_field(line):
+            return None
+
+        # Separators sit at the odd indexes; a dropped clause takes the separator before it along
+        parts = re.split(f"({CLAUSE_BOUNDARY.pattern})", line)
+        kept = ""
+        for i in range(0, len(parts), 2):
+            clause = parts[i]
+            if BOILERPLATE_PATTERNS.search(clause) and not self._has_key_field(clause):
+                continue
+            kept += (parts[i - 1] if kept else "") + clause
+        return kept.strip(" ,;-–—|")
+
+    def _collapse_blank_lines(self, lines: List[str]) -> List[str]:
+        result = []
+        for line in lines:
+            if not line and (not result or not result[-1]):
+                continue
+            result.append(line)
+        while result and not result[-1]:
+            result.pop()
+        return result
+
+    def _fit_budget(self, lines: List[str]) -> str:
+        header = set(range(min(HEADER_LINES, len(lines))))
+        totals = set()
+        items = set()
+        for i, line in enumerate(lines):
+            if TOTALS_PATTERNS.search(line):
+                # Amounts are often on the line after their label
+                totals.add(i)
+                if i + 1 < len(lines):
+                    totals.add(i + 1)
+            elif AMOUNT_PATTERN.search(line):
+                items.add(i)
+
+        keep = set()
+        used = 0
+        # The header may use at most a third of the budget so totals always fit
+        groups = (
+            (header, self.token_budget // 3),
+            (totals, self.token_budget),
+            (items, self.token_budget),
+            (set(range(len(lines))), self.token_budget),
+        )
+        for group, limit in groups:
+            for i in sorted(group - keep):
+                cost = self.count_tokens(lines[i]) + 1
+                if used + cost > limit:
+                    break
+                keep.add(i)
+                used += cost
+
+        parts = []
+        for i, line in enumerate(lines):
+            if i in keep:
+                parts.append(line)
+            elif parts and parts[-1] != "[...]":
+                parts.append("[...]")
+        return "\n".join(parts)
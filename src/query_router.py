@@ -0,0 +1,193 @@
+import re
+from typing import Dict, List, Optional, Union
+
+import pandas as pd
+
+from src.invoice_table import InvoiceTable, as_invoice_table
+from src.utils import format_currency
+
+# Questions asking for reasoning, explanation or a yes/no answer always go to retrieval QA
+FREE_FORM = re.compile(
+    r'^\s*(why|how come|explain|describe|what does|what is the (meaning|purpose)|'
+    r'does|do|did|is|are|was|were|has|have|had|can|could|should|would|will)\b',
+    re.IGNORECASE
+)
+
+# Aggregate intents; each needs aggregate phrasing, not just a keyword such as "total" or "last"
+TOP_N = re.compile(r'\b(?:top|largest|biggest|highest|most expensive)\s*(\d+)?\s+(?:invoices?|bills?|vendors?|suppliers?)\b', re.IGNORECASE)
+BY_VENDOR = re.compile(r'\b(per|by|each|every|for all)\s+(vendor|supplier)s?\b|\bvendor (breakdown|totals|summary)\b', re.IGNORECASE)
+BY_MONTH = re.compile(r'\b(per|by|each)\s+month\b|\bmonthly\b', re.IGNORECASE)
+DATE_RANGE = re.compile(
+    r'\bdate range\b|\b(earliest|latest|oldest|newest|first|last) (invoice )?dates?\b|'
+    r'\bwhen (was|were) the (earliest|latest|oldest|newest|first|last) invoices?\b',
+    re.IGNORECASE
+)
+SUMMARY = re.compile(r'^\s*(give me |show me )?(an? )?(summary|overview)\b|\bsummari[sz]e (all |the |my )?invoices\b|'
+                     r'\b(summary|overview) of (all |the |my )?(the )?invoices\b|\b(invoice|spending) (summary|overview)\b',
+                     re.IGNORECASE)
+COUNT = re.compile(r'\b(how many|count of|number of)\s+(the\s+)?(invoices|bills)\b', re.IGNORECASE)
+AVERAGE = re.compile(r'\b(average|mean|typical)\s+(invoice\s+)?(amount|total|invoice|value|spend)', re.IGNORECASE)
+TOTAL = re.compile(
+    r'^\s*(what(\'s| is| was| were)\s+the\s+)?(total|sum)\b|\btotal (amount|spend|spent|spending|value|cost|invoiced|tax)\b|'
+    r'\bsum of\b|\bhow much (did|do|have|has|was|were|is)\b.*\b(spen[dt]|paid|pay|cost|owe|invoiced|billed)\b',
+    re.IGNORECASE
+)
+YEAR = re.compile(r'\b(?:in|during|for)\s+((?:19|20)\d{2})\b', re.IGNORECASE)
+# A purely numeric invoice number only counts when the question refers to it as an invoice number
+NUMBER_PREFIX = r'(?:invoice|inv|bill|number|no\.?|#)\s*(?:number|no\.?|#)?\s*'
+
+MAX_CITED_SOURCES = 20
+
+
+class QueryRouter:
+    """Answer aggregate and filter questions straight from the structured invoice data.
+
+    route() returns None for anything that is not clearly an aggregate question
+    so the caller can fall back to retrieval QA.
+    """
+
+    def __init__(self, invoices: Union[InvoiceTable, List[Dict]]):
+        self.frame = as_invoice_table(invoices).frame
+
+    def route(self, question: str) -> Optional[Dict]:
+        if self.frame.empty or FREE_FORM.search(question):
+            return None
+
+        frame, scope = self._apply_filters(question)
+        if frame.empty:
+            return self._answer(f"No invoices match {scope}.", frame)
+
+        top = TOP_N.search(question)
+        if top:
+            return self._top_n(frame, int(top.group(1) or 5), question, scope)
+        if BY_VENDOR.search(question):
+            return self._by_vendor(frame, scope)
+        if BY_MONTH.search(question):
+            return self._by_month(frame, scope)
+        if SUMMARY.search(question):
+            return self._summary(frame, scope)
+        if DATE_RANGE.search(question):
+            return self._date_range(frame, scope)
+        if COUNT.search(question):
+            return self._answer(f"There are **{len(frame)}** invoices {scope}.", frame)
+        if AVERAGE.search(question):
+            return self._answer(
+                f"The average invoice amount {scope} is **{format_currency(frame['total'].mean())}** "
+                f"across {frame['total'].notna().sum()} invoices with a total.",
+                frame
+            )
+        if TOTAL.search(question):
+            return self._total(frame, question, scope)
+        return None
+
+    def _apply_filters(self, question: str):
+        """Narrow the frame to invoice numbers, vendors and years named in the question"""
+        frame = self.frame
+        lowered = question.lower()
+        scope = []
+
+        numbers = [n for n in frame["invoice_number"].unique() if n and self._mentions(lowered, n.lower())]
+        if numbers:
+            frame = frame[frame["invoice_number"].isin(numbers)]
+            scope.append(f"for invoice {', '.join(numbers)}")
+
+        vendors = [
+            v for v in frame["vendor"].unique()
+            if v != "Unknown" and self._mentions(lowered, v.lower(), numeric_prefix=False)
+        ]
+        if vendors:
+            frame = frame[frame["vendor"].isin(vendors)]
+            scope.append(f"from {', '.join(vendors)}")
+
+        year = YEAR.search(question)
+        if year:
+            frame = frame[frame["date"].dt.year == int(year.group(1))]
+            scope.append(f"in {year.group(1)}")
+
+        return frame, " ".join(scope) if scope else "across all processed invoices"
+
+    @staticmethod
+    def _mentions(lowered: str, name: str, numeric_prefix: bool = True) -> bool:
+        """Whether name appears as a whole token (numeric invoice numbers need an "invoice"/"#" prefix)"""
+        pattern = rf'(?<![\w-]){re.escape(name)}(?![\w-])'
+        if numeric_prefix and name.isdigit():
+            pattern = rf'(?<!\w){NUMBER_PREFIX}{pattern}'
+        return re.search(pattern, lowered) is not None
+
+    def _answer(self, answer: str, frame: pd.DataFrame) -> Dict:
+        sources = [s for s in frame["source_file"].unique() if s]
+        if len(sources) > MAX_CITED_SOURCES:
+            sources = sources[:MAX_CITED_SOURCES] + [f"(+{len(sources) - MAX_CITED_SOURCES} more)"]
+        return {"answer": answer, "sources": sources, "route": "analytic"}
+
+    def _total(self, frame: pd.DataFrame, question: str, scope: str) -> Dict:
+        if re.search(r'\btax\b', question, re.IGNORECASE):
+            return self._answer(f"Total tax {scope} is **{format_currency(frame['tax'].sum())}**.", frame)
+
+        missing = frame["total"].isna().sum()
+        answer = (
+            f"The total amount {scope} is **{format_currency(frame['total'].sum())}** "
+            f"over {len(frame)} invoices."
+        )
+        if missing:
+            answer += f" ({missing} invoices had no readable total and were excluded.)"
+        return self._answer(answer, frame)
+
+    def _date_range(self, frame: pd.DataFrame, scope: str) -> Dict:
+        dates = frame["date"].dropna()
+        if dates.empty:
+            return self._answer(f"None of the invoices {scope} have a readable date.", frame)
+        return self._answer(
+            f"Invoice dates {scope} range from **{dates.min():%Y-%m-%d}** to **{dates.max():%Y-%m-%d}**.",
+            frame
+        )
+
+    def _by_vendor(self, frame: pd.DataFrame, scope: str) -> Dict:
+        grouped = (
+            frame.groupby("vendor", observed=True)["total"]
+            .agg(["sum", "size"])
+            .sort_values("sum", ascending=False)
+        )
+        lines = [
+            f"- {vendor}: {format_currency(row['sum'])} ({int(row['size'])} invoices)"
+            for vendor, row in grouped.iterrows()
+        ]
+        return self._answer(f"Totals by vendor {scope}:\n" + "\n".join(lines), frame)
+
+    def _by_month(self, frame: pd.DataFrame, scope: str) -> Dict:
+        dated = frame.dropna(subset=["date"])
+        grouped = dated.groupby(dated["date"].dt.to_period("M"))["total"].agg(["sum", "size"])
+        lines = [
+            f"- {month}: {format_currency(row['sum'])} ({int(row['size'])} invoices)"
+            for month, row in grouped.iterrows()
+        ]
+        return self._answer(f"Totals by month {scope}:\n" + "\n".join(lines), dated)
+
+    def _top_n(self, frame: pd.DataFrame, n: int, question: str, scope: str) -> Dict:
+        if re.search(r'\b(vendor|supplier)s?\b', question, re.IGNORECASE):
+            grouped = frame.groupby("vendor", observed=True)["total"].sum().nlargest(n)
+            lines = [f"{i}. {vendor}: {format_currency(total)}" for i, (vendor, total) in enumerate(grouped.items(), 1)]
+            used = frame[frame["vendor"].isin(grouped.index)]
+            return self._answer(f"Top {len(grouped)} vendors by amount {scope}:\n" + "\n".join(lines), used)
+
+        largest = frame.dropna(subset=["total"]).nlargest(n, "total")
+        lines = [
+            f"{i}. {row['invoice_number'] or 'N/A'} ({row['vendor']}): {format_currency(row['total'])}"
+            for i, (_, row) in enumerate(largest.iterrows(), 1)
+        ]
+        return self._answer(f"Top {len(largest)} invoices by amount {scope}:\n" + "\n".join(lines), largest)
+
+    def _summary(self, frame: pd.DataFrame, scope: str) -> Dict:
+        dates = frame["date"].dropna()
+        # vendor is categorical; vendors filtered out of the frame still count zero
+        vendors = frame["vendor"].value_counts().loc[lambda counts: counts > 0].head(5)
+        lines = [
+            f"- Invoices: {len(frame)}",
+            f"- Total amount: {format_currency(frame['total'].sum())}",
+            f"- Average amount: {format_currency(frame['total'].mean())}",
+            f"- Total tax: {format_currency(frame['tax'].sum())}",
+        ]
+        if not dates.empty:
+            lines.append(f"- Date range: {dates.min():%Y-%m-%d} to {dates.max():%Y-%m-%d}")
+        lines.append("- Key vendors: " + ", ".join(f"{v} ({c})" for v, c in vendors.items()))
+        return self._answer(f"Summary {scope}:\n" + "\n".join(lines), frame)
@@ -0,0 +1,115 @@
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from config.settings import settings
+
+
+class AdaptiveConcurrencyLimiter:
+    """Concurrency limit that adapts AIMD-style to rate limiting and latency.
+
+    Every successful call under the latency target grows the limit by roughly
+    one slot per window of calls; a 429 halves it and a slow call shrinks it
+    by a quarter. Decreases are spaced at least one latency target apart so a
+    burst of failures from the same window only counts once.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, latency_target: float):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self) -> None:
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self, latency: float) -> None:
+        if latency > self.latency_target:
+            self._decrease(0.75)
+        else:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+    def on_throttle(self) -> None:
+        self._decrease(0.5)
+
+    def _decrease(self, factor: float) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < self.latency_target:
+            return
+        self._last_decrease = now
+        self.limit = max(self.minimum, self.limit * factor)
+
+
+def _status_code(exc: Exception) -> Optional[int]:
+    for attr in ("http_status", "status_code"):
+        status = getattr(exc, attr, None)
+        if isinstance(status, int):
+            return status
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_rate_limited(exc: Exception) -> bool:
+    return type(exc).__name__ == "RateLimitError" or _status_code(exc) == 429
+
+
+def is_retryable(exc: Exception) -> bool:
+    """Rate limits, timeouts, connection problems and 5xx responses are worth retrying"""
+    if is_rate_limited(exc):
+        return True
+    if type(exc).__name__ in ("Timeout", "APITimeoutError", "APIConnectionError",
+                              "ServiceUnavailableError", "TryAgain"):
+        return True
+    if isinstance(exc, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = _status_code(exc)
+    return status is not None and status >= 500
+
+
+def retry_after_seconds(exc: Exception) -> Optional[float]:
+    """Read Retry-After (seconds or HTTP date) from the error's response headers"""
+    headers = getattr(exc, "headers", None) or getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+
+    value = headers.get("retry-after-ms") or headers.get("Retry-After-Ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, exc: Optional[Exception] = None) -> float:
+    """Full-jitter exponential backoff, never shorter than the server's Retry-After"""
+    ceiling = min(settings.LLM_BACKOFF_MAX_SECONDS, settings.LLM_BACKOFF_BASE_SECONDS * 2 ** attempt)
+    delay = random.uniform(0, ceiling)
+    retry_after = retry_after_seconds(exc) if exc is not None else None
+    if retry_after is not None:
+        delay = retry_after + random.uniform(0, settings.LLM_BACKOFF_BASE_SECONDS)
+    return delay
@@ -0,0 +1,222 @@
+import contextvars
+import cProfile
+import io
+import itertools
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Numeric span attributes that Trace.summary() adds up per span name
+COUNTERS = ["files", "pages", "bytes", "images", "chunks", "rows", "prompt_tokens", "completion_tokens",
+            "retries", "queued_seconds", "cache_hits", "cache_misses", "errors", "repaired_fields", "reasks"]
+
+_trace: contextvars.ContextVar = contextvars.ContextVar("trace", default=None)
+_span: contextvars.ContextVar = contextvars.ContextVar("trace_span", default=None)
+_ids = itertools.count(1)
+
+
+class Span:
+    """A timed operation in progress; code inside it attaches attributes with set() and add()"""
+
+    __slots__ = ("name", "attrs", "id")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.id: Optional[str] = None
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def add(self, key: str, amount: float = 1) -> None:
+        self.attrs[key] = self.attrs.get(key, 0) + amount
+
+
+class Trace:
+    """Spans recorded during one run, from this process and the workers it used.
+
+    Each span is a dict: name, id, parent, pid, thread, start (epoch seconds),
+    seconds and attrs.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.time()
+        self.spans: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Dict) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def adopt(self, spans: List[Dict], parent: Optional[str]) -> None:
+        """Add spans recorded in a worker, hanging its root spans under parent"""
+        with self._lock:
+            for span in spans:
+                if span["parent"] is None:
+                    span["parent"] = parent
+                self.spans.append(span)
+
+    def summary(self) -> List[Dict]:
+        """Per span name: count, total/mean/max seconds and the summed COUNTERS, slowest first"""
+        stages: Dict[str, Dict] = {}
+        for span in self.spans:
+            stage = stages.setdefault(span["name"], {"stage": span["name"], "count": 0, "seconds": 0.0, "max_seconds": 0.0})
+            stage["count"] += 1
+            stage["seconds"] += span["seconds"]
+            stage["max_seconds"] = max(stage["max_seconds"], span["seconds"])
+            for key in COUNTERS:
+                value = span["attrs"].get(key)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    stage[key] = stage.get(key, 0) + value
+
+        for stage in stages.values():
+            stage["mean_seconds"] = round(stage["seconds"] / stage["count"], 4)
+            stage["seconds"] = round(stage["seconds"], 4)
+            stage["max_seconds"] = round(stage["max_seconds"], 4)
+        return sorted(stages.values(), key=lambda stage: stage["seconds"], reverse=True)
+
+    def to_jsonl(self) -> str:
+        return "".join(json.dumps(span, default=str) + "\n" for span in sorted(self.spans, key=lambda s: s["start"]))
+
+    def to_chrome_trace(self) -> str:
+        """Chrome trace event JSON, for chrome://tracing or ui.perfetto.dev"""
+        events = [
+            {
+                "name": span["name"],
+                "cat": span["name"].split(".")[0],
+                "ph": "X",
+                "ts": round((span["start"] - self.started) * 1e6),
+                "dur": round(span["seconds"] * 1e6),
+                "pid": span["pid"],
+                "tid": span["thread"],
+                "args": span["attrs"],
+            }
+            for span in self.spans
+        ]
+        return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}, default=str)
+
+    def export_jsonl(self, path: str) -> str:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_jsonl())
+        return path
+
+    def export_chrome_trace(self, path: str) -> str:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_chrome_trace())
+        return path
+
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+
+def active() -> bool:
+    return _trace.get() is not None
+
+
+def current_span() -> Span:
+    """The innermost open span, so nested helpers can add attributes (a detached one if none is open)"""
+    return _span.get() or Span("", {})
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Span]:
+    """Time the block as a span of the current trace (a no-op when nothing is recording)"""
+    current = Span(name, attrs)
+    trace = _trace.get()
+    if trace is None:
+        yield current
+        return
+
+    current.id = f"{os.getpid()}-{next(_ids)}"
+    parent = _span.get()
+    token = _span.set(current)
+    started = time.time()
+    clock = time.perf_counter()
+    try:
+        yield current
+    except Exception as e:
+        current.attrs["error"] = str(e)
+        raise
+    finally:
+        _span.reset(token)
+        trace.add({
+            "name": name,
+            "id": current.id,
+            "parent": parent.id if parent else None,
+            "pid": os.getpid(),
+            "thread": threading.get_ident(),
+            "start": started,
+            "seconds": time.perf_counter() - clock,
+            "attrs": current.attrs,
+        })
+
+
+@contextmanager
+def record(name: str, **attrs) -> Iterator[Trace]:
+    """Collect every span opened in this context (and its asyncio tasks) into a new Trace.
+
+    The run itself is the root span. Recording is scoped to the context, so
+    concurrent runs (e.g. two Streamlit sessions) get separate traces.
+    """
+    trace = Trace(name)
+    trace_token = _trace.set(trace)
+    span_token = _span.set(None)
+    try:
+        with span(name, **attrs):
+            yield trace
+    finally:
+        _span.reset(span_token)
+        _trace.reset(trace_token)
+
+
+def traced_call(enabled: bool, fn: Callable, *args) -> Tuple[Any, List[Dict]]:
+    """Run fn(*args) in a pool worker; returns (result, spans recorded there).
+
+    Submit with enabled=active() and pass the spans to adopt() in the
+    submitting context. Thread-pool workers do not inherit the caller's
+    context either, so this works for both kinds of pool.
+    """
+    if not enabled:
+        return fn(*args), []
+    with record(f"worker.{fn.__name__.lstrip('_')}") as trace:
+        result = fn(*args)
+    return result, trace.spans
+
+
+def adopt(spans: List[Dict]) -> None:
+    """Add a worker's spans to the current trace, under the span that is open here"""
+    trace = _trace.get()
+    if trace is not None and spans:
+        parent = _span.get()
+        trace.adopt(spans, parent.id if parent else None)
+
+
+def run_in_context(executor, fn: Callable, *args):
+    """executor.submit(fn, *args) with the caller's context, so spans in fn join the caller's trace"""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+@contextmanager
+def profile(path: str, top: int = 25) -> Iterator[Dict]:
+    """Run the block under cProfile, dump the stats to path and put a text report in the yielded dict.
+
+    Only the calling thread is profiled; worker processes are covered by the trace.
+    """
+    profiler = cProfile.Profile()
+    result: Dict[str, str] = {"path": path}
+    profiler.enable()
+    try:
+        yield result
+    finally:
+        profiler.disable()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        profiler.dump_stats(path)
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(top)
+        result["report"] = report.getvalue()
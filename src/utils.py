@@ -1,6 +1,5 @@
 import os
 import shutil
-import base64
 from typing import Optional
 import streamlit as st
 from config.settings import settings
@@ -65,15 +64,3 @@ def load_sample_data() -> list[dict]:
             "tax": 230.00
         }
     ]
-
-
-def create_download_link(file_path: str, link_text: str) -> str:
-    """
-    Create an HTML download link for a given file.
-    Embeds the file content as base64 so Streamlit can render it.
-    """
-    with open(file_path, 'rb') as f:
-        data = f.read()
-    b64 = base64.b64encode(data).decode()
-    filename = os.path.basename(file_path)
-    return f'<a href="data:file/octet-stream;base64,{b64}" download="{filename}">{link_text}</a>'
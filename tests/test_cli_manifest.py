@@ -0,0 +1,37 @@
+from cli import Manifest
+
+STAMP = {"size": 10, "mtime_ns": 1}
+
+
+def entry(path, results_end, status="ok"):
+    return {"path": path, **STAMP, "status": status, "error": None, "results_end": results_end}
+
+
+def test_reopening_drops_uncommitted_results_and_torn_lines(tmp_path):
+    manifest_path, results_path = tmp_path / "invoices.manifest.jsonl", tmp_path / "invoices.jsonl"
+    manifest = Manifest(str(manifest_path), str(results_path))
+    results_path.write_text('{"a": 1}\n')
+    manifest.commit([entry("a.pdf", results_path.stat().st_size)])
+
+    # An interrupted chunk: its records were written but its manifest line is torn
+    with open(results_path, "a") as f:
+        f.write('{"b": 2}\n')
+    with open(manifest_path, "a") as f:
+        f.write('{"path": "b.pdf", "si')
+
+    manifest = Manifest(str(manifest_path), str(results_path))
+
+    assert results_path.read_text() == '{"a": 1}\n'
+    assert list(manifest.entries) == ["a.pdf"]
+    assert manifest_path.read_text().endswith("\n")
+
+
+def test_is_done_checks_fingerprint_and_failures(tmp_path):
+    manifest = Manifest(str(tmp_path / "m.jsonl"), str(tmp_path / "r.jsonl"))
+    manifest.commit([entry("ok.pdf", 0), entry("failed.pdf", 0, status="error")])
+
+    assert manifest.is_done("ok.pdf", STAMP, retry_failed=True)
+    assert not manifest.is_done("ok.pdf", {**STAMP, "mtime_ns": 2}, retry_failed=False)
+    assert manifest.is_done("failed.pdf", STAMP, retry_failed=False)
+    assert not manifest.is_done("failed.pdf", STAMP, retry_failed=True)
+    assert not manifest.is_done("new.pdf", STAMP, retry_failed=False)
@@ -0,0 +1,51 @@
+import csv
+
+import pytest
+
+from config.settings import settings
+from src.data_extractor import DataExtractor
+
+INVOICES = [
+    {"invoice_number": "INV-1", "date": "2024-03-15", "vendor_name": "Acme", "total": 22.0,
+     "items": [{"description": "Widget", "quantity": 2, "unit_price": 10.0, "total": 20.0}],
+     "source_file": "acme.pdf", "warnings": ["tax: derived as total - subtotal"]},
+    {"invoice_number": "INV-2", "vendor_name": "Globex", "total": 5.0, "source_file": "globex.pdf",
+     "raw_response": "{\"total\": 5}", "purchase_order": "PO-7"},
+]
+
+
+@pytest.fixture(autouse=True)
+def export_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "EXPORT_DIR", str(tmp_path))
+
+
+def test_csv_keeps_fields_outside_the_schema():
+    path = DataExtractor().save_to_csv(iter(INVOICES), "out.csv")
+
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        rows = list(reader)
+
+    assert reader.fieldnames[:len(DataExtractor().csv_fieldnames())] == DataExtractor().csv_fieldnames()
+    assert rows[0]["warnings"] == "['tax: derived as total - subtotal']"
+    assert rows[0]["items_count"] == "1"
+    assert rows[0]["items_total"] == "20.0"
+    assert rows[1]["raw_response"] == "{\"total\": 5}"
+    assert rows[1]["purchase_order"] == "PO-7"
+    assert rows[1]["warnings"] == ""
+
+
+def test_parquet_roundtrip(monkeypatch):
+    monkeypatch.setattr(settings, "PARQUET_ROW_GROUP_SIZE", 1)
+    extractor = DataExtractor()
+    data = INVOICES + [{"error": "Could not parse response", "source_file": "broken.pdf"}]
+
+    paths = extractor.save_to_parquet(iter(data), "out")
+    records = extractor.load_from_parquet(paths["invoices"], paths["line_items"])
+
+    assert [record.get("invoice_number") for record in records] == ["INV-1", "INV-2", None]
+    assert records[0]["date"] == "2024-03-15"
+    assert records[0]["total"] == 22.0
+    assert records[0]["items"] == [{"description": "Widget", "quantity": 2.0, "unit_price": 10.0, "total": 20.0}]
+    assert records[1]["items"] == []
+    assert records[2] == {"error": "Could not parse response", "source_file": "broken.pdf"}
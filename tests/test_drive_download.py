@@ -0,0 +1,92 @@
+import hashlib
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from config.settings import settings
+from src.drive_handler import DriveHandler
+
+
+class RangeServer(BaseHTTPRequestHandler):
+    """Serves `content` with a strong ETag, honouring Range only while If-Range matches"""
+
+    content = b""
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        body = type(self).content
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        byte_range, if_range = self.headers.get("Range"), self.headers.get("If-Range")
+        type(self).requests.append((byte_range, if_range))
+
+        if byte_range and if_range in (None, etag):
+            start = int(re.match(r"bytes=(\d+)-", byte_range).group(1))
+            body = body[start:]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{start + len(body) - 1}/{len(type(self).content)}")
+        else:
+            self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    RangeServer.content = b"A" * 5000
+    RangeServer.requests = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), RangeServer)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_port}/file"
+    httpd.shutdown()
+
+
+@pytest.fixture
+def paths(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "TEMP_DIR", str(tmp_path))
+    return tmp_path / "invoice.pdf", tmp_path / "FILE_ID.part"
+
+
+def leave_part(part, data, etag=None):
+    part.write_bytes(data)
+    if etag:
+        (part.parent / (part.name + ".json")).write_text(json.dumps({"validator": etag}))
+
+
+def test_unchanged_file_resumes_from_the_part(server, paths):
+    out, part = paths
+    etag = '"%s"' % hashlib.md5(RangeServer.content).hexdigest()
+    leave_part(part, b"A" * 1000, etag)
+
+    DriveHandler().download_url(server, str(out), part_path=str(part))
+
+    assert out.read_bytes() == RangeServer.content
+    assert RangeServer.requests == [("bytes=1000-", etag)]
+    assert sorted(p.name for p in out.parent.iterdir()) == ["invoice.pdf"]
+
+
+def test_changed_file_starts_over(server, paths):
+    out, part = paths
+    leave_part(part, b"A" * 1000, '"%s"' % hashlib.md5(RangeServer.content).hexdigest())
+    RangeServer.content = b"B" * 4000
+
+    DriveHandler().download_url(server, str(out), part_path=str(part))
+
+    assert out.read_bytes() == b"B" * 4000
+
+
+def test_part_without_a_validator_is_not_resumed(server, paths):
+    out, part = paths
+    leave_part(part, b"Z" * 1000)
+
+    DriveHandler().download_url(server, str(out), part_path=str(part))
+
+    assert out.read_bytes() == RangeServer.content
+    assert RangeServer.requests == [(None, None)]
@@ -0,0 +1,52 @@
+import pandas as pd
+import pytest
+
+from src.invoice_table import InvoiceTable
+
+BATCH_1 = [
+    {"invoice_number": "INV-1", "date": "2024-01-15", "vendor_name": "Acme", "total": "$1,200.50", "tax": "100"},
+    {"invoice_number": "INV-2", "date": "not a date", "vendor_name": "", "total": 99.5, "tax": None},
+]
+BATCH_2 = [
+    {"invoice_number": "INV-3", "date": "2023-11-02", "vendor_name": "Acme", "total": "abc1", "tax": 5},
+    {"error": "Could not parse response", "source_file": "broken.pdf"},
+]
+
+
+def test_summary_aggregates_parsed_values():
+    summary = InvoiceTable(BATCH_1 + BATCH_2).summary()
+
+    assert summary["total_invoices"] == 4
+    assert summary["total_amount"] == pytest.approx(1300.0)
+    assert summary["total_tax"] == pytest.approx(105.0)
+    # Only invoices with a readable total count towards the average
+    assert summary["average_amount"] == pytest.approx(650.0)
+    assert summary["vendors"] == {"Acme": 2, "Unknown": 1}
+    assert summary["date_range"] == {"min": "2023-11-02", "max": "2024-01-15"}
+
+
+def test_incremental_adds_match_a_single_build():
+    table = InvoiceTable()
+    table.add(BATCH_1)
+    assert table.frame["invoice_number"].tolist() == ["INV-1", "INV-2"]
+    table.add(BATCH_2)
+
+    assert table.summary() == InvoiceTable(BATCH_1 + BATCH_2).summary()
+    assert table.frame["invoice_number"].tolist() == ["INV-1", "INV-2", "INV-3"]
+
+
+def test_frame_is_typed():
+    frame = InvoiceTable(BATCH_1 + BATCH_2).frame
+
+    assert frame["total"].dtype == "float64"
+    assert pd.isna(frame.loc[2, "total"])
+    assert pd.api.types.is_datetime64_any_dtype(frame["date"])
+    assert pd.isna(frame.loc[1, "date"])
+    assert isinstance(frame["vendor"].dtype, pd.CategoricalDtype)
+
+
+def test_empty_table():
+    table = InvoiceTable()
+
+    assert table.summary() == {}
+    assert table.frame.empty
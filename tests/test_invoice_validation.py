@@ -0,0 +1,99 @@
+import pytest
+
+from src.invoice_validation import merge_reask, parse_json_response, validate_invoice
+from src.parsing import normalize_date, parse_amount
+
+HEADER = {"invoice_number": "INV-1", "date": "03/15/2024", "vendor_name": "Acme"}
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("$1,234.50", 1234.5),
+    ("1.234,50 EUR", 1234.5),
+    ("(12.00)", -12.0),
+    (7, 7.0),
+    ("abc1", None),
+    ("Total: $10", None),
+    ("10%", None),
+    (None, None),
+])
+def test_parse_amount(value, expected):
+    assert parse_amount(value) == expected
+
+
+def test_normalize_date():
+    assert normalize_date("March 15th, 2024") == "2024-03-15"
+    assert normalize_date("2024-03-15T00:00:00") == "2024-03-15"
+    assert normalize_date("15.03.2024") == "2024-03-15"
+    with pytest.raises(ValueError):
+        normalize_date("next Tuesday")
+
+
+def test_parse_json_response_tolerates_fences_prose_and_python_literals():
+    response = 'Sure:\n```json\n{"total": None, "items": [1, 2,],}\n```\nHope this helps {"x": 1}'
+
+    assert parse_json_response(response) == {"total": None, "items": [1, 2]}
+    with pytest.raises(ValueError):
+        parse_json_response("no JSON here")
+
+
+def test_missing_tax_is_derived_from_stated_amounts_and_noted():
+    result, problems = validate_invoice({**HEADER, "subtotal": "$100.00", "total": "110"})
+
+    assert problems == {}
+    assert result["date"] == "2024-03-15"
+    assert (result["subtotal"], result["tax"], result["total"]) == (100.0, 10.0, 110.0)
+    assert result["warnings"] == ["tax: derived as total - subtotal"]
+
+
+def test_partial_line_items_do_not_invent_tax():
+    result, problems = validate_invoice(
+        {**HEADER, "total": 100, "items": [{"description": "A", "quantity": 1, "unit_price": 40}]}
+    )
+
+    assert problems == {}
+    assert result["subtotal"] is None and result["tax"] is None
+    assert result["items"][0]["total"] == 40.0
+    assert result["warnings"] == ["items.0.total: derived as quantity x unit_price"]
+
+
+def test_disagreeing_line_total_is_kept_with_a_warning():
+    result, problems = validate_invoice(
+        {**HEADER, "subtotal": 30, "tax": 3, "total": 33, "items": [{"quantity": 3, "unit_price": 10, "total": 31}]}
+    )
+
+    assert problems == {}
+    assert result["items"][0]["total"] == 31.0
+    assert result["warnings"] == ["items.0.total: quantity x unit_price is 30.00, kept the stated 31.00"]
+
+
+def test_tax_rate_applies_to_the_stated_subtotal():
+    result, problems = validate_invoice({**HEADER, "subtotal": "200", "tax": "10%"})
+
+    assert result["tax"] == 20.0
+    assert result["warnings"] == ["tax: computed as 10% of the subtotal"]
+    assert problems == {"total": "missing"}
+
+
+def test_tax_rate_without_subtotal_is_a_problem():
+    result, problems = validate_invoice({**HEADER, "tax": "10%", "total": 5})
+
+    assert result["tax"] is None
+    assert set(problems) == {"tax"}
+
+
+def test_amounts_that_do_not_add_up_are_kept_and_reported():
+    result, problems = validate_invoice({**HEADER, "subtotal": 30, "tax": 3, "total": 39})
+
+    assert (result["subtotal"], result["tax"], result["total"]) == (30.0, 3.0, 39.0)
+    assert set(problems) == {"subtotal", "tax", "total"}
+
+
+def test_unreadable_amount_is_cleared_and_filled_by_a_reask():
+    result, problems = validate_invoice({**HEADER, "total": "abc1"})
+
+    assert result["total"] is None
+    assert problems == {"total": "not an amount: 'abc1'"}
+
+    merged, remaining = merge_reask(result, problems, '{"total": "$12.50"}')
+    assert merged["total"] == 12.5
+    assert remaining == {}
@@ -0,0 +1,53 @@
+import re
+
+import pytest
+
+import src.prompt_compactor
+from src.prompt_compactor import PromptCompactor
+
+INVOICE = """Acme Supplies Ltd
+Invoice No: INV-1042 (this invoice was computer generated)
+Date: 2024-03-15
+Bill to: Globex Corporation
+Widget 2 x 10.00 = 20.00
+Subtotal: $20.00
+Tax: $2.00
+Total due: $22.00 - Thank you for your business
+Payment terms: Net 30, subject to our standard terms and conditions
+Late payment fees will be charged at 2% per month.
+All rights reserved."""
+
+
+class WordEncoding:
+    """Stands in for the tiktoken encoding, which is downloaded on first use"""
+
+    def encode(self, text, disallowed_special=()):
+        return re.findall(r"\w+|[^\w\s]", text)
+
+
+@pytest.fixture(autouse=True)
+def offline_encoding(monkeypatch):
+    monkeypatch.setattr(src.prompt_compactor, "_encoding_for", lambda model: WordEncoding())
+
+
+def test_key_fields_survive_compaction():
+    text = PromptCompactor().compact(INVOICE)["text"]
+
+    for kept in ["Invoice No: INV-1042", "Date: 2024-03-15", "Bill to: Globex Corporation",
+                 "Subtotal: $20.00", "Tax: $2.00", "Total due: $22.00", "Payment terms: Net 30"]:
+        assert kept in text
+    for dropped in ["computer generated", "Thank you", "terms and conditions", "All rights reserved"]:
+        assert dropped not in text
+
+
+def test_over_budget_text_keeps_header_and_totals():
+    filler = [f"Delivery note line {i} for warehouse records" for i in range(200)]
+    text = "\n".join(INVOICE.splitlines()[:4] + filler + ["Subtotal: $20.00", "Total due: $22.00"])
+
+    result = PromptCompactor(token_budget=150).compact(text)
+
+    assert result["compacted_tokens"] <= 150
+    assert result["tokens_saved"] == result["original_tokens"] - result["compacted_tokens"]
+    assert "Invoice No: INV-1042" in result["text"]
+    assert "Total due: $22.00" in result["text"]
+    assert "[...]" in result["text"]
@@ -0,0 +1,61 @@
+from components.chat_interface import QUICK_ACTIONS
+from src.invoice_table import InvoiceTable
+from src.query_router import QueryRouter
+
+INVOICES = [
+    {"invoice_number": "INV-1", "date": "2023-02-10", "vendor_name": "Acme", "total": 100.0, "tax": 10.0,
+     "source_file": "acme_1.pdf"},
+    {"invoice_number": "INV-2", "date": "2023-07-01", "vendor_name": "Acme", "total": "$50.00", "tax": 5.0,
+     "source_file": "acme_2.pdf"},
+    {"invoice_number": "INV-3", "date": "2024-01-15", "vendor_name": "Globex", "total": 300.0, "tax": 30.0,
+     "source_file": "globex_1.pdf"},
+    {"invoice_number": "INV-4", "date": "2024-03-20", "vendor_name": "Initech", "total": 75.0, "tax": 7.5,
+     "source_file": "initech_1.pdf"},
+    {"invoice_number": "INV-5", "date": "2023-11-30", "vendor_name": "Umbrella", "total": 20.0, "tax": 2.0,
+     "source_file": "umbrella_1.pdf"},
+]
+
+
+def route(question):
+    return QueryRouter(InvoiceTable(INVOICES)).route(question)
+
+
+def test_per_vendor_totals_only_list_vendors_in_the_date_filter():
+    answer = route("Total amount per vendor in 2023")["answer"]
+
+    assert "Acme: $150.00 (2 invoices)" in answer
+    assert "Umbrella: $20.00 (1 invoices)" in answer
+    assert "Globex" not in answer
+    assert "Initech" not in answer
+
+
+def test_top_vendors_only_rank_vendors_in_the_date_filter():
+    answer = route("top 3 vendors in 2023")["answer"]
+
+    assert answer.startswith("Top 2 vendors by amount in 2023:")
+    assert "1. Acme: $150.00" in answer
+    assert "2. Umbrella: $20.00" in answer
+    assert "$0.00" not in answer
+
+
+def test_summary_key_vendors_only_list_vendors_in_the_date_filter():
+    answer = route("Give me a summary of invoices in 2024")["answer"]
+
+    assert answer.endswith("- Key vendors: Globex (1), Initech (1)")
+
+
+def test_free_form_questions_fall_through_to_retrieval():
+    assert route("Why is the Globex invoice so expensive?") is None
+    assert route("Does INV-3 include shipping?") is None
+
+
+def test_quick_actions_route_to_their_intent():
+    expected = {
+        "📊 Summarize All": "Summary across all processed invoices:",
+        "💰 Total Amount": "The total amount across all processed invoices is **$545.00**",
+        "📅 Date Range": "Invoice dates across all processed invoices range from **2023-02-10** to **2024-03-20**.",
+    }
+    assert set(expected) == {label for label, _ in QUICK_ACTIONS}
+
+    for label, question in QUICK_ACTIONS:
+        assert route(question)["answer"].startswith(expected[label]), label